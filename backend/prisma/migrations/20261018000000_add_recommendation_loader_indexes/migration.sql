@@ -0,0 +1,8 @@
+-- CreateIndex
+CREATE INDEX "swap_requests_requesterId_idx" ON "swap_requests"("requesterId");
+
+-- CreateIndex
+CREATE INDEX "swap_requests_receiverId_idx" ON "swap_requests"("receiverId");
+
+-- CreateIndex
+CREATE INDEX "ratings_receiverId_idx" ON "ratings"("receiverId");
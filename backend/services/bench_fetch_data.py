@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+fetch_data Loader Benchmark
+===========================
+
+Compares the original fan-out aggregate query (every relation LEFT JOINed at
+once, fetchall() into RealDictCursor dicts) against the current
+pre-aggregated loader streamed through a server-side cursor.
+
+The benchmark runs against its own database given by BENCH_DATABASE_URL,
+never DATABASE_URL. --seed drops and recreates the "CoLearn" schema there
+from the Prisma migrations and fills it with synthetic data.
+
+Usage:
+    python bench_fetch_data.py --seed [--users=20000]
+    python bench_fetch_data.py [--repeat=3]
+"""
+
+import sys
+import glob
+import json
+import os
+import statistics
+import time
+import tracemalloc
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from recommedation_model import parse_options
+from recommendation_sources import PostgresSource
+from synthetic_data import generate_dataset
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prisma', 'migrations')
+
+# The loader as it was before set-based loading, kept for comparison
+LEGACY_USERS_QUERY = """
+SELECT
+    u.id,
+    u.name,
+    u.location,
+    u.experience_years,
+    u."createdAt" as created_at,
+    array_agg(DISTINCT so.name) FILTER (WHERE so.name IS NOT NULL) as skills_offered,
+    array_agg(DISTINCT so.description) FILTER (WHERE so.description IS NOT NULL) as skills_offered_desc,
+    array_agg(DISTINCT sw.name) FILTER (WHERE sw.name IS NOT NULL) as skills_wanted,
+    array_agg(DISTINCT sw.description) FILTER (WHERE sw.description IS NOT NULL) as skills_wanted_desc,
+    COALESCE(AVG(r.rating), 0) as avg_rating,
+    COUNT(DISTINCT r.id) as total_ratings,
+    COUNT(DISTINCT CASE WHEN sr.status = 'COMPLETED' THEN sr.id END) as completed_sessions
+FROM "CoLearn".users u
+LEFT JOIN "CoLearn"."_SkillsOffered" uso ON u.id = uso."B"
+LEFT JOIN "CoLearn".skills so ON uso."A" = so.id
+LEFT JOIN "CoLearn"."_SkillsWanted" usw ON u.id = usw."B"
+LEFT JOIN "CoLearn".skills sw ON usw."A" = sw.id
+LEFT JOIN "CoLearn".ratings r ON u.id = r."receiverId"
+LEFT JOIN "CoLearn".swap_requests sr ON (u.id = sr."requesterId" OR u.id = sr."receiverId")
+WHERE u."isActive" = true AND u."isPublic" = true
+GROUP BY u.id, u.name, u.location, u.experience_years, u."createdAt"
+ORDER BY u.name
+"""
+
+
+def connect():
+    connection_string = os.getenv('BENCH_DATABASE_URL')
+    if not connection_string:
+        print("BENCH_DATABASE_URL is required (a throwaway database, not DATABASE_URL)", file=sys.stderr)
+        sys.exit(1)
+    return psycopg2.connect(connection_string)
+
+
+def seed(connection, n_users):
+    """Recreate the CoLearn schema from the migrations and load synthetic rows"""
+    dataset = generate_dataset(n_users)
+    cursor = connection.cursor()
+
+    cursor.execute('DROP SCHEMA IF EXISTS "CoLearn" CASCADE')
+    cursor.execute('CREATE SCHEMA "CoLearn"')
+    cursor.execute('SET search_path TO "CoLearn"')
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*', 'migration.sql'))):
+        with open(path) as f:
+            cursor.execute(f.read())
+
+    execute_values(cursor, """
+        INSERT INTO users (id, email, password, name, location, experience_years, "isActive", "isPublic", "updatedAt")
+        VALUES %s
+    """, [
+        (u['id'], u['email'], 'x', u['name'], u['location'], u['experience_years'], u['isActive'], u['isPublic'])
+        for u in dataset['users']
+    ], template="(%s, %s, %s, %s, %s, %s, %s, %s, now())", page_size=5000)
+    execute_values(cursor, 'INSERT INTO skills (id, name, description, category) VALUES %s',
+                   dataset['skills'], page_size=5000)
+    execute_values(cursor, 'INSERT INTO "_SkillsOffered" ("A", "B") VALUES %s', dataset['offered'], page_size=5000)
+    execute_values(cursor, 'INSERT INTO "_SkillsWanted" ("A", "B") VALUES %s', dataset['wanted'], page_size=5000)
+    execute_values(cursor, """
+        INSERT INTO ratings (id, rating, feedback, "giverId", "receiverId") VALUES %s
+    """, dataset['ratings'], template="(%s, %s, '', %s, %s)", page_size=5000)
+    execute_values(cursor, """
+        INSERT INTO swap_requests (id, "requesterId", "receiverId", status, "updatedAt") VALUES %s
+    """, dataset['swaps'], template="(%s, %s, %s, %s, now())", page_size=5000)
+
+    cursor.execute('ANALYZE')
+    connection.commit()
+    cursor.close()
+
+    print(json.dumps({
+        'seeded_users': len(dataset['users']),
+        'skills': len(dataset['skills']),
+        'offered_links': len(dataset['offered']),
+        'wanted_links': len(dataset['wanted']),
+        'ratings': len(dataset['ratings']),
+        'swap_requests': len(dataset['swaps']),
+    }), file=sys.stderr)
+
+
+def legacy_loader(connection):
+    cursor = connection.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(LEGACY_USERS_QUERY)
+    rows = [dict(row) for row in cursor.fetchall()]
+    cursor.close()
+    connection.commit()
+    return rows
+
+
+def current_loader(connection):
+    users, _, _, _ = PostgresSource(connection=connection).load()
+    return users
+
+
+def measure(loader, connection, repeat):
+    """Median wall time over `repeat` runs plus peak Python allocations of one run"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = loader(connection)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    loader(connection)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return rows, {
+        'rows': len(rows),
+        'median_seconds': round(statistics.median(timings), 4),
+        'min_seconds': round(min(timings), 4),
+        'peak_python_mb': round(peak / 2 ** 20, 1),
+    }
+
+
+def same_rows(legacy_rows, current_rows):
+    """Both loaders must produce identical user features"""
+    def key(row):
+        return (
+            row['id'], row['name'], row['location'], row['experience_years'],
+            tuple(row['skills_offered'] or ()), tuple(row['skills_wanted'] or ()),
+            round(float(row['avg_rating']), 6), int(row['total_ratings']), int(row['completed_sessions'])
+        )
+    return sorted(map(key, legacy_rows)) == sorted(map(key, current_rows))
+
+
+def main():
+    _, options = parse_options(sys.argv[1:])
+    connection = connect()
+
+    try:
+        if options.get('seed'):
+            seed(connection, int(options.get('users', 20000)))
+
+        repeat = int(options.get('repeat', 3))
+        legacy_rows, legacy = measure(legacy_loader, connection, repeat)
+        current_rows, current = measure(current_loader, connection, repeat)
+
+        print(json.dumps({
+            'legacy': legacy,
+            'current': current,
+            'speedup': round(legacy['median_seconds'] / max(current['median_seconds'], 1e-9), 2),
+            'identical_results': same_rows(legacy_rows, current_rows),
+        }, indent=2))
+
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Layer-2 Feature Micro-benchmark
+===============================
+
+Times the vectorized create_layer2_features() against the original
+per-candidate Python loop (location string parsing, skill name sets,
+Decimal casts) at K = 50, 500 and 5000 candidates, and checks both
+produce the same feature matrix.
+
+Usage:
+    python bench_layer2_features.py [--users=20000] [--repeat=20]
+"""
+
+import sys
+import json
+import time
+import numpy as np
+from recommedation_model import SkillRecommendationSystem, parse_options
+from synthetic_data import generate_dataset, users_rows
+
+CANDIDATE_COUNTS = (50, 500, 5000)
+
+
+def legacy_location_similarity(location1, location2):
+    """Location similarity as it was computed per call, from the raw strings"""
+    if not location1 or not location2:
+        return 0.0
+
+    loc1_parts = location1.lower().split(',')
+    loc2_parts = location2.lower().split(',')
+
+    if len(loc1_parts) >= 2 and len(loc2_parts) >= 2:
+        if loc1_parts[0].strip() == loc2_parts[0].strip() and loc1_parts[1].strip() == loc2_parts[1].strip():
+            return 1.0
+        elif loc1_parts[1].strip() == loc2_parts[1].strip():
+            return 0.6
+
+    return 0.0
+
+
+def legacy_layer2_features(recommender, target_user_id, candidates):
+    """The per-candidate feature loop as it was before vectorization"""
+    target_user = recommender.user_record(recommender.user_id_to_index[target_user_id])
+    features = []
+
+    for candidate in candidates:
+        candidate_data = candidate['user_data']
+        skill_score = candidate['skill_match_score']
+        location_sim = legacy_location_similarity(target_user['location'], candidate_data['location'])
+        exp_diff = abs(target_user['experience_years'] - candidate_data['experience_years'])
+        exp_similarity = 1.0 / (1.0 + exp_diff * 0.1)
+        avg_rating = float(candidate_data['avg_rating']) / 5.0
+        rating_count = min(int(candidate_data['total_ratings']), 20) / 20.0
+        session_count = min(int(candidate_data['completed_sessions']), 10) / 10.0
+        target_offered = set(target_user['skills_offered'] or [])
+        candidate_wanted = set(candidate_data['skills_wanted'] or [])
+        bidirectional_bonus = len(target_offered.intersection(candidate_wanted)) / max(len(target_offered), 1)
+        features.append([skill_score, location_sim, exp_similarity, avg_rating,
+                         rating_count, session_count, bidirectional_bonus])
+
+    return np.array(features)
+
+
+def best_of(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def main():
+    _, options = parse_options(sys.argv[1:])
+    n_users = int(options.get('users', 20000))
+    repeat = int(options.get('repeat', 20))
+
+    recommender = SkillRecommendationSystem()
+    recommender.users_data = users_rows(generate_dataset(n_users))
+    if not recommender.build():
+        sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    user_ids = list(recommender.user_id_to_index)
+    target_user_id = next(uid for uid in user_ids if recommender.user_record(recommender.user_id_to_index[uid])['skills_offered'])
+
+    results = []
+    for k in CANDIDATE_COUNTS:
+        candidates = []
+        for uid in rng.choice(user_ids, size=min(k, len(user_ids)), replace=False):
+            row = recommender.user_id_to_index[uid]
+            candidates.append({
+                'user_id': uid,
+                'row': row,
+                'skill_match_score': float(rng.random()),
+                'user_data': recommender.user_record(row),  # Only the legacy loop reads this
+            })
+
+        legacy, legacy_seconds = best_of(lambda: legacy_layer2_features(recommender, target_user_id, candidates), repeat)
+        current, current_seconds = best_of(lambda: recommender.create_layer2_features(target_user_id, candidates), repeat)
+
+        results.append({
+            'k': len(candidates),
+            'legacy_ms': round(legacy_seconds * 1000, 3),
+            'vectorized_ms': round(current_seconds * 1000, 3),
+            'speedup': round(legacy_seconds / max(current_seconds, 1e-9), 1),
+            'identical_features': bool(np.allclose(legacy, current)),
+        })
+
+    print(json.dumps({'users': len(user_ids), 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
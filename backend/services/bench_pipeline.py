@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Recommendation Pipeline Benchmark
+=================================
+
+Times every stage of SkillRecommendationSystem on synthetic data, with no
+database: skill encodings, user vectors, index build, ranker training,
+single-user queries, batch queries and match-reason generation, plus the
+per-span breakdown of the queries (Layer 1 search, Layer 2 features and
+predict, match reasons) and peak RSS.
+
+Each user count runs in a fresh interpreter so peak RSS belongs to that
+size alone. Results are written as JSON; --compare prints the change per
+stage against an earlier results file and exits non-zero when a stage got
+slower than --threshold (default 0.2 = 20%).
+
+Index and encoder options (--index, --nprobe, --encoder, ...) are passed
+through to the recommender; the result cache is always disabled.
+
+Usage:
+    python bench_pipeline.py [--sizes=1000,10000,100000,1000000] [--queries=200]
+                             [--batch-users=2000] [--output=results.json]
+    python bench_pipeline.py --sizes=10000 --compare=baseline.json [--threshold=0.2]
+"""
+
+import sys
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import numpy as np
+import faiss
+from recommedation_model import create_recommender, parse_options
+from recommendation_metrics import Metrics
+from recommendation_refresher import current_rss
+from synthetic_data import generate_dataset, training_pairs, users_rows
+
+DEFAULT_SIZES = '1000,10000,100000,1000000'
+
+# Ranker training is capped at this many labeled pairs per size
+MAX_TRAINING_PAIRS = 200000
+
+# Build stages as timed by the recommender's own spans
+BUILD_SPANS = (('encodings', 'skill_encodings'), ('vectors', 'user_vectors'), ('index_build', 'index_build'))
+
+# Query spans reported next to the stage timings
+QUERY_SPANS = ('layer1_search', 'layer2_features', 'layer2_predict', 'match_reasons')
+
+# One-shot stages faster than this are too noisy to flag as regressions
+MIN_COMPARED_SECONDS = 0.01
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def timed(stages, name, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    stages[name] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def percentiles_ms(timings):
+    timings = np.array(timings) * 1000
+    return {
+        'mean_ms': round(float(timings.mean()), 3),
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+    }
+
+
+def run_size(n_users, options):
+    """Benchmark one user count in this process"""
+    queries = int(options.get('queries', 200))
+    batch_users = int(options.get('batch-users', 2000))
+    stages = {}
+
+    dataset = timed(stages, 'generate', generate_dataset, n_users)
+    users_data = users_rows(dataset)
+    pairs = training_pairs(dataset)
+    del dataset
+
+    recommender = create_recommender(dict(options, **{'cache-size': 0}))
+    recommender.users_data = users_data
+    rss_start = current_rss()
+
+    if not recommender.build():
+        raise RuntimeError("Building the recommender failed")
+    build_spans = recommender.metrics.to_json()['stages']
+    for stage, span in BUILD_SPANS:
+        stages[stage] = build_spans[span]['total_seconds']
+    state_mb = (current_rss() - rss_start) / (1024 * 1024) if rss_start is not None else None
+
+    rng = np.random.default_rng(0)
+    if len(pairs) > MAX_TRAINING_PAIRS:
+        pairs = [pairs[i] for i in rng.choice(len(pairs), size=MAX_TRAINING_PAIRS, replace=False)]
+    try:
+        from recommendation_ranker import train_ranker
+        features, labels = timed(stages, 'training_features', recommender.create_training_set, pairs)
+        _, training = timed(stages, 'ranker_training', train_ranker, features, labels)
+    except ImportError:
+        training = None  # scikit-learn is only needed for training
+    del pairs
+
+    user_ids = list(recommender.user_id_to_index)
+    sample = [user_ids[i] for i in rng.choice(len(user_ids), size=min(queries, len(user_ids)), replace=False)]
+
+    recommender.get_recommendations(sample[0])  # Warm up
+    recommender.metrics = Metrics()  # Query spans only
+    single = []
+    results = []
+    for user_id in sample:
+        start = time.perf_counter()
+        results.append(recommender.get_recommendations(user_id))
+        single.append(time.perf_counter() - start)
+    spans = recommender.metrics.to_json()['stages']
+
+    batch = [user_ids[i] for i in rng.choice(len(user_ids), size=min(batch_users, len(user_ids)), replace=False)]
+    start = time.perf_counter()
+    returned = sum(len(recommendations) for _, recommendations in recommender.get_recommendations_batch(batch))
+    batch_seconds = time.perf_counter() - start
+
+    # Match reasons on their own, for the candidates the queries returned
+    reason_pairs = [
+        (user_id, {'user_id': recommendation['user_id'], 'row': recommender.user_id_to_index[recommendation['user_id']]})
+        for user_id, recommendations in zip(sample, results)
+        for recommendation in recommendations
+    ]
+    start = time.perf_counter()
+    for user_id, candidate in reason_pairs:
+        recommender.generate_match_reasons(user_id, candidate)
+    reasons_seconds = time.perf_counter() - start
+
+    return {
+        'users': len(user_ids),
+        'skills': len(recommender.all_skills),
+        'stages_seconds': stages,
+        'single_query': dict(percentiles_ms(single), queries=len(single)),
+        'batch_query': {
+            'users': len(batch),
+            'seconds': round(batch_seconds, 4),
+            'per_user_ms': round(batch_seconds * 1000 / len(batch), 3),
+            'recommendations': returned,
+        },
+        'match_reasons': {
+            'calls': len(reason_pairs),
+            'per_call_us': round(reasons_seconds * 1e6 / max(len(reason_pairs), 1), 2),
+        },
+        'query_spans_ms': {
+            span: {key: spans[span][key] for key in ('count', 'mean_ms', 'p95_ms')}
+            for span in QUERY_SPANS if span in spans
+        },
+        'ranker_training': training,
+        'state_mb': round(state_mb, 1) if state_mb is not None else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def comparable_timings(result):
+    """Flat {stage: seconds or ms} view of one size's result, lower is better"""
+    timings = {f"{stage}_s": seconds for stage, seconds in result['stages_seconds'].items() if stage != 'generate'}
+    timings['single_query_p50_ms'] = result['single_query']['p50_ms']
+    timings['single_query_p95_ms'] = result['single_query']['p95_ms']
+    timings['batch_per_user_ms'] = result['batch_query']['per_user_ms']
+    timings['match_reasons_us'] = result['match_reasons']['per_call_us']
+    timings['peak_rss_mb'] = result['peak_rss_mb']
+    return timings
+
+
+def compare(report, baseline, threshold):
+    """Per-stage ratios against a baseline report; returns the regressions"""
+    baseline_runs = {str(run['requested_users']): run for run in baseline['runs']}
+    regressions = []
+    for run in report['runs']:
+        old = baseline_runs.get(str(run['requested_users']))
+        if old is None:
+            continue
+        old_timings = comparable_timings(old)
+        print(f"\n{run['requested_users']} users", file=sys.stderr)
+        for stage, value in comparable_timings(run).items():
+            previous = old_timings.get(stage)
+            if not previous or value is None:
+                continue
+            change = value / previous - 1
+            regressed = change > threshold and not (stage.endswith('_s') and previous < MIN_COMPARED_SECONDS)
+            flag = ' ⚠️' if regressed else ''
+            print(f"  {stage:<28} {previous:>12} -> {value:<12} {change:+.1%}{flag}", file=sys.stderr)
+            if regressed:
+                regressions.append({'users': run['requested_users'], 'stage': stage,
+                                    'baseline': previous, 'current': value, 'change': round(change, 3)})
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    _, options = parse_options(sys.argv[1:])
+
+    if options.get('run-size'):
+        # Child process for a single size; the parent collects stdout
+        print(json.dumps(run_size(int(options['run-size']), options)))
+        return
+
+    sizes = [int(size) for size in str(options.get('sizes', DEFAULT_SIZES)).split(',')]
+    passthrough = [
+        arg for arg in sys.argv[1:]
+        if arg.partition('=')[0][2:] not in ('sizes', 'output', 'compare', 'threshold')
+    ]
+
+    runs = []
+    for size in sizes:
+        print(f"⏱️ Benchmarking {size} users...", file=sys.stderr)
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), f"--run-size={size}"] + passthrough,
+            stdout=subprocess.PIPE
+        )
+        if child.returncode != 0:
+            print(json.dumps({"error": f"Benchmark for {size} users failed"}))
+            sys.exit(1)
+        runs.append(dict(json.loads(child.stdout), requested_users=size))
+        print(json.dumps(runs[-1]['stages_seconds']), file=sys.stderr)
+
+    report = {
+        'benchmark': 'pipeline',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'faiss': getattr(faiss, '__version__', None),
+        'cpu_count': os.cpu_count(),
+        'options': {key: value for key, value in options.items() if key not in ('output', 'compare', 'threshold')},
+        'runs': runs,
+    }
+
+    if options.get('compare'):
+        with open(options['compare']) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(report, baseline, float(options.get('threshold', 0.2)))
+
+    output = json.dumps(report, indent=2)
+    if options.get('output'):
+        with open(options['output'], 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Serving Throughput Benchmark
+============================
+
+Builds the recommender once (synthetic users, or --from-snapshot), then for
+each worker count starts the pre-fork server on it and drives
+GET /recommendations from concurrent client processes for a fixed time.
+Reports requests/s, latency percentiles, speedup and scaling efficiency
+against a single worker, and how much memory each worker holds privately
+versus shares with the others.
+
+The result cache is disabled so every request runs the full pipeline.
+Give the clients their own cores (e.g. --clients <= cores - workers) or
+run them from another host for clean numbers.
+
+Usage:
+    python bench_serving.py [--users=20000] [--workers=1,2,4,8] [--clients=16]
+                            [--duration=10] [--from-snapshot=<dir>]
+"""
+
+import sys
+import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import time
+import urllib.error
+import urllib.request
+import numpy as np
+from recommedation_model import SkillRecommendationSystem, parse_options
+from recommendation_cache import RecommendationCache
+from recommendation_server import serve
+from synthetic_data import generate_dataset, users_rows
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(recommender, port, workers):
+    """Fork a server process with the given number of workers and wait until it answers"""
+    pid = os.fork()
+    if pid == 0:
+        # Keep per-request access logs out of the measurement
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 2)
+        try:
+            if workers == 1:
+                recommender.prepare_worker()  # Same single-threaded FAISS as in the pool
+            serve(recommender, '127.0.0.1', port, workers, recommender.prepare_worker)
+        finally:
+            os._exit(0)
+
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return pid
+        except (urllib.error.URLError, ConnectionError):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Server did not start")
+            time.sleep(0.05)
+
+
+def stop_server(pid):
+    os.kill(pid, signal.SIGTERM)
+    os.waitpid(pid, 0)
+
+
+def worker_memory(pid, workers):
+    """Average private and proportional (PSS) memory of the server's workers, in MB"""
+    if workers == 1:
+        pids = [pid]
+    else:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids = [int(child) for child in f.read().split()]
+
+    private = []
+    pss = []
+    for worker_pid in pids:
+        fields = {}
+        with open(f"/proc/{worker_pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields[name] = int(value.split()[0])
+        private.append((fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)) / 1024)
+        pss.append(fields.get('Pss', 0) / 1024)
+    return round(sum(private) / len(private), 1), round(sum(pss) / len(pss), 1)
+
+
+def run_client(port, user_ids, duration, seed):
+    """Send requests back to back until the duration is over; returns latencies"""
+    rng = random.Random(seed)
+    base_url = f"http://127.0.0.1:{port}/recommendations"
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f"{base_url}?user_id={rng.choice(user_ids)}&limit=10", timeout=30) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, ConnectionError):
+            errors += 1
+    return latencies, errors
+
+
+def main():
+    _, options = parse_options(sys.argv[1:])
+    n_users = int(options.get('users', 20000))
+    worker_counts = [int(count) for count in str(options.get('workers', '1,2,4,8')).split(',')]
+    clients = int(options.get('clients', 16))
+    duration = float(options.get('duration', 10))
+
+    recommender = SkillRecommendationSystem(
+        snapshot_path=options.get('from-snapshot'),
+        cache=RecommendationCache(max_entries=0)
+    )
+    if recommender.snapshot_path:
+        if not recommender.initialize():
+            sys.exit(1)
+    else:
+        recommender.users_data = users_rows(generate_dataset(n_users))
+        if not recommender.build():
+            sys.exit(1)
+
+    user_ids = random.Random(0).sample(list(recommender.user_id_to_index), min(1000, len(recommender.user_id_to_index)))
+    context = multiprocessing.get_context('fork')
+
+    results = []
+    for workers in worker_counts:
+        port = free_port()
+        pid = start_server(recommender, port, workers)
+        try:
+            with context.Pool(clients) as pool:
+                runs = pool.starmap(run_client, [(port, user_ids, duration, seed) for seed in range(clients)])
+            private_mb, pss_mb = worker_memory(pid, workers)
+        finally:
+            stop_server(pid)
+
+        latencies = np.array([latency for run, _ in runs for latency in run])
+        rps = len(latencies) / duration
+        baseline = results[0]['requests_per_second'] if results else rps
+        results.append({
+            'workers': workers,
+            'requests': int(len(latencies)),
+            'errors': sum(errors for _, errors in runs),
+            'requests_per_second': round(rps, 1),
+            'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2) if len(latencies) else None,
+            'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 2) if len(latencies) else None,
+            'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 2) if len(latencies) else None,
+            'speedup': round(rps / baseline, 2) if baseline else None,
+            'efficiency': round(rps / baseline / (workers / worker_counts[0]), 2) if baseline else None,
+            'worker_private_mb': private_mb,
+            'worker_pss_mb': pss_mb,
+        })
+        print(json.dumps(results[-1]), file=sys.stderr)
+
+    print(json.dumps({
+        'users': len(recommender.user_id_to_index),
+        'cpu_count': os.cpu_count(),
+        'clients': clients,
+        'duration_seconds': duration,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+CLI Cold-Start Benchmark
+========================
+
+Times fresh `python recommedation_model.py` processes the way the backend
+spawns them, and shows where their import time goes (-X importtime):
+
+    interpreter   python -c pass, the floor every scenario pays
+    import        import recommedation_model and nothing else
+    remote        thin client: one recommendation fetched from a running server
+    snapshot      --local: load a snapshot (memory-mapped) and answer one query
+
+Each scenario runs --repeat times; the report has the median and fastest
+wall time, the slowest imported packages and which heavy modules (faiss,
+scipy, sklearn, pandas, psycopg2) were loaded. A scenario slower than its
+budget in COLD_START_BUDGET_MS (times --budget-scale, for slower machines)
+or loading one of its FORBIDDEN_MODULES makes the run exit non-zero.
+
+The server and snapshot use synthetic users, so no database is needed.
+
+Usage:
+    python bench_startup.py [--users=5000] [--repeat=5] [--budget-scale=1.0]
+                            [--output=results.json]
+"""
+
+import sys
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from recommedation_model import parse_options
+from synthetic_data import generate_dataset, users_rows
+
+MODEL_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recommedation_model.py')
+
+# Median wall time each scenario may take, interpreter start included
+COLD_START_BUDGET_MS = {
+    'interpreter': None,
+    'import': 400,
+    'remote': 500,
+    'snapshot': 1000,
+}
+
+HEAVY_MODULES = ('faiss', 'scipy', 'sklearn', 'pandas', 'psycopg2')
+
+# Modules a scenario must never import: the thin client only talks HTTP,
+# and nothing on the serving path needs training or dataframe code
+FORBIDDEN_MODULES = {
+    'import': ('faiss', 'scipy', 'sklearn', 'pandas', 'psycopg2'),
+    'remote': ('faiss', 'scipy', 'sklearn', 'pandas', 'psycopg2'),
+    'snapshot': ('sklearn', 'pandas', 'psycopg2'),
+}
+
+# Packages listed in the import breakdown of each scenario
+TOP_IMPORTS = 8
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_importtime(stderr):
+    """{top-level package: cumulative ms of its outermost import} from -X importtime output"""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative) / 1000)
+    return packages
+
+
+def run_scenario(args, env, repeat):
+    """Median and fastest wall time of `python <args>`, plus one -X importtime profile"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    profile = subprocess.run([sys.executable, '-X', 'importtime'] + args, env=env, check=True,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    packages = parse_importtime(profile.stderr)
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]
+    return {
+        'median_ms': round(statistics.median(timings), 1),
+        'min_ms': round(min(timings), 1),
+        'slowest_imports_ms': {package: round(ms, 1) for package, ms in slowest},
+        'heavy_modules': [module for module in HEAVY_MODULES if module in packages],
+    }
+
+
+def start_server(snapshot_dir, port, env):
+    """Serve from the snapshot in a child process and wait until it answers"""
+    server = subprocess.Popen(
+        [sys.executable, MODEL_SCRIPT, '--serve', f"--from-snapshot={snapshot_dir}",
+         f"--port={port}", '--cache-size=0'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1):
+                return server
+        except (urllib.error.URLError, ConnectionError):
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("Server did not start")
+            time.sleep(0.1)
+
+
+def main():
+    _, options = parse_options(sys.argv[1:])
+    n_users = int(options.get('users', 5000))
+    repeat = int(options.get('repeat', 5))
+    budget_scale = float(options.get('budget-scale', 1.0))
+
+    work_dir = tempfile.mkdtemp(prefix='bench-startup-')
+    snapshot_dir = os.path.join(work_dir, 'snapshot')
+    env = dict(os.environ, RECOMMENDER_SOURCE=f"synthetic:{n_users}")
+    env.pop('RECOMMENDER_SNAPSHOT', None)
+    user_id = users_rows(generate_dataset(n_users))[0]['id']
+
+    server = None
+    try:
+        print(f"📦 Building a snapshot of {n_users} synthetic users...", file=sys.stderr)
+        subprocess.run([sys.executable, MODEL_SCRIPT, f"--snapshot={snapshot_dir}"], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        port = free_port()
+        server = start_server(snapshot_dir, port, env)
+        remote_env = dict(env, RECOMMENDER_URL=f"http://127.0.0.1:{port}")
+
+        scenarios = {
+            'interpreter': (['-c', 'pass'], env),
+            'import': (['-c', 'import recommedation_model'],
+                       dict(env, PYTHONPATH=os.path.dirname(MODEL_SCRIPT))),
+            'remote': ([MODEL_SCRIPT, user_id], remote_env),
+            'snapshot': ([MODEL_SCRIPT, user_id, '--local', f"--from-snapshot={snapshot_dir}"], env),
+        }
+
+        results = {}
+        failures = []
+        for name, (args, scenario_env) in scenarios.items():
+            print(f"⏱️ {name}...", file=sys.stderr)
+            result = run_scenario(args, scenario_env, repeat)
+            budget = COLD_START_BUDGET_MS[name]
+            result['budget_ms'] = round(budget * budget_scale) if budget else None
+            forbidden = [module for module in FORBIDDEN_MODULES.get(name, ()) if module in result['heavy_modules']]
+            if result['budget_ms'] and result['median_ms'] > result['budget_ms']:
+                failures.append(f"{name}: {result['median_ms']} ms is over the {result['budget_ms']} ms budget")
+            if forbidden:
+                failures.append(f"{name}: imports {', '.join(forbidden)}")
+            results[name] = result
+            print(json.dumps(result), file=sys.stderr)
+
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'benchmark': 'startup',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'users': n_users,
+        'repeat': repeat,
+        'scenarios': results,
+        'failures': failures,
+    }
+    output = json.dumps(report, indent=2)
+    if options.get('output'):
+        with open(options['output'], 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+    for failure in failures:
+        print(f"⚠️ {failure}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+CoLearn Location Normalization and Geocoding
+============================================
+
+Users type their location as free text ("Mumbai, Maharashtra", "Bengaluru,
+KA, India", "Pune"). Gazetteer.resolve() parses such a string once into a
+Place: canonical city and state names (case, accents, punctuation, city
+aliases and state abbreviations folded) plus latitude and longitude when
+the bundled offline gazetteer knows the city. A location that only names a
+known city gets the gazetteer's state.
+
+The gazetteer is a CSV of city,state,lat,lon,aliases (aliases separated by
+"|"): gazetteer.csv next to this file, or RECOMMENDER_GAZETTEER.
+
+haversine_km() is vectorized, and GeoBuckets sorts rows into a lat/lon grid
+so that "near me" queries only look at the cells around the target.
+"""
+
+import csv
+import math
+import os
+import re
+import unicodedata
+from collections import namedtuple
+import numpy as np
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+
+EARTH_RADIUS_KM = 6371.0
+
+# Grid cell size of GeoBuckets (half a degree is ~55 km north-south)
+GEO_BUCKET_DEGREES = 0.5
+
+# Key stride between latitude bands of the grid (more than any band's cell count)
+LONGITUDE_CELLS = 1_000_000
+
+# Common abbreviations and former names of states -> canonical name
+STATE_ALIASES = {
+    'ap': 'andhra pradesh',
+    'dl': 'delhi',
+    'nct of delhi': 'delhi',
+    'gj': 'gujarat',
+    'hr': 'haryana',
+    'j and k': 'jammu and kashmir',
+    'ka': 'karnataka',
+    'kl': 'kerala',
+    'mh': 'maharashtra',
+    'mp': 'madhya pradesh',
+    'orissa': 'odisha',
+    'pb': 'punjab',
+    'rj': 'rajasthan',
+    'tn': 'tamil nadu',
+    'ts': 'telangana',
+    'up': 'uttar pradesh',
+    'uttaranchal': 'uttarakhand',
+    'wb': 'west bengal',
+}
+
+# Trailing country names dropped before parsing ("Pune, Maharashtra, India")
+COUNTRY_NAMES = {'india', 'in', 'bharat'}
+
+_SEPARATORS = re.compile(r"[^a-z0-9]+")
+
+Place = namedtuple('Place', 'key city state lat lon')
+
+
+def canonical_place(name):
+    """Canonical key of a place name: case, accents and punctuation folded"""
+    text = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    return ' '.join(_SEPARATORS.sub(' ', text.replace('&', ' and ')).split())
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between points given in degrees (arrays broadcast)"""
+    lat1, lon1, lat2, lon2 = (np.radians(value) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class Gazetteer:
+    """Offline city -> (state, lat, lon) table with alias folding"""
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('RECOMMENDER_GAZETTEER') or DEFAULT_GAZETTEER_PATH
+        self.aliases = {}  # City alias -> canonical city
+        self.coordinates = {}  # (city, state) -> (lat, lon)
+        self.cities = {}  # City -> [(state, lat, lon), ...]
+        self.states = set(STATE_ALIASES.values())
+
+        with open(self.path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                city = canonical_place(row['city'])
+                state = canonical_place(row['state'])
+                lat, lon = float(row['lat']), float(row['lon'])
+                self.coordinates[(city, state)] = (lat, lon)
+                self.cities.setdefault(city, []).append((state, lat, lon))
+                self.states.add(state)
+                for alias in (row.get('aliases') or '').split('|'):
+                    if alias.strip():
+                        self.aliases[canonical_place(alias)] = city
+
+    def resolve(self, location):
+        """Place of a free-text location, or None when it is empty"""
+        if not location or not location.strip():
+            return None
+
+        parts = [canonical_place(part) for part in location.split(',')]
+        parts = [part for part in parts if part]
+        if len(parts) > 1 and parts[-1] in COUNTRY_NAMES:
+            parts.pop()
+
+        city = state = None
+        if len(parts) >= 2:
+            city = self.aliases.get(parts[0], parts[0])
+            state = STATE_ALIASES.get(parts[1], parts[1])
+        elif parts:
+            name = STATE_ALIASES.get(parts[0], parts[0])
+            if name in self.states and name not in self.cities:
+                state = name
+            else:
+                city = self.aliases.get(name, name)
+
+        lat = lon = None
+        if city is not None:
+            known = self.cities.get(city, ())
+            if state is None and len({known_state for known_state, _, _ in known}) == 1:
+                state = known[0][0]
+            if (city, state) in self.coordinates:
+                lat, lon = self.coordinates[(city, state)]
+            elif len({(known_lat, known_lon) for _, known_lat, known_lon in known}) == 1:
+                _, lat, lon = known[0]  # Unambiguous city name with an unknown or odd state
+
+        return Place(location.lower(), city, state, lat, lon)
+
+
+class GeoBuckets:
+    """Rows with coordinates sorted by lat/lon grid cell, for radius prefilters"""
+
+    def __init__(self, lat, lon, cell_degrees=GEO_BUCKET_DEGREES):
+        self.cell_degrees = cell_degrees
+        rows = np.flatnonzero(~np.isnan(lat))
+        keys = self.cell_keys(lat[rows], lon[rows])
+        order = np.argsort(keys, kind='stable')
+        self.rows = rows[order]
+        self.keys = keys[order]
+
+    def cell(self, degrees, offset):
+        return np.floor((np.asarray(degrees) + offset) / self.cell_degrees).astype(np.int64)
+
+    def cell_keys(self, lat, lon):
+        # Cells of one latitude band are consecutive keys, ordered by longitude
+        return self.cell(lat, 90.0) * LONGITUDE_CELLS + self.cell(lon, 180.0)
+
+    def rows_near(self, lat, lon, radius_km):
+        """Rows in the grid cells overlapping radius_km around (lat, lon); a superset of the rows within it"""
+        lat_span = radius_km / 111.0
+        lon_span = min(radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01)), 180.0)
+        lon_first = self.cell(max(lon - lon_span, -180.0), 180.0)
+        lon_last = self.cell(min(lon + lon_span, 180.0), 180.0)
+
+        slices = []
+        for band in range(self.cell(max(lat - lat_span, -90.0), 90.0), self.cell(min(lat + lat_span, 90.0), 90.0) + 1):
+            start = np.searchsorted(self.keys, band * LONGITUDE_CELLS + lon_first, side='left')
+            end = np.searchsorted(self.keys, band * LONGITUDE_CELLS + lon_last, side='right')
+            slices.append(self.rows[start:end])
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
@@ -4,113 +4,316 @@ CoLearn Recommendation System
 ============================
 
 Two-Layer Recommendation Model:
-Layer 1: FAISS-based skill matching (Want to teach ↔ Want to learn)
-Layer 2: Random Forest re-ranking (Location, Experience, Reviews, Sessions)
+Layer 1: FAISS-based skill matching (Want to teach ↔ Want to learn),
+         optionally reciprocal (both directions at once)
+Layer 2: Learned linear re-ranking (Location, Experience, Reviews, Sessions)
 
 Usage:
-    python recommendation_model.py <user_id> [--limit=10]
+    python recommendation_model.py <user_id> [--limit=10] [--mode=standard|reciprocal] [--local]
+    python recommendation_model.py --serve [--host=127.0.0.1] [--port=8765] [--workers=N]
+
+The CLI first asks a running recommendation server (RECOMMENDER_URL) and only
+builds the model in-process when no server is reachable, --local is given or
+an option changes how the model is built (--source, --from-snapshot,
+--ranker, --encoder, --location-model, --index and its settings).
 """
 
 import sys
+import hashlib
 import json
 import numpy as np
-import pandas as pd
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import faiss
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler, MultiLabelBinarizer
-from sklearn.metrics.pairwise import cosine_similarity
 import os
-from dotenv import load_dotenv
+import time
+from datetime import datetime, timezone
 import warnings
+from recommendation_server import (
+    DEFAULT_HOST, DEFAULT_PORT, MATCH_MODES, PAGE_WINDOW, build_response, decode_cursor, next_page_cursor,
+    ndjson_lines, parse_limit, parse_near_km, serve, fetch_remote_recommendations, stream_remote_recommendations
+)
+from recommendation_ranker import LinearRanker, train_ranker
+from recommendation_metrics import Metrics
+from recommendation_profiles import PROFILE_ARRAYS, UserProfileStore
+from recommendation_cache import RecommendationCache
+from recommendation_refresher import BackgroundRefresher, current_rss
+from recommendation_sources import export_users, open_source
+from locations import Gazetteer, GeoBuckets, haversine_km
+from skill_embeddings import SkillEmbedder, canonical_skill
 warnings.filterwarnings('ignore')
 
-# Load environment variables
-load_dotenv()
+# Spare skill columns reserved in every vector so that new skills can be
+# added by incremental updates without re-encoding all users
+SKILL_COLUMN_HEADROOM = 64
+
+# Rows densified at a time when feeding sparse vectors to FAISS
+INDEX_ADD_BATCH_SIZE = 8192
+
+# How user skill vectors are represented for Layer 1:
+#   binary    - one column per canonical skill, exact skill matches only
+#   embedding - sum of hashed n-gram skill embeddings (dense, fixed size),
+#               so related skill names match too
+ENCODERS = ('binary', 'embedding')
+
+# Embedding similarity above which two different skills count as related
+# in match reasons
+RELATED_SKILL_THRESHOLD = 0.5
+
+# Layer 1 doubles k for targets left short of eligible candidates by
+# filtering, up to this many results per query
+LAYER1_MAX_K = 2000
+
+# How Layer 2 scores location:
+#   city     - 1.0 same city, 0.6 same state, 0 otherwise
+#   distance - decays with the distance between gazetteer coordinates
+#              (halving every GEO_HALF_LIFE_KM), city/state where unknown
+LOCATION_MODELS = ('city', 'distance')
+GEO_HALF_LIFE_KM = 50
+
+# Distance under which match reasons mention how close a user is
+NEARBY_KM = 25
+
+def safe_normalize(matrix):
+    """L2-normalize rows for cosine similarity, leaving all-zero rows as-is (dense or sparse)"""
+    from scipy import sparse
+    if sparse.issparse(matrix):
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1  # Avoid division by zero
+        return sparse.csr_matrix(matrix.multiply(1.0 / norms[:, None]), dtype=np.float32)
+    
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1  # Avoid division by zero
+    return matrix / norms
+
+def row_overlap_counts(matrix, rows, columns_mask):
+    """
+    For each of the given CSR rows, count its columns that are set in
+    columns_mask. Works on the raw CSR arrays, avoiding sparse row slicing.
+    """
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[rows + 1] - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(len(rows), dtype=np.float64)
+    
+    # Positions of every stored entry of the selected rows, row after row
+    positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+    hits = columns_mask[matrix.indices[positions]]
+    return np.bincount(np.repeat(np.arange(len(rows)), lengths), weights=hits, minlength=len(rows))
+
+def reputation_columns(avg_rating, total_ratings, completed):
+    """Layer-2 features 4-6 (rating, rating count, sessions), normalized to 0-1"""
+    return {
+        'rating_norm': avg_rating / 5.0,                                  # Normalize to 0-1
+        'rating_count_norm': np.minimum(total_ratings, 20) / 20.0,        # Cap at 20
+        'session_norm': np.minimum(completed, 10) / 10.0,                 # Cap at 10
+    }
+
+def pair_overlap_counts(matrix, rows, other_matrix, other_rows):
+    """Shared columns of matrix[rows[i]] and other_matrix[other_rows[i]] for every pair i"""
+    overlap = matrix[rows].multiply(other_matrix[other_rows])
+    return np.asarray(overlap.sum(axis=1), dtype=np.float64).ravel()
+
+# Layer-1 index types: exact brute force, or approximate (IVF / HNSW) for
+# large user counts. Every setting can be overridden through the
+# environment (RECOMMENDER_INDEX, RECOMMENDER_NPROBE, ...) or the CLI.
+DEFAULT_INDEX_CONFIG = {
+    'type': 'flat',        # flat | ivf | hnsw
+    'nlist': 0,            # IVF cells, 0 = derived from the user count
+    'nprobe': 8,           # IVF cells visited per query
+    'hnsw_m': 32,          # HNSW graph degree
+    'ef_construction': 80,
+    'ef_search': 64,       # HNSW candidate list size per query
+}
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+
+# Recall@50 against exact search measured with --index-recall on
+# synthetic:20000 (users offering nothing are not indexed):
+#   ivf   defaults 0.51, nprobe=32 0.80
+#   hnsw  defaults 0.65, ef_search=256 0.69, ef_search=1024 0.74;
+#         ef_construction=200 0.85, hnsw_m=64 + ef_construction=200 0.93
+#         (0.95 with ef_search=256)
+# Binary skill vectors tie heavily, so HNSW gains more from a denser graph
+# than from a larger ef_search. Measure on real data before switching.
+
+# Query-time settings: FAISS does not store them with an index, so explicit
+# values apply on top of a snapshot's (see apply_search_params)
+SEARCH_SETTINGS = ('nprobe', 'ef_search')
+
+# Upper bound on vectors used to train IVF centroids
+IVF_TRAINING_SAMPLE = 100000
+
+def explicit_index_settings(overrides=None):
+    """Index settings given explicitly, through overrides or RECOMMENDER_* environment variables"""
+    settings = {}
+    for key in DEFAULT_INDEX_CONFIG:
+        env_key = 'RECOMMENDER_INDEX' if key == 'type' else f"RECOMMENDER_{key.upper()}"
+        value = (overrides or {}).get(key) or os.getenv(env_key)
+        if value is not None:
+            settings[key] = str(value).lower() if key == 'type' else int(value)
+    return settings
+
+def load_index_config(overrides=None):
+    """Index settings from defaults, RECOMMENDER_* environment variables and overrides"""
+    config = dict(DEFAULT_INDEX_CONFIG, **explicit_index_settings(overrides))
+    
+    if config['type'] not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{config['type']}', expected one of {', '.join(INDEX_TYPES)}")
+    return config
+
+def create_faiss_index(dimension, config, training_vectors=None):
+    """
+    Build an empty inner-product index with explicit ids for the configured
+    type. IVF needs (normalized) training vectors to place its centroids.
+    """
+    import faiss
+    if config['type'] == 'ivf':
+        n_train = len(training_vectors)
+        nlist = config['nlist'] or int(4 * np.sqrt(n_train))
+        nlist = max(1, min(nlist, n_train // 39 or 1))  # FAISS wants ~39 points per centroid
+        index = faiss.index_factory(dimension, f"IVF{nlist},Flat", faiss.METRIC_INNER_PRODUCT)
+        index.train(training_vectors)
+    elif config['type'] == 'hnsw':
+        hnsw = faiss.IndexHNSWFlat(dimension, config['hnsw_m'], faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = config['ef_construction']
+        index = faiss.IndexIDMap2(hnsw)
+    else:
+        index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+    
+    apply_search_params(index, config)
+    return index
+
+def apply_search_params(index, config):
+    """Set query-time knobs, which FAISS does not persist with the index"""
+    import faiss
+    if config['type'] == 'ivf':
+        ivf = faiss.extract_index_ivf(index)
+        ivf.nprobe = min(config['nprobe'], ivf.nlist)
+    elif config['type'] == 'hnsw':
+        faiss.downcast_index(index.index).hnsw.efSearch = config['ef_search']
+
+# Bumped whenever the on-disk snapshot layout changes
+SNAPSHOT_FORMAT_VERSION = 6
+SNAPSHOT_POINTER = 'CURRENT'
+
+def snapshot_version(path):
+    """Version of the snapshot a path resolves to, or None if it cannot be read"""
+    try:
+        with open(os.path.join(resolve_snapshot_dir(path), 'manifest.json')) as f:
+            return json.load(f)['version']
+    except (OSError, ValueError, KeyError):
+        return None
+
+def resolve_snapshot_dir(path):
+    """A snapshot directory itself, or a snapshot root whose CURRENT file names one"""
+    pointer = os.path.join(path, SNAPSHOT_POINTER)
+    if os.path.exists(pointer):
+        with open(pointer) as f:
+            return os.path.join(path, f.read().strip())
+    return path
+
+def read_mapped_index(path):
+    """
+    Read-only FAISS index over a snapshot file. IO_FLAG_MMAP alone maps only
+    IVF inverted lists; IO_FLAG_MMAP_IFC also leaves flat vectors and HNSW
+    graphs in the mapped file, so every process shares them.
+    """
+    import faiss
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
 
 class SkillRecommendationSystem:
-    def __init__(self):
-        self.db_connection = None
-        self.mlb = MultiLabelBinarizer()  # For skill encoding
+    def __init__(self, index_config=None, snapshot_path=None, ranker_path=None, metrics=None, cache=None,
+                 encoder=None, reciprocal=None, source=None, location_model=None):
+        # Where users come from: a data source object or a --source spec
+        self.source = source if source is not None and not isinstance(source, str) else open_source(source)
+        self.encoder = (encoder or os.getenv('RECOMMENDER_ENCODER') or 'binary').lower()
+        if self.encoder not in ENCODERS:
+            raise ValueError(f"Unknown encoder '{self.encoder}', expected one of {', '.join(ENCODERS)}")
+        self.location_model = (location_model or os.getenv('RECOMMENDER_LOCATION_MODEL') or 'city').lower()
+        if self.location_model not in LOCATION_MODELS:
+            raise ValueError(f"Unknown location model '{self.location_model}', expected one of {', '.join(LOCATION_MODELS)}")
+        self.gazetteer = Gazetteer()
+        self.embedder = SkillEmbedder()
+        self.skill_vectors = None  # Skill column -> embedding table (embedding encoder only)
+        self.metrics = metrics or Metrics()  # Stage latency histograms and counters
+        self.cache = cache or RecommendationCache()
+        self.cache.metrics = self.cache.metrics or self.metrics  # Hit/miss counters
+        self.index_config = load_index_config(index_config)
+        # Explicit query-time settings, which also override a snapshot's
+        self.search_overrides = {
+            key: value for key, value in explicit_index_settings(index_config).items() if key in SEARCH_SETTINGS
+        }
+        self.snapshot_path = snapshot_path or os.getenv('RECOMMENDER_SNAPSHOT')
+        self.index_path = None  # Set while the index is a read-only mmap of a snapshot
+        self.skill_to_col = {}  # Canonical skill key -> vector column
+        self.vector_dim = 0
         self.faiss_index = None
-        self.rf_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.scaler = StandardScaler()
+        # Second index over [offered | wanted] vectors for reciprocal matching,
+        # built at startup when enabled, otherwise on the first reciprocal request
+        self.reciprocal = reciprocal if reciprocal is not None else os.getenv('RECOMMENDER_RECIPROCAL', '').lower() in ('1', 'true', 'yes')
+        self.reciprocal_index = None
+        self.reciprocal_index_path = None
+        self.index_to_user_id = []  # FAISS id -> user_id (None once removed)
+        self.user_id_to_index = {}
+        self.last_sync_at = None
+        self.data_version = None  # Identifies the full load cached results were computed on
+        self.user_versions = {}  # user_id -> version token, changed by incremental updates
+        self.banned_user_ids = set()
+        self.excluded_pairs = {}  # user_id -> user ids never recommended to them
+        self.search_selector = None  # FAISS ID selector skipping excluded rows, see layer1_search_params
+        self.location_codes = {}  # Interned location/city/state keys
+        self.location_parts = []  # Parsed location codes of each profile location-table entry
+        self.location_coords = []  # Gazetteer (lat, lon) of each entry, NaN when unknown
+        self.geo_buckets = None  # Grid of rows with coordinates for near-me queries, built lazily
+        self.user_features = {}  # Per-row feature columns, see compute_user_features
+        self.ranker_path = ranker_path or os.getenv('RECOMMENDER_RANKER')
+        self.ranker = LinearRanker()  # Default weights until a trained ranker is loaded
         self.all_skills = []
-        self.user_profiles = {}
+        self.profiles = UserProfileStore()  # Names, locations and skill lists by row
         
     def connect_db(self):
-        """Connect to PostgreSQL database"""
+        """Connect to the data source (PostgreSQL unless configured otherwise)"""
         try:
-            connection_string = os.getenv('DATABASE_URL')
-            if not connection_string:
-                raise ValueError("DATABASE_URL not found in environment variables")
-            
-            self.db_connection = psycopg2.connect(connection_string)
+            self.source.connect()
             return True
         except Exception as e:
-            print(f"Database connection error: {e}", file=sys.stderr)
+            print(f"Data source connection error: {e}", file=sys.stderr)
             return False
     
     def fetch_data(self):
-        """Fetch all necessary data from database"""
-        if not self.db_connection:
-            return False
-            
+        """Fetch users with their skills, ratings and exclusions from the data source"""
         try:
-            cursor = self.db_connection.cursor(cursor_factory=RealDictCursor)
-            
-            # Fetch users with their skills, ratings, and other data
-            query = """
-            SELECT 
-                u.id,
-                u.name,
-                u.location,
-                u.experience_years,
-                u."createdAt" as created_at,
-                
-                -- Skills offered (what they can teach)
-                array_agg(DISTINCT so.name) FILTER (WHERE so.name IS NOT NULL) as skills_offered,
-                array_agg(DISTINCT so.description) FILTER (WHERE so.description IS NOT NULL) as skills_offered_desc,
-                
-                -- Skills wanted (what they want to learn)
-                array_agg(DISTINCT sw.name) FILTER (WHERE sw.name IS NOT NULL) as skills_wanted,
-                array_agg(DISTINCT sw.description) FILTER (WHERE sw.description IS NOT NULL) as skills_wanted_desc,
-                
-                -- Average rating received
-                COALESCE(AVG(r.rating), 0) as avg_rating,
-                COUNT(DISTINCT r.id) as total_ratings,
-                
-                -- Number of completed sessions
-                COUNT(DISTINCT CASE WHEN sr.status = 'COMPLETED' THEN sr.id END) as completed_sessions
-                
-            FROM "CoLearn".users u
-            LEFT JOIN "CoLearn"."_SkillsOffered" uso ON u.id = uso."B"
-            LEFT JOIN "CoLearn".skills so ON uso."A" = so.id
-            LEFT JOIN "CoLearn"."_SkillsWanted" usw ON u.id = usw."B"  
-            LEFT JOIN "CoLearn".skills sw ON usw."A" = sw.id
-            LEFT JOIN "CoLearn".ratings r ON u.id = r."receiverId"
-            LEFT JOIN "CoLearn".swap_requests sr ON (u.id = sr."requesterId" OR u.id = sr."receiverId")
-            WHERE u."isActive" = true AND u."isPublic" = true
-            GROUP BY u.id, u.name, u.location, u.experience_years, u."createdAt"
-            ORDER BY u.name
-            """
-            
-            cursor.execute(query)
-            users_data = cursor.fetchall()
-            
-            # Convert to list of dictionaries for easier processing
-            self.users_data = [dict(row) for row in users_data]
-            
-            cursor.close()
+            # last_sync_at is when the source was read, so incremental
+            # refreshes pick up everything that changes from there on
+            self.users_data, self.banned_user_ids, self.excluded_pairs, self.last_sync_at = self.source.load()
             return len(self.users_data) > 0
             
         except Exception as e:
             print(f"Data fetch error: {e}", file=sys.stderr)
             return False
     
+    def update_exclusions(self, banned_user_ids, excluded_pairs, user_ids):
+        """
+        Apply exclusions fetched for user_ids (the excluded pairs either side
+        of which is one of them), invalidating cached results of every user
+        they change for: those users' entries are replaced, and the entries of
+        other users they appear in are extended
+        """
+        changed = banned_user_ids ^ self.banned_user_ids
+        for uid in set(user_ids) | set(excluded_pairs):
+            old = self.excluded_pairs.get(uid, set())
+            new = excluded_pairs.get(uid, set()) if uid in user_ids else old | excluded_pairs[uid]
+            if new == old:
+                continue
+            changed.add(uid)
+            if new:
+                self.excluded_pairs[uid] = new
+            else:
+                del self.excluded_pairs[uid]
+        self.bump_user_versions(changed)
+        self.banned_user_ids = banned_user_ids
+        self.search_selector = None
+    
     def create_skill_encodings(self):
-        """Create binary encodings for all skills using MultiLabelBinarizer"""
+        """Assign a vector column to every known skill, leaving spare columns for new ones"""
         try:
             all_skills = set()
             
@@ -121,20 +324,19 @@ class SkillRecommendationSystem:
                 if user['skills_wanted']:
                     all_skills.update(user['skills_wanted'])
             
-            self.all_skills = list(all_skills)
-            
-            # Fit the MultiLabelBinarizer
-            if self.all_skills:
-                all_user_skills = []
-                for user in self.users_data:
-                    user_skills = []
-                    if user['skills_offered']:
-                        user_skills.extend(user['skills_offered'])
-                    if user['skills_wanted']:
-                        user_skills.extend(user['skills_wanted'])
-                    all_user_skills.append(user_skills)
-                
-                self.mlb.fit(all_user_skills)
+            # Spelling variants share one column, shown under the first name
+            self.all_skills = []
+            self.skill_to_col = {}
+            for skill in sorted(all_skills):
+                key = canonical_skill(skill)
+                if key not in self.skill_to_col:
+                    self.skill_to_col[key] = len(self.all_skills)
+                    self.all_skills.append(skill)
+            self.vector_dim = len(self.all_skills) + max(SKILL_COLUMN_HEADROOM, len(self.all_skills) // 4)
+            
+            if self.encoder == 'embedding':
+                self.skill_vectors = np.zeros((self.vector_dim, self.embedder.dim), dtype=np.float32)
+                self.skill_vectors[:len(self.all_skills)] = self.embedder.embed_many(self.all_skills)
             
             return True
             
@@ -142,27 +344,77 @@ class SkillRecommendationSystem:
             print(f"Skill encoding error: {e}", file=sys.stderr)
             return False
     
+    def add_skill_columns(self, skills):
+        """
+        Give unseen skills a spare column. Returns False when the spare
+        columns are exhausted and the encodings need a full rebuild; with the
+        embedding encoder the index never sees columns, so the skill
+        matrices and the embedding table simply grow instead.
+        """
+        for skill in skills:
+            key = canonical_skill(skill)
+            if key not in self.skill_to_col:
+                if len(self.all_skills) >= self.vector_dim:
+                    if self.encoder != 'embedding':
+                        return False
+                    self.grow_skill_columns()
+                col = len(self.all_skills)
+                self.skill_to_col[key] = col
+                self.all_skills.append(skill)
+                if self.encoder == 'embedding':
+                    self.skill_vectors[col] = self.embedder.embed(skill)
+        return True
+    
+    def grow_skill_columns(self):
+        """Double the skill columns of the matrices and the embedding table (embedding encoder)"""
+        from scipy import sparse
+        self.vector_dim *= 2
+        self.offered_matrix, self.wanted_matrix = (
+            sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr),
+                              shape=(matrix.shape[0], self.vector_dim), copy=False)
+            for matrix in (self.offered_matrix, self.wanted_matrix)
+        )
+        table = np.zeros((self.vector_dim, self.embedder.dim), dtype=np.float32)
+        table[:len(self.skill_vectors)] = self.skill_vectors
+        self.skill_vectors = table
+    
+    def encode_skill_matrix(self, skill_lists):
+        """
+        Encode many skill lists in one vectorized pass as a sparse CSR
+        matrix (one row per list, one column per known skill)
+        """
+        from scipy import sparse
+        lengths = np.fromiter((len(skills or ()) for skills in skill_lists), dtype=np.int64, count=len(skill_lists))
+        columns = np.fromiter(
+            (self.skill_to_col.get(canonical_skill(skill), -1) for skills in skill_lists for skill in skills or ()),
+            dtype=np.int64, count=int(lengths.sum())
+        )
+        rows = np.repeat(np.arange(len(skill_lists)), lengths)
+        known = columns >= 0
+        
+        matrix = sparse.csr_matrix(
+            (np.ones(int(known.sum()), dtype=np.float32), (rows[known], columns[known])),
+            shape=(len(skill_lists), self.vector_dim)
+        )
+        matrix.data[:] = 1.0  # Repeated skills still count once
+        return matrix
+    
     def create_user_skill_vectors(self):
-        """Create binary skill vectors for each user (offered and wanted skills)"""
+        """Create sparse binary skill matrices for all users (offered and wanted skills)"""
         try:
-            self.user_profiles = {}
+            self.offered_matrix = self.encode_skill_matrix([user['skills_offered'] for user in self.users_data])
+            self.wanted_matrix = self.encode_skill_matrix([user['skills_wanted'] for user in self.users_data])
             
-            for user in self.users_data:
-                user_id = user['id']
-                
-                # Create binary vectors for offered and wanted skills
-                offered_skills = user['skills_offered'] if user['skills_offered'] else []
-                wanted_skills = user['skills_wanted'] if user['skills_wanted'] else []
-                
-                # Transform to binary vectors
-                offered_vector = self.mlb.transform([offered_skills]).astype(np.float32)
-                wanted_vector = self.mlb.transform([wanted_skills]).astype(np.float32)
-                
-                self.user_profiles[user_id] = {
-                    'offered_vector': offered_vector.flatten(),
-                    'wanted_vector': wanted_vector.flatten(),
-                    'user_data': user
-                }
+            # Row i of both matrices (and FAISS id i) belongs to users_data[i]
+            self.index_to_user_id = [user['id'] for user in self.users_data]
+            self.user_id_to_index = {uid: idx for idx, uid in enumerate(self.index_to_user_id)}
+            self.profiles = UserProfileStore()
+            self.profiles.append(self.users_data)
+            self.location_codes = {}
+            self.location_parts = []
+            self.location_coords = []
+            self.geo_buckets = None
+            self.user_features = self.compute_user_features(self.users_data, self.profiles.location_codes)
             
             return True
             
@@ -170,34 +422,104 @@ class SkillRecommendationSystem:
             print(f"User vector creation error: {e}", file=sys.stderr)
             return False
     
+    def search_vectors(self, matrix, rows):
+        """Normalized dense vectors FAISS indexes and searches for rows of a skill matrix"""
+        selected = matrix[rows]
+        if self.encoder == 'embedding':
+            return safe_normalize(np.asarray(selected @ self.skill_vectors, dtype=np.float32))
+        return safe_normalize(selected).toarray()
+    
+    @property
+    def search_dim(self):
+        """Dimension of the vectors in the FAISS index"""
+        return self.embedder.dim if self.encoder == 'embedding' else self.vector_dim
+    
+    def index_vectors(self, rows, mode='standard'):
+        """
+        Vectors stored in the Layer-1 index of a match mode: normalized
+        offered skills, or [offered | wanted] for the reciprocal index
+        """
+        offered = self.search_vectors(self.offered_matrix, rows)
+        if mode == 'reciprocal':
+            return np.hstack([offered, self.search_vectors(self.wanted_matrix, rows)])
+        return offered
+    
+    def query_vectors(self, rows, mode='standard'):
+        """
+        Layer-1 query vectors of a match mode. Reciprocal queries are
+        [wanted | offered] / 2, so one inner product against the reciprocal
+        index is the mean of wanted.offered and offered.wanted.
+        """
+        wanted = self.search_vectors(self.wanted_matrix, rows)
+        if mode == 'reciprocal':
+            return np.hstack([wanted, self.search_vectors(self.offered_matrix, rows)]) * 0.5
+        return wanted
+    
+    def add_to_index(self, rows):
+        """Add users' normalized vectors to the FAISS index(es), densifying in batches"""
+        self.ensure_writable_index()
+        self.search_selector = None  # New rows must enter the search bitmap
+        for index, mode in ((self.faiss_index, 'standard'), (self.reciprocal_index, 'reciprocal')):
+            if index is not None:
+                self.add_vectors(index, rows, mode)
+    
+    def add_vectors(self, index, rows, mode='standard'):
+        """
+        Add the rows' vectors of a match mode to an index, except all-zero
+        ones (nothing offered to match): they can never score above 0 and
+        only crowd IVF cells and HNSW neighbourhoods. Rows left out are
+        simply never found, like removed ones.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        for start in range(0, len(rows), INDEX_ADD_BATCH_SIZE):
+            batch = rows[start:start + INDEX_ADD_BATCH_SIZE]
+            vectors = self.index_vectors(batch, mode)
+            nonzero = vectors.any(axis=1)
+            if nonzero.any():
+                index.add_with_ids(vectors[nonzero], batch[nonzero])
+    
+    def effective_index_config(self):
+        """
+        Index settings as built: the configured ones, with the IVF cell count
+        actually used (the config keeps 0 = derived, so rebuilds re-derive it)
+        """
+        import faiss
+        if self.index_config['type'] == 'ivf' and self.faiss_index is not None:
+            return dict(self.index_config, nlist=faiss.extract_index_ivf(self.faiss_index).nlist)
+        return dict(self.index_config)
+    
+    def create_index(self, mode='standard'):
+        """Empty index of the configured type for a match mode (IVF gets trained)"""
+        dimension = self.search_dim * (2 if mode == 'reciprocal' else 1)
+        training_vectors = None
+        if self.index_config['type'] == 'ivf':
+            rows = np.array(sorted(self.user_id_to_index.values()), dtype=np.int64)
+            sample = np.random.default_rng(42).choice(rows, size=min(len(rows), IVF_TRAINING_SAMPLE), replace=False)
+            training_vectors = self.index_vectors(np.sort(sample), mode)
+            # Centroids for the vectors that are actually indexed
+            nonzero = training_vectors.any(axis=1)
+            if nonzero.any():
+                training_vectors = training_vectors[nonzero]
+        return create_faiss_index(dimension, self.index_config, training_vectors)
+    
     def build_faiss_index(self):
         """Build FAISS index for fast similarity search"""
         try:
-            if not self.user_profiles:
+            if not self.user_id_to_index:
                 return False
             
-            # Create matrix of all offered skill vectors
-            user_ids = list(self.user_profiles.keys())
-            offered_vectors = np.array([
-                self.user_profiles[uid]['offered_vector'] 
-                for uid in user_ids
-            ], dtype=np.float32)
+            # Build FAISS index (Inner Product for binary vectors); explicit
+            # ids let single users be removed and re-added later without
+            # touching the other rows
+            self.faiss_index = self.create_index()
+            self.reciprocal_index = None
+            self.search_selector = None
             
-            # Build FAISS index
-            dimension = offered_vectors.shape[1]
-            self.faiss_index = faiss.IndexFlatIP(dimension)  # Inner Product for binary vectors
+            # Normalized (cosine similarity) offered vectors of every user
+            self.add_to_index(np.arange(self.offered_matrix.shape[0]))
             
-            # Normalize vectors for cosine similarity (L2 normalization)
-            def safe_normalize(matrix):
-                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
-                norms[norms == 0] = 1  # Avoid division by zero
-                return matrix / norms
-            
-            offered_vectors_norm = safe_normalize(offered_vectors)
-            self.faiss_index.add(offered_vectors_norm)
-            
-            # Store mapping from index to user_id
-            self.index_to_user_id = user_ids
+            if self.reciprocal:
+                self.build_reciprocal_index()
             
             return True
             
@@ -205,352 +527,1558 @@ class SkillRecommendationSystem:
             print(f"FAISS index error: {e}", file=sys.stderr)
             return False
     
-    def layer1_skill_matching(self, target_user_id, k=50):
+    def build_reciprocal_index(self):
+        """Build the [offered | wanted] index used by reciprocal matching"""
+        with self.metrics.span('reciprocal_index_build'):
+            index = self.create_index('reciprocal')
+            self.add_vectors(index, sorted(self.user_id_to_index.values()), 'reciprocal')
+            self.reciprocal_index = index
+    
+    def evaluate_index_recall(self, sample_size=500, k=50):
+        """
+        Compare the configured Layer-1 index against exact brute-force search
+        on sampled users. Reports recall@k and per-query latency of both.
+        """
+        rows = np.fromiter(self.user_id_to_index.values(), dtype=np.int64, count=len(self.user_id_to_index))
+        rows = rows[np.diff(self.wanted_matrix.indptr)[rows] > 0]  # Users who want something
+        sample = np.random.default_rng(0).choice(rows, size=min(sample_size, len(rows)), replace=False)
+        queries = self.search_vectors(self.wanted_matrix, sample)
+        k = min(k, self.faiss_index.ntotal)
+        
+        exact_index = create_faiss_index(self.search_dim, dict(self.index_config, type='flat'))
+        indexed_rows = np.array(sorted(self.user_id_to_index.values()), dtype=np.int64)
+        self.add_vectors(exact_index, indexed_rows)
+        
+        start = time.perf_counter()
+        exact_scores, exact_ids = exact_index.search(queries, k)
+        exact_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        approx_scores, approx_ids = self.faiss_index.search(queries, k)
+        approx_seconds = time.perf_counter() - start
+        
+        # Binary skill vectors tie a lot, so any hit scoring at least the
+        # exact k-th best score counts as found (only real matches count)
+        found = relevant = 0
+        for exact_row, approx_row in zip(exact_scores, approx_scores):
+            expected = exact_row[exact_row > 0]
+            if len(expected):
+                found += min(int(np.sum(approx_row >= expected[-1] - 1e-6)), len(expected))
+                relevant += len(expected)
+        
+        return {
+            'index': self.effective_index_config(),
+            'users': len(indexed_rows),
+            'queries': len(sample),
+            'k': k,
+            f'recall@{k}': round(found / relevant, 4) if relevant else 1.0,
+            'exact_ms_per_query': round(exact_seconds * 1000 / max(len(sample), 1), 4),
+            'index_ms_per_query': round(approx_seconds * 1000 / max(len(sample), 1), 4),
+        }
+    
+    def fetch_changes(self):
+        """
+        Find users changed since the last load. Returns (changed_rows,
+        removed_ids) and advances last_sync_at.
+        """
+        sync_at, changed_ids, active_ids = self.source.fetch_changes(self.last_sync_at)
+        removed_ids = set(self.user_id_to_index) - active_ids
+        changed_rows = self.source.fetch_users(changed_ids & active_ids) if changed_ids else []
+        self.last_sync_at = sync_at
+        return changed_rows, removed_ids
+    
+    def ensure_writable_index(self):
+        """Swap memory-mapped snapshot indexes for private in-memory copies before mutating them"""
+        import faiss
+        if self.index_path:
+            self.faiss_index = faiss.read_index(self.index_path)
+            apply_search_params(self.faiss_index, self.index_config)
+            self.index_path = None
+        if self.reciprocal_index_path:
+            self.reciprocal_index = faiss.read_index(self.reciprocal_index_path)
+            apply_search_params(self.reciprocal_index, self.index_config)
+            self.reciprocal_index_path = None
+    
+    def user_version(self, user_id):
+        """
+        Digest of what results read about a user (display fields, exclusions,
+        ban), so every process that applied the same update agrees on it
+        """
+        row = self.user_id_to_index.get(user_id)
+        state = [
+            self.user_record(row) if row is not None else None,
+            sorted(self.excluded_pairs.get(user_id, ())),
+            user_id in self.banned_user_ids,
+        ]
+        return hashlib.blake2b(json.dumps(state).encode('utf-8'), digest_size=8).hexdigest()
+    
+    def bump_user_versions(self, user_ids):
+        """Re-stamp users from their current state, which invalidates cached results they appear in if it changed"""
+        for uid in user_ids:
+            self.user_versions[uid] = self.user_version(uid)
+    
+    def remove_users(self, user_ids):
+        """Drop users from the profiles and the FAISS index"""
+        self.ensure_writable_index()
+        self.bump_user_versions(user_ids)
+        self.search_selector = None
+        ids = [self.user_id_to_index.pop(uid) for uid in user_ids if uid in self.user_id_to_index]
+        # HNSW graphs cannot drop vectors; their ids stay as tombstones
+        # that Layer 1 skips until the next full rebuild
+        if ids and self.index_config['type'] != 'hnsw':
+            for index in (self.faiss_index, self.reciprocal_index):
+                if index is not None:
+                    index.remove_ids(np.array(ids, dtype=np.int64))
+        for idx in ids:
+            self.index_to_user_id[idx] = None
+    
+    def apply_user_updates(self, rows, removed_ids=()):
+        """
+        Upsert changed user rows and remove deleted ones without rebuilding
+        the encodings or the index. Returns False when the change needs a
+        full rebuild (spare skill columns exhausted).
+        """
+        from scipy import sparse
+        for user in rows:
+            if not self.add_skill_columns((user['skills_offered'] or []) + (user['skills_wanted'] or [])):
+                return False
+        
+        self.remove_users(list(removed_ids) + [user['id'] for user in rows])
+        if not rows:
+            return True
+        
+        # Changed users get fresh rows (and FAISS ids) at the end
+        first_row = self.offered_matrix.shape[0]
+        self.offered_matrix = sparse.vstack(
+            [self.offered_matrix, self.encode_skill_matrix([user['skills_offered'] for user in rows])], format='csr'
+        )
+        self.wanted_matrix = sparse.vstack(
+            [self.wanted_matrix, self.encode_skill_matrix([user['skills_wanted'] for user in rows])], format='csr'
+        )
+        
+        self.profiles.append(rows)
+        self.append_user_features(rows, self.profiles.location_codes[first_row:])
+        for idx, user in enumerate(rows, start=first_row):
+            self.index_to_user_id.append(user['id'])
+            self.user_id_to_index[user['id']] = idx
+        
+        self.add_to_index(np.arange(first_row, first_row + len(rows)))
+        self.bump_user_versions([user['id'] for user in rows])
+        return True
+    
+    def refresh(self, user_ids=None):
+        """
+        Incrementally pick up changes since the last load (or just the given
+        users), falling back to a full rebuild only when required
+        """
+        try:
+            if not self.connect_db():
+                raise RuntimeError("Data source connection required for refresh")
+            
+            if not self.source.incremental:
+                # File and synthetic sources cannot say what changed
+                return self.reload()
+            
+            with self.metrics.span('refresh_fetch'):
+                if user_ids is None:
+                    rows, removed_ids = self.fetch_changes()
+                else:
+                    rows = self.source.fetch_users(user_ids)
+                    removed_ids = set(user_ids) - {user['id'] for user in rows}
+                changed_ids = {user['id'] for user in rows} | set(removed_ids)
+                exclusions = self.source.fetch_exclusions(changed_ids)
+            self.update_exclusions(*exclusions, changed_ids)
+            
+            with self.metrics.span('refresh_apply'):
+                applied = self.apply_user_updates(rows, removed_ids)
+            if applied:
+                return {"updated": len(rows), "removed": len(removed_ids), "rebuilt": False}
+            
+            print("🔁 Skill vocabulary full, rebuilding...", file=sys.stderr)
+            return self.reload()
+            
+        except Exception as e:
+            print(f"Incremental refresh error: {e}", file=sys.stderr)
+            raise
+    
+    def reload(self):
+        """Full in-place reload from the data source"""
+        with self.metrics.span('db_fetch'):
+            fetched = self.fetch_data()
+        if not (fetched and self.build()):
+            raise RuntimeError("Full rebuild failed")
+        return {"updated": len(self.user_id_to_index), "removed": 0, "rebuilt": True}
+    
+    def layer1_skill_matching(self, target_user_id, k=50, mode='standard', near_km=None):
         """
         Layer 1: FAISS-based skill matching
         Find users whose offered skills match target user's wanted skills
+        (and, in reciprocal mode, whose wanted skills match what the target offers)
+        """
+        return self.layer1_skill_matching_batch([target_user_id], k, mode, near_km)[0]
+    
+    def layer1_skill_matching_batch(self, target_user_ids, k=50, mode='standard', near_km=None):
+        """
+        Layer 1 for many target users at once: the query vectors are stacked
+        into one matrix and answered by a single FAISS search.
+        
+        Standard mode searches wanted against offered skills. Reciprocal mode
+        searches the [offered | wanted] index, ranking by the mean of both
+        directions so mutual matches come first; skill_match_score stays the
+        one-way score Layer 2 was trained on.
+        
+        Banned users and removed rows are skipped inside FAISS (see
+        layer1_search_params); self, pending swaps and already rated users
+        differ per target and are filtered here, with k raised to make room.
+        Targets still short of k eligible candidates are searched again with
+        a doubled k until enough are found or no more matches exist.
+        
+        The search k of a target depends only on its own exclusions, and
+        equal scores are ordered by row, so a user gets the same candidates
+        whichever other users share the batch (targets with the same k are
+        searched together).
+        
+        With near_km, only users within that many km of the target are
+        candidates (see layer1_nearby).
         """
         try:
-            if target_user_id not in self.user_profiles:
-                return []
+            targets = [uid for uid in target_user_ids if uid in self.user_id_to_index]
+            candidates_by_user = {uid: [] for uid in target_user_ids}
+            if not targets:
+                return [candidates_by_user[uid] for uid in target_user_ids]
+            
+            if near_km:
+                with self.metrics.span('layer1_nearby'):
+                    for uid in targets:
+                        candidates_by_user[uid] = self.layer1_nearby(uid, k, mode, near_km)
+                return [candidates_by_user[uid] for uid in target_user_ids]
             
-            target_wanted = self.user_profiles[target_user_id]['wanted_vector']
+            if mode == 'reciprocal':
+                if self.reciprocal_index is None:
+                    print("🔁 Building reciprocal index...", file=sys.stderr)
+                    self.build_reciprocal_index()
+                index, span = self.reciprocal_index, 'layer1_reciprocal_search'
+            else:
+                index, span = self.faiss_index, 'layer1_search'
             
-            # Normalize target vector
-            target_wanted = target_wanted.astype(np.float32).reshape(1, -1)
-            target_wanted_norm = target_wanted / np.linalg.norm(target_wanted) if np.linalg.norm(target_wanted) > 0 else target_wanted
+            target_rows = [self.user_id_to_index[uid] for uid in targets]
             
-            # Search for similar offered skills
-            scores, indices = self.faiss_index.search(target_wanted_norm, min(k, len(self.index_to_user_id)))
+            # Normalize target vectors
+            queries = self.query_vectors(target_rows, mode)
             
-            candidates = []
-            for score, idx in zip(scores[0], indices[0]):
-                if idx < len(self.index_to_user_id):
-                    candidate_id = self.index_to_user_id[idx]
-                    if candidate_id != target_user_id and score > 0:  # Don't recommend self and must have some skill match
+            params = self.layer1_search_params(index)
+            ntotal = index.ntotal
+            excluded = [self.excluded_pairs.get(uid, ()) for uid in targets]
+            max_k = min(ntotal, max(k, LAYER1_MAX_K))
+            # Room for self, plus k for targets with exclusions (two search
+            # sizes keep the batch to few searches); targets with more
+            # exclusions go through expansion
+            pending = {}  # search k -> targets searched with it
+            for target, ids in enumerate(excluded):
+                pending.setdefault(min(k + 1 + (k if ids else 0), max_k), []).append(target)
+            # Matches each target went through in its last (largest) search
+            retrieved = [0] * len(targets)
+            
+            while pending:
+                search_k = min(pending)
+                group = np.array(pending.pop(search_k))
+                # Search for similar offered skills
+                with self.metrics.span(span):
+                    scores, indices = index.search(queries[group], search_k, params=params)
+                # Order equal scores by row so ties never depend on the search
+                order = np.lexsort((indices, -scores), axis=-1)
+                scores = np.take_along_axis(scores, order, axis=-1)
+                indices = np.take_along_axis(indices, order, axis=-1)
+                
+                short = []
+                for row, target in enumerate(group):
+                    target_user_id = targets[target]
+                    candidates = candidates_by_user[target_user_id] = []
+                    retrieved[target] = 0
+                    for score, idx in zip(scores[row], indices[row]):
+                        if score <= 0 or idx < 0:  # Must have some skill match
+                            break
+                        retrieved[target] += 1
+                        candidate_id = self.index_to_user_id[idx]
+                        # Don't recommend self, removed or excluded users
+                        if candidate_id is None or candidate_id == target_user_id or candidate_id in excluded[target]:
+                            continue
                         candidates.append({
                             'user_id': candidate_id,
-                            'skill_match_score': float(score),
-                            'user_data': self.user_profiles[candidate_id]['user_data']
+                            'row': int(idx),
+                            'skill_match_score': float(score)
                         })
+                        if len(candidates) == k:
+                            break
+                    
+                    # Every result was a positive match, so more may exist
+                    if len(candidates) < k and indices[row, -1] >= 0 and scores[row, -1] > 0:
+                        short.append(target)
+                
+                if short and search_k < min(ntotal, LAYER1_MAX_K):
+                    pending.setdefault(min(search_k * 2, ntotal, LAYER1_MAX_K), []).extend(short)
+                    self.metrics.increment('layer1_expansions')
+                    self.metrics.increment('layer1_expanded_queries', len(short))
             
-            return candidates
+            if mode == 'reciprocal':
+                self.split_reciprocal_scores(targets, target_rows, candidates_by_user)
+            
+            kept = sum(len(candidates) for candidates in candidates_by_user.values())
+            self.metrics.increment('candidates_retrieved', sum(retrieved))
+            self.metrics.increment('candidates_filtered', sum(retrieved) - kept)
+            return [candidates_by_user[uid] for uid in target_user_ids]
             
         except Exception as e:
             print(f"Layer 1 matching error: {e}", file=sys.stderr)
-            return []
+            return [[] for _ in target_user_ids]
     
-    def calculate_location_similarity(self, location1, location2):
-        """Calculate location similarity (city/state level)"""
-        if not location1 or not location2:
-            return 0.0
+    def layer1_nearby(self, target_user_id, k, mode, near_km):
+        """
+        Layer 1 restricted to users within near_km of the target: rows in the
+        geo buckets around the target's coordinates are filtered by exact
+        distance and scored directly, which stays exact however few users
+        are nearby (a FAISS search would need a huge k to find them)
+        """
+        target_row = self.user_id_to_index[target_user_id]
+        lat, lon = self.user_features['lat'][target_row], self.user_features['lon'][target_row]
+        if np.isnan(lat):
+            return []  # Location not in the gazetteer
+        
+        if self.geo_buckets is None:
+            self.geo_buckets = GeoBuckets(self.user_features['lat'], self.user_features['lon'])
+        rows = self.geo_buckets.rows_near(lat, lon, near_km)
+        rows = rows[haversine_km(lat, lon, self.user_features['lat'][rows], self.user_features['lon'][rows]) <= near_km]
         
-        # Simple city/state matching
-        loc1_parts = location1.lower().split(',')
-        loc2_parts = location2.lower().split(',')
+        target_rows = np.full(len(rows), target_row, dtype=np.int64)
+        scores = self.pair_skill_scores(target_rows, rows)
+        combined = (scores + self.pair_skill_scores(target_rows, rows, reverse=True)) / 2 if mode == 'reciprocal' else scores
+        order = np.argsort(-combined, kind='stable')
+        order = order[combined[order] > 0]  # Must have some skill match
         
-        if len(loc1_parts) >= 2 and len(loc2_parts) >= 2:
-            # Same city and state
-            if loc1_parts[0].strip() == loc2_parts[0].strip() and loc1_parts[1].strip() == loc2_parts[1].strip():
-                return 1.0
-            # Same state
-            elif loc1_parts[1].strip() == loc2_parts[1].strip():
-                return 0.6
+        excluded = self.excluded_pairs.get(target_user_id, ())
+        candidates = []
+        retrieved = 0
+        for position in order:
+            retrieved += 1
+            row = int(rows[position])
+            candidate_id = self.index_to_user_id[row]
+            # Don't recommend self, removed, banned or excluded users
+            if (candidate_id is None or candidate_id == target_user_id
+                    or candidate_id in self.banned_user_ids or candidate_id in excluded):
+                continue
+            candidate = {'user_id': candidate_id, 'row': row, 'skill_match_score': float(scores[position])}
+            if mode == 'reciprocal':
+                candidate['reciprocal_score'] = float(combined[position])
+            candidates.append(candidate)
+            if len(candidates) == k:
+                break
+        
+        self.metrics.increment('candidates_retrieved', retrieved)
+        self.metrics.increment('candidates_filtered', retrieved - len(candidates))
+        return candidates
+    
+    def split_reciprocal_scores(self, targets, target_rows, candidates_by_user):
+        """Keep the combined score as reciprocal_score and put the one-way score in skill_match_score"""
+        pair_targets = []
+        pair_rows = []
+        for target_user_id, target_row in zip(targets, target_rows):
+            for candidate in candidates_by_user[target_user_id]:
+                pair_targets.append(target_row)
+                pair_rows.append(candidate['row'])
+        if not pair_rows:
+            return
         
-        return 0.0
+        one_way = self.pair_skill_scores(np.array(pair_targets, dtype=np.int64), np.array(pair_rows, dtype=np.int64))
+        position = 0
+        for target_user_id in targets:
+            for candidate in candidates_by_user[target_user_id]:
+                candidate['reciprocal_score'] = candidate['skill_match_score']
+                candidate['skill_match_score'] = float(one_way[position])
+                position += 1
+    
+    def pair_skill_scores(self, target_rows, rows, reverse=False):
+        """
+        Layer-1 (wanted . offered) cosine similarity for (target, candidate)
+        row pairs; reverse scores the target's offered against the
+        candidate's wanted skills instead
+        """
+        wanted, offered = (self.offered_matrix, self.wanted_matrix) if reverse else (self.wanted_matrix, self.offered_matrix)
+        if self.encoder == 'embedding':
+            scores = np.empty(len(rows), dtype=np.float64)
+            for start in range(0, len(rows), INDEX_ADD_BATCH_SIZE):
+                end = start + INDEX_ADD_BATCH_SIZE
+                scores[start:end] = np.einsum(
+                    'ij,ij->i',
+                    self.search_vectors(wanted, target_rows[start:end]),
+                    self.search_vectors(offered, rows[start:end])
+                )
+            return scores
+        
+        overlap = pair_overlap_counts(wanted, target_rows, offered, rows)
+        norms = np.sqrt(np.diff(wanted.indptr)[target_rows] * np.diff(offered.indptr)[rows])
+        return overlap / np.maximum(norms, 1.0)
+    
+    def layer1_search_params(self, index):
+        """
+        FAISS search parameters for an index whose ID selector skips banned
+        users and removed rows (HNSW tombstones), or None when nothing is
+        excluded
+        """
+        import faiss
+        if self.search_selector is None:
+            n_rows = len(self.index_to_user_id)
+            allowed = np.fromiter((uid is not None for uid in self.index_to_user_id), dtype=bool, count=n_rows)
+            banned_rows = [self.user_id_to_index[uid] for uid in self.banned_user_ids if uid in self.user_id_to_index]
+            allowed[banned_rows] = False
+            
+            if allowed.all():
+                self.search_selector = (None, None)
+            else:
+                bitmap = np.packbits(allowed, bitorder='little')
+                # FAISS keeps a raw pointer; hold on to the bitmap too
+                self.search_selector = (faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap)
+        
+        selector = self.search_selector[0]
+        if selector is None:
+            return None
+        
+        if self.index_config['type'] == 'ivf':
+            params = faiss.SearchParametersIVF()
+            params.nprobe = faiss.extract_index_ivf(index).nprobe
+        elif self.index_config['type'] == 'hnsw':
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = self.index_config['ef_search']
+        else:
+            params = faiss.SearchParameters()
+        params.sel = selector
+        return params
+    
+    def intern_location(self, key):
+        """Dense integer code for a location key"""
+        code = self.location_codes.get(key)
+        if code is None:
+            code = self.location_codes[key] = len(self.location_codes)
+        return code
+    
+    def parse_location(self, location):
+        """
+        Resolve a free-text location once through the gazetteer into
+        (location, city, state) codes, -1 where unknown, and its (lat, lon),
+        NaN where unknown. City codes include the state, as does matching.
+        """
+        place = self.gazetteer.resolve(location)
+        if place is None:
+            return (-1, -1, -1), (np.nan, np.nan)
+        
+        location_code = self.intern_location(place.key)
+        city_code = self.intern_location(('city', place.city, place.state)) if place.city and place.state else -1
+        state_code = self.intern_location(('state', place.state)) if place.state else -1
+        coords = (place.lat, place.lon) if place.lat is not None else (np.nan, np.nan)
+        return (location_code, city_code, state_code), coords
+    
+    def location_features(self, location_codes):
+        """
+        (location, city, state) feature codes and (lat, lon) of rows given
+        their codes in the profile location table; each distinct location is
+        parsed only once
+        """
+        table = self.profiles.locations.values
+        for location in table[len(self.location_parts):]:
+            codes, coords = self.parse_location(location)
+            self.location_parts.append(codes)
+            self.location_coords.append(coords)
+        # Code -1 (no location) picks the unknown entry at the end
+        parts = np.array(self.location_parts + [(-1, -1, -1)], dtype=np.int32).reshape(-1, 3)
+        coords = np.array(self.location_coords + [(np.nan, np.nan)], dtype=np.float64).reshape(-1, 2)
+        return parts[location_codes], coords[location_codes]
+    
+    def compute_user_features(self, users, location_codes):
+        """
+        Per-user feature columns (aligned with matrix rows) used by Layer 2,
+        match reasons and display, for users as the data sources return them
+        """
+        return self.feature_columns(
+            location_codes,
+            np.array([user['experience_years'] for user in users], dtype=np.float64),
+            np.array([float(user['avg_rating']) for user in users], dtype=np.float64),
+            np.array([int(user['total_ratings']) for user in users], dtype=np.int64),
+            np.array([int(user['completed_sessions']) for user in users], dtype=np.int64)
+        )
+    
+    def feature_columns(self, location_codes, experience, avg_rating, total_ratings, completed):
+        """Feature columns from the rows' profile location codes and numeric fields"""
+        location_codes, coords = self.location_features(location_codes)
+        experience = np.asarray(experience, dtype=np.float64)
+        avg_rating = np.asarray(avg_rating, dtype=np.float64)
+        total_ratings = np.asarray(total_ratings, dtype=np.int64)
+        completed = np.asarray(completed, dtype=np.int64)
+        
+        return {
+            'location_code': location_codes[:, 0],
+            'city_code': location_codes[:, 1],
+            'state_code': location_codes[:, 2],
+            'lat': coords[:, 0],
+            'lon': coords[:, 1],
+            'experience_years': experience,
+            'avg_rating': avg_rating,
+            'total_ratings': total_ratings,
+            'completed_sessions': completed,
+            **reputation_columns(avg_rating, total_ratings, completed),
+        }
+    
+    def append_user_features(self, users, location_codes):
+        """Extend the feature columns with rows for newly added users"""
+        new_features = self.compute_user_features(users, location_codes)
+        self.geo_buckets = None
+        self.user_features = {
+            name: np.concatenate([self.user_features[name], column])
+            for name, column in new_features.items()
+        }
     
     def create_layer2_features(self, target_user_id, candidates):
-        """Create features for Random Forest re-ranking"""
+        """
+        Create features for Layer-2 re-ranking. All seven features are
+        computed for every candidate at once from the per-user feature columns.
+        """
         try:
-            target_user = self.user_profiles[target_user_id]['user_data']
-            features = []
+            target_row = self.user_id_to_index[target_user_id]
+            rows = np.fromiter((candidate['row'] for candidate in candidates), dtype=np.int64, count=len(candidates))
             
-            for candidate in candidates:
-                candidate_data = candidate['user_data']
-                
-                # Feature 1: Skill match score from Layer 1
-                skill_score = candidate['skill_match_score']
-                
-                # Feature 2: Location similarity
-                location_sim = self.calculate_location_similarity(
-                    target_user['location'], 
-                    candidate_data['location']
-                )
-                
-                # Feature 3: Experience difference (normalized)
-                exp_diff = abs(target_user['experience_years'] - candidate_data['experience_years'])
-                exp_similarity = 1.0 / (1.0 + exp_diff * 0.1)  # Decay function
-                
-                # Feature 4: Average rating of candidate
-                avg_rating = float(candidate_data['avg_rating']) / 5.0  # Normalize to 0-1
-                
-                # Feature 5: Number of ratings (reputation indicator)
-                rating_count = min(int(candidate_data['total_ratings']), 20) / 20.0  # Cap at 20
-                
-                # Feature 6: Number of completed sessions
-                session_count = min(int(candidate_data['completed_sessions']), 10) / 10.0  # Cap at 10
-                
-                # Feature 7: Bidirectional skill match (bonus for mutual learning)
-                target_offered = set(target_user['skills_offered'] or [])
-                candidate_wanted = set(candidate_data['skills_wanted'] or [])
-                bidirectional_bonus = len(target_offered.intersection(candidate_wanted)) / max(len(target_offered), 1)
-                
-                features.append([
-                    skill_score,
-                    location_sim,
-                    exp_similarity,
-                    avg_rating,
-                    rating_count,
-                    session_count,
-                    bidirectional_bonus
-                ])
-            
-            return np.array(features)
+            # Feature 1: Skill match score from Layer 1
+            skill_score = np.fromiter(
+                (candidate['skill_match_score'] for candidate in candidates), dtype=np.float64, count=len(candidates)
+            )
+            
+            return self.create_pair_features(target_row, rows, skill_score)
             
         except Exception as e:
             print(f"Feature creation error: {e}", file=sys.stderr)
             return np.array([])
     
-    def train_rf_model(self):
-        """Train Random Forest model on existing user interactions"""
+    def create_pair_features(self, target_rows, rows, skill_score, reputation=None):
+        """
+        The seven Layer-2 features for (target, candidate) row pairs.
+        target_rows is either one row shared by all candidates (serving) or
+        one row per candidate (training pairs). reputation replaces the
+        candidates' reputation columns (see reputation_columns) per pair.
+        """
+        features = self.user_features
+        if reputation is None:
+            reputation = {name: features[name][rows] for name in ('rating_norm', 'rating_count_norm', 'session_norm')}
+        
+        # Feature 2: Location similarity (same city and state / same state,
+        # or by distance, see LOCATION_MODELS)
+        target_city = features['city_code'][target_rows]
+        target_state = features['state_code'][target_rows]
+        same_city = (target_city >= 0) & (features['city_code'][rows] == target_city)
+        same_state = (target_state >= 0) & (features['state_code'][rows] == target_state)
+        location_sim = np.where(same_city, 1.0, np.where(same_state, 0.6, 0.0))
+        if self.location_model == 'distance':
+            # Distance decay wherever both users have gazetteer coordinates
+            distance = haversine_km(
+                features['lat'][target_rows], features['lon'][target_rows], features['lat'][rows], features['lon'][rows]
+            )
+            location_sim = np.where(np.isnan(distance), location_sim, 0.5 ** (distance / GEO_HALF_LIFE_KM))
+        
+        # Feature 3: Experience difference (normalized)
+        exp_diff = np.abs(features['experience_years'][rows] - features['experience_years'][target_rows])
+        exp_similarity = 1.0 / (1.0 + exp_diff * 0.1)  # Decay function
+        
+        # Feature 7: Bidirectional skill match (bonus for mutual learning),
+        # shared columns of target offered and candidate wanted skills
+        offered = self.offered_matrix
+        if np.ndim(target_rows) == 0:
+            target_offered = offered.indices[offered.indptr[target_rows]:offered.indptr[target_rows + 1]]
+            offered_mask = np.zeros(self.wanted_matrix.shape[1], dtype=bool)
+            offered_mask[target_offered] = True
+            mutual_counts = row_overlap_counts(self.wanted_matrix, rows, offered_mask)
+            offered_counts = len(target_offered)
+        else:
+            mutual_counts = pair_overlap_counts(offered, target_rows, self.wanted_matrix, rows)
+            offered_counts = np.diff(offered.indptr)[target_rows]
+        bidirectional_bonus = mutual_counts / np.maximum(offered_counts, 1)
+        
+        return np.column_stack([
+            skill_score,
+            location_sim,
+            exp_similarity,
+            reputation['rating_norm'],         # Feature 4: Average rating of candidate
+            reputation['rating_count_norm'],   # Feature 5: Number of ratings (reputation indicator)
+            reputation['session_norm'],        # Feature 6: Number of completed sessions
+            bidirectional_bonus
+        ])
+    
+    def create_training_set(self, pairs):
+        """
+        Layer-2 features and labels for labeled (target_id, candidate_id,
+        label, rating, completed) pairs between indexed users. The skill
+        match score is the same cosine similarity Layer 1 returns.
+        
+        The candidate's rating and session totals already include the
+        rating or completed swap a pair's label comes from, so that outcome
+        is left out of its reputation features; otherwise they leak the label.
+        """
+        pairs = [
+            (self.user_id_to_index[target_id], self.user_id_to_index[candidate_id], label, rating, completed)
+            for target_id, candidate_id, label, rating, completed in pairs
+            if target_id != candidate_id and target_id in self.user_id_to_index and candidate_id in self.user_id_to_index
+        ]
+        if not pairs:
+            return np.empty((0, 7)), np.empty(0, dtype=np.int64)
+        
+        target_rows, rows, labels, ratings, completed = (np.array(column, dtype=np.int64) for column in zip(*pairs))
+        skill_score = self.pair_skill_scores(target_rows, rows)
+        
+        # Leave-one-out totals of the candidate
+        features = self.user_features
+        total_ratings = features['total_ratings'][rows]
+        rating_sums = features['avg_rating'][rows] * total_ratings - ratings
+        total_ratings = np.maximum(total_ratings - (ratings > 0), 0)
+        avg_rating = np.where(total_ratings > 0, np.maximum(rating_sums, 0) / np.maximum(total_ratings, 1), 0.0)
+        sessions = np.maximum(features['completed_sessions'][rows] - completed, 0)
+        reputation = reputation_columns(avg_rating, total_ratings, sessions)
+        return self.create_pair_features(target_rows, rows, skill_score, reputation), labels
+    
+    def train_ranker(self):
+        """
+        Offline: train a ranker on the labeled pairs of the loaded users.
+        Returns (LinearRanker, metrics).
+        """
+        features, labels = self.create_training_set(self.source.fetch_training_pairs())
+        return train_ranker(features, labels)
+    
+    def load_ranker(self):
+        """Load the trained ranker, keeping the default weights when none is configured"""
         try:
-            # For now, use a simple heuristic-based training
-            # In production, you'd use actual user interaction data
-            
-            # Generate synthetic training data based on successful matches
-            training_features = []
-            training_targets = []
-            
-            # Create positive examples from successful interactions
-            for user in self.users_data:
-                if user['completed_sessions'] > 0:
-                    # High-quality match example
-                    features = [
-                        0.8,  # Good skill match
-                        0.7,  # Same location preference
-                        0.9,  # Similar experience
-                        0.8,  # Good rating
-                        0.6,  # Some reputation
-                        0.7,  # Some sessions
-                        0.6   # Some bidirectional potential
-                    ]
-                    training_features.append(features)
-                    training_targets.append(5.0)  # High score
-                
-                # Add negative examples (random combinations)
-                negative_features = [
-                    0.2,  # Poor skill match
-                    0.0,  # Different location
-                    0.3,  # Very different experience
-                    0.0,  # No ratings
-                    0.0,  # No reputation
-                    0.0,  # No sessions
-                    0.0   # No bidirectional potential
-                ]
-                training_features.append(negative_features)
-                training_targets.append(1.0)  # Low score
-            
-            if len(training_features) > 0:
-                X = np.array(training_features)
-                y = np.array(training_targets)
-                
-                # Fit scaler and model
-                X_scaled = self.scaler.fit_transform(X)
-                self.rf_model.fit(X_scaled, y)
-                
-                return True
-            
-            return False
+            if self.ranker_path:
+                self.ranker = LinearRanker.load(self.ranker_path)
+            return True
             
         except Exception as e:
-            print(f"RF training error: {e}", file=sys.stderr)
+            print(f"Ranker load error: {e}", file=sys.stderr)
             return False
     
     def layer2_reranking(self, target_user_id, candidates):
         """
-        Layer 2: Random Forest re-ranking
+        Layer 2: Learned re-ranking
         Re-rank candidates based on multiple factors
         """
+        return self.layer2_reranking_batch([target_user_id], [candidates])[0]
+    
+    def layer2_reranking_batch(self, target_user_ids, candidate_lists):
+        """
+        Layer 2 for many target users at once: features for every
+        (target, candidate) pair are stacked and scored by a single predict
+        """
         try:
-            if not candidates:
-                return []
+            feature_blocks = []
+            with self.metrics.span('layer2_features'):
+                for target_user_id, candidates in zip(target_user_ids, candidate_lists):
+                    if candidates:
+                        feature_blocks.append(self.create_layer2_features(target_user_id, candidates))
             
-            # Create features for all candidates
-            features = self.create_layer2_features(target_user_id, candidates)
+            if not feature_blocks:
+                return [list(candidates) for candidates in candidate_lists]
             
+            features = np.vstack(feature_blocks)
             if features.size == 0:
-                return candidates
-            
-            # Scale features and predict scores
-            features_scaled = self.scaler.transform(features)
-            rf_scores = self.rf_model.predict(features_scaled)
-            
-            # Add RF scores to candidates and sort
-            for i, candidate in enumerate(candidates):
-                candidate['final_score'] = float(rf_scores[i])
-                # Ensure layer1_score exists (it should from layer1_skill_matching)
-                if 'skill_match_score' in candidate:
-                    candidate['layer1_score'] = candidate['skill_match_score']
-                else:
-                    candidate['layer1_score'] = 0.0
+                return [list(candidates) for candidates in candidate_lists]
             
-            # Sort by final score (descending)
-            candidates_ranked = sorted(candidates, key=lambda x: x['final_score'], reverse=True)
+            # One matrix-vector product scores every candidate
+            with self.metrics.span('layer2_predict'):
+                scores = self.ranker.predict(features)
             
-            return candidates_ranked
+            ranked_lists = []
+            offset = 0
+            for candidates in candidate_lists:
+                # Add ranker scores to candidates and sort
+                for i, candidate in enumerate(candidates):
+                    candidate['final_score'] = float(scores[offset + i])
+                    # Ensure layer1_score exists (it should from layer1_skill_matching)
+                    candidate['layer1_score'] = candidate.get('skill_match_score', 0.0)
+                offset += len(candidates)
+                
+                # Sort by final score (descending)
+                ranked_lists.append(sorted(candidates, key=lambda x: x['final_score'], reverse=True))
+            
+            return ranked_lists
             
         except Exception as e:
             print(f"Layer 2 reranking error: {e}", file=sys.stderr)
-            return candidates
+            return [list(candidates) for candidates in candidate_lists]
+    
+    def user_record(self, row):
+        """Display fields of the user at a row, materialized from the columns"""
+        features = self.user_features
+        return {
+            'name': self.profiles.name(row),
+            'location': self.profiles.location(row),
+            'experience_years': int(features['experience_years'][row]),
+            'skills_offered': self.profiles.skill_list('skills_offered', row),
+            'skills_wanted': self.profiles.skill_list('skills_wanted', row),
+            'avg_rating': float(features['avg_rating'][row]),
+            'total_ratings': int(features['total_ratings'][row]),
+            'completed_sessions': int(features['completed_sessions'][row]),
+        }
     
-    def get_recommendations(self, target_user_id, limit=10):
-        """Main recommendation pipeline"""
+    def format_recommendation(self, target_user_id, candidate):
+        """Format a ranked candidate as a recommendation entry (the only place display fields are read)"""
+        with self.metrics.span('match_reasons'):
+            match_reasons = self.generate_match_reasons(target_user_id, candidate)
+        recommendation = {
+            'user_id': candidate['user_id'],
+            **self.user_record(candidate['row']),
+            'skill_match_score': candidate.get('layer1_score', candidate.get('skill_match_score', 0.0)),
+            'final_score': candidate.get('final_score', candidate.get('skill_match_score', 0.0)),
+            'match_reasons': match_reasons
+        }
+        if 'reciprocal_score' in candidate:
+            recommendation['reciprocal_score'] = candidate['reciprocal_score']
+        return recommendation
+    
+    def get_recommendations(self, target_user_id, limit=10, mode='standard', near_km=None):
+        """Main recommendation pipeline (near_km: only users within that many km)"""
+        self.metrics.increment('requests')
+        cached = self.cache.get(target_user_id, limit, self.cache_stamp, mode, near_km)
+        if cached is not None:
+            return cached
+        
         try:
-            # Layer 1: Skill-based candidate retrieval
-            candidates = self.layer1_skill_matching(target_user_id, k=50)
-            
-            if not candidates:
-                return []
-            
-            # Layer 2: Multi-factor re-ranking
-            ranked_candidates = self.layer2_reranking(target_user_id, candidates)
-            
-            # Format final results
-            recommendations = []
-            for candidate in ranked_candidates[:limit]:
-                user_data = candidate['user_data']
-                recommendations.append({
-                    'user_id': candidate['user_id'],
-                    'name': user_data['name'],
-                    'location': user_data['location'],
-                    'experience_years': user_data['experience_years'],
-                    'skills_offered': user_data['skills_offered'],
-                    'skills_wanted': user_data['skills_wanted'],
-                    'avg_rating': float(user_data['avg_rating']),
-                    'total_ratings': int(user_data['total_ratings']),
-                    'completed_sessions': int(user_data['completed_sessions']),
-                    'skill_match_score': candidate.get('layer1_score', candidate.get('skill_match_score', 0.0)),
-                    'final_score': candidate.get('final_score', candidate.get('skill_match_score', 0.0)),
-                    'match_reasons': self.generate_match_reasons(target_user_id, candidate)
-                })
+            with self.metrics.span('recommendation'):
+                # Layer 1: Skill-based candidate retrieval
+                candidates = self.layer1_skill_matching(target_user_id, k=max(50, limit), mode=mode, near_km=near_km)
+                
+                if not candidates:
+                    return []
+                
+                # Layer 2: Multi-factor re-ranking
+                ranked_candidates = self.layer2_reranking(target_user_id, candidates)
+                
+                # Format final results
+                recommendations = [
+                    self.format_recommendation(target_user_id, candidate)
+                    for candidate in ranked_candidates[:limit]
+                ]
             
+            self.metrics.increment('recommendations_returned', len(recommendations))
+            self.cache.put(target_user_id, limit, recommendations, self.cache_stamp, mode, near_km)
             return recommendations
             
         except Exception as e:
+            self.metrics.increment('errors')
             print(f"Recommendation error: {e}", file=sys.stderr)
             return []
     
+    def get_recommendations_batch(self, user_ids, limit=10, batch_size=1024, mode='standard', near_km=None):
+        """
+        Batch recommendation pipeline for many users (digests, feed pre-warm).
+        Yields (user_id, recommendations) in input order; each chunk of
+        batch_size users costs one FAISS search and one model predict.
+        """
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            self.metrics.increment('requests', len(chunk))
+            try:
+                with self.metrics.span('recommendation_batch'):
+                    # Layer 1: Skill-based candidate retrieval for the whole chunk
+                    candidate_lists = self.layer1_skill_matching_batch(chunk, k=max(50, limit), mode=mode, near_km=near_km)
+                    
+                    # Layer 2: Multi-factor re-ranking for the whole chunk
+                    ranked_lists = self.layer2_reranking_batch(chunk, candidate_lists)
+                    
+                    results = [
+                        (target_user_id, [
+                            self.format_recommendation(target_user_id, candidate)
+                            for candidate in ranked_candidates[:limit]
+                        ])
+                        for target_user_id, ranked_candidates in zip(chunk, ranked_lists)
+                    ]
+                self.metrics.increment('recommendations_returned', sum(len(recs) for _, recs in results))
+                for target_user_id, recommendations in results:
+                    self.cache.put(target_user_id, limit, recommendations, self.cache_stamp, mode, near_km)
+                
+            except Exception as e:
+                self.metrics.increment('errors')
+                print(f"Batch recommendation error: {e}", file=sys.stderr)
+                results = [(target_user_id, []) for target_user_id in chunk]
+            
+            yield from results
+    
+    def ranked_candidates(self, target_user_id, depth, window, mode='standard', near_km=None):
+        """
+        Ranked candidate list of a paginated request, retrieved deep enough
+        to hold depth candidates when that many exist.
+        
+        The first tier is the usual Layer-1 window of window candidates
+        ranked by Layer 2, so page one matches get_recommendations. Deeper
+        pages double the Layer-1 k (up to LAYER1_MAX_K) and append the newly
+        retrieved candidates, ranked among themselves, so pages already
+        served never change. The list is cached between pages.
+        """
+        cached = self.cache.get_ranked(target_user_id, window, self.cache_stamp, mode, near_km)
+        if cached is not None:
+            # Rows are per process; re-resolve them from the user ids
+            candidates = [
+                {**candidate, 'row': self.user_id_to_index[candidate['user_id']]}
+                for candidate in cached['candidates']
+                if candidate['user_id'] in self.user_id_to_index
+            ]
+            ranked = {'depth': cached['depth'], 'exhausted': cached['exhausted'], 'candidates': candidates}
+        else:
+            ranked = {'depth': 0, 'exhausted': False, 'candidates': []}
+        
+        retrieved = False
+        while len(ranked['candidates']) < depth and not ranked['exhausted']:
+            k = window if not ranked['depth'] else min(ranked['depth'] * 2, max(window, LAYER1_MAX_K))
+            if ranked['depth']:
+                self.metrics.increment('page_deepenings')
+            candidates = self.layer1_skill_matching(target_user_id, k=k, mode=mode, near_km=near_km)
+            seen = {candidate['user_id'] for candidate in ranked['candidates']}
+            tier = [candidate for candidate in candidates if candidate['user_id'] not in seen]
+            if tier:
+                ranked['candidates'] = ranked['candidates'] + self.layer2_reranking(target_user_id, tier)
+            # Layer 1 returns fewer than k only once matches run out
+            ranked['exhausted'] = len(candidates) < k or k >= max(window, LAYER1_MAX_K)
+            ranked['depth'] = k
+            retrieved = True
+        
+        if retrieved:
+            self.cache.put_ranked(target_user_id, window, ranked, self.cache_stamp, mode, near_km)
+        return ranked
+    
+    def rank_page(self, target_user_id, offset=0, limit=10, mode='standard', near_km=None, window=None):
+        """
+        Ranked (unformatted) candidates offset..offset + limit of a paginated
+        request, and whether more follow. window is the first Layer-1 window,
+        max(PAGE_WINDOW, limit) of the first page unless given.
+        """
+        window = window or max(PAGE_WINDOW, limit)
+        self.metrics.increment('requests')
+        if target_user_id not in self.user_id_to_index:
+            return [], False
+        
+        with self.metrics.span('recommendation_page'):
+            # One candidate beyond the page tells whether another page exists
+            ranked = self.ranked_candidates(target_user_id, offset + limit + 1, window, mode, near_km)
+        candidates = ranked['candidates']
+        return candidates[offset:offset + limit], len(candidates) > offset + limit
+    
+    def get_recommendation_page(self, target_user_id, offset=0, limit=10, mode='standard', near_km=None, window=None):
+        """Recommendations offset..offset + limit of a paginated request, and whether more follow"""
+        try:
+            candidates, more = self.rank_page(target_user_id, offset, limit, mode, near_km, window)
+            recommendations = [self.format_recommendation(target_user_id, candidate) for candidate in candidates]
+            self.metrics.increment('recommendations_returned', len(recommendations))
+            return recommendations, more
+            
+        except Exception as e:
+            self.metrics.increment('errors')
+            print(f"Recommendation error: {e}", file=sys.stderr)
+            return [], False
+    
+    def cache_stamp(self, user_ids):
+        """Validation stamp of cached results involving these users"""
+        return [self.data_version] + [self.user_versions.get(uid, '') for uid in user_ids]
+    
+    def shared_skills(self, matrix, row, other_matrix, other_row):
+        """Names of the skills present in both rows of two skill matrices"""
+        columns = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+        other_columns = other_matrix.indices[other_matrix.indptr[other_row]:other_matrix.indptr[other_row + 1]]
+        return [self.all_skills[col] for col in np.intersect1d(columns, other_columns)]
+    
+    def related_skills(self, matrix, row, other_matrix, other_row):
+        """Names of other_row's skills similar (by embedding) to one of row's skills"""
+        columns = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+        other_columns = other_matrix.indices[other_matrix.indptr[other_row]:other_matrix.indptr[other_row + 1]]
+        if not len(columns) or not len(other_columns):
+            return []
+        similarity = self.skill_vectors[other_columns] @ self.skill_vectors[columns].T
+        return [self.all_skills[col] for col in other_columns[similarity.max(axis=1) >= RELATED_SKILL_THRESHOLD]]
+    
     def generate_match_reasons(self, target_user_id, candidate):
         """Generate human-readable reasons for the match"""
         reasons = []
-        target_user = self.user_profiles[target_user_id]['user_data']
-        candidate_data = candidate['user_data']
+        features = self.user_features
+        target_row = self.user_id_to_index[target_user_id]
+        row = candidate['row']
         
         # Skill matching reasons
-        target_wanted = set(target_user['skills_wanted'] or [])
-        candidate_offered = set(candidate_data['skills_offered'] or [])
-        skill_overlap = target_wanted.intersection(candidate_offered)
+        skill_overlap = self.shared_skills(self.wanted_matrix, target_row, self.offered_matrix, row)
         
         if skill_overlap:
-            reasons.append(f"Can teach: {', '.join(list(skill_overlap)[:3])}")
+            reasons.append(f"Can teach: {', '.join(skill_overlap[:3])}")
+        elif self.encoder == 'embedding':
+            related = self.related_skills(self.wanted_matrix, target_row, self.offered_matrix, row)
+            if related:
+                reasons.append(f"Can teach related skills: {', '.join(related[:3])}")
         
         # Bidirectional matching
-        target_offered = set(target_user['skills_offered'] or [])
-        candidate_wanted = set(candidate_data['skills_wanted'] or [])
-        bidirectional_overlap = target_offered.intersection(candidate_wanted)
+        bidirectional_overlap = self.shared_skills(self.offered_matrix, target_row, self.wanted_matrix, row)
         
         if bidirectional_overlap:
-            reasons.append(f"Mutual learning opportunity: {', '.join(list(bidirectional_overlap)[:2])}")
+            reasons.append(f"Mutual learning opportunity: {', '.join(bidirectional_overlap[:2])}")
         
         # Location
-        if target_user['location'] and candidate_data['location']:
-            if target_user['location'].lower() == candidate_data['location'].lower():
+        if features['location_code'][target_row] >= 0 and features['location_code'][row] >= 0:
+            distance = haversine_km(features['lat'][target_row], features['lon'][target_row], features['lat'][row], features['lon'][row])
+            same_city = features['city_code'][target_row] >= 0 and features['city_code'][target_row] == features['city_code'][row]
+            if features['location_code'][target_row] == features['location_code'][row] or same_city:
                 reasons.append("Same location")
-            elif self.calculate_location_similarity(target_user['location'], candidate_data['location']) > 0.5:
+            elif self.location_model == 'distance' and distance <= NEARBY_KM:
+                reasons.append(f"Within {max(round(distance), 1)} km")
+            elif features['state_code'][target_row] >= 0 and features['state_code'][target_row] == features['state_code'][row]:
                 reasons.append("Same area")
         
         # Experience
-        exp_diff = abs(target_user['experience_years'] - candidate_data['experience_years'])
+        target_experience = features['experience_years'][target_row]
+        exp_diff = abs(target_experience - features['experience_years'][row])
         if exp_diff <= 2:
             reasons.append("Similar experience level")
-        elif candidate_data['experience_years'] > target_user['experience_years']:
+        elif features['experience_years'][row] > target_experience:
             reasons.append("More experienced mentor")
         
         # Reputation
-        if candidate_data['avg_rating'] >= 4.0 and candidate_data['total_ratings'] >= 3:
+        if features['avg_rating'][row] >= 4.0 and features['total_ratings'][row] >= 3:
             reasons.append("Highly rated teacher")
         
         return reasons[:4]  # Limit to top 4 reasons
     
+    def save_snapshot(self, root):
+        """
+        Write the built state into a new versioned directory under root and
+        point root/CURRENT at it. Numeric arrays are stored as .npy files so
+        that loading can memory-map them. Returns the snapshot directory.
+        """
+        import faiss
+        version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        snapshot_dir = os.path.join(root, version)
+        tmp_dir = os.path.join(root, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+        
+        def save(name, array):
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        
+        # Feature columns in the dtypes Layer 2 uses, so loading maps them
+        # as they are; profile columns; one entry per index row
+        for name, column in self.user_features.items():
+            save(f"feature_{name}", column)
+        profile_tables = self.profiles.save(save)
+        
+        for name, matrix in (('offered', self.offered_matrix), ('wanted', self.wanted_matrix)):
+            matrix = matrix.tocsr()
+            index_dtype = np.int64 if matrix.nnz >= 2 ** 31 else np.int32
+            save(f"{name}_data", matrix.data.astype(np.float32))
+            save(f"{name}_indices", matrix.indices.astype(index_dtype))
+            save(f"{name}_indptr", matrix.indptr.astype(index_dtype))
+        
+        with open(os.path.join(tmp_dir, 'strings.json'), 'w') as f:
+            json.dump({
+                'user_ids': self.index_to_user_id,
+                'skills': self.all_skills,
+                'profile_tables': profile_tables,
+                'feature_columns': list(self.user_features),
+                'banned_user_ids': sorted(self.banned_user_ids),
+                'excluded_pairs': {uid: sorted(ids) for uid, ids in self.excluded_pairs.items()},
+            }, f)
+        
+        if self.encoder == 'embedding':
+            save('skill_vectors', self.skill_vectors)
+        
+        faiss.write_index(self.faiss_index, os.path.join(tmp_dir, 'index.faiss'))
+        if self.reciprocal_index is not None:
+            faiss.write_index(self.reciprocal_index, os.path.join(tmp_dir, 'reciprocal.faiss'))
+        self.ranker.save(os.path.join(tmp_dir, 'ranker.npz'))
+        
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump({
+                'format_version': SNAPSHOT_FORMAT_VERSION,
+                'version': version,
+                'index': self.effective_index_config(),
+                'encoder': self.encoder,
+                'vector_dim': self.vector_dim,
+                'rows': len(self.index_to_user_id),
+                'users': len(self.user_id_to_index),
+                'last_sync_at': self.last_sync_at.isoformat() if self.last_sync_at else None,
+            }, f, indent=2)
+        
+        # Publish atomically: complete directory first, then the pointer
+        os.rename(tmp_dir, snapshot_dir)
+        pointer_tmp = os.path.join(root, f".{SNAPSHOT_POINTER}.tmp")
+        with open(pointer_tmp, 'w') as f:
+            f.write(version)
+        os.replace(pointer_tmp, os.path.join(root, SNAPSHOT_POINTER))
+        
+        return snapshot_dir
+    
+    def load_snapshot(self, path):
+        """
+        Start from a snapshot instead of Postgres. Arrays and the FAISS index
+        are memory-mapped, so processes loading the same snapshot share pages.
+        """
+        from scipy import sparse
+        try:
+            snapshot_dir = resolve_snapshot_dir(path)
+            with open(os.path.join(snapshot_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+            if manifest['format_version'] != SNAPSHOT_FORMAT_VERSION:
+                raise ValueError(f"Unsupported snapshot format {manifest['format_version']}")
+            
+            def load(name):
+                return np.load(os.path.join(snapshot_dir, f"{name}.npy"), mmap_mode='r')
+            
+            with open(os.path.join(snapshot_dir, 'strings.json')) as f:
+                strings = json.load(f)
+            
+            # Structure (type, nlist, HNSW graph) as built; query-time settings as configured
+            self.index_config = dict(manifest['index'], **self.search_overrides)
+            self.data_version = manifest['version']
+            self.user_versions = {}
+            self.vector_dim = manifest['vector_dim']
+            self.all_skills = strings['skills']
+            self.skill_to_col = {canonical_skill(skill): col for col, skill in enumerate(self.all_skills)}
+            self.encoder = manifest['encoder']
+            # The embedding table is small and grows with new skills, so it is read into memory
+            self.skill_vectors = np.load(os.path.join(snapshot_dir, 'skill_vectors.npy')) if self.encoder == 'embedding' else None
+            self.last_sync_at = datetime.fromisoformat(manifest['last_sync_at']) if manifest['last_sync_at'] else None
+            
+            n_rows = manifest['rows']
+            self.offered_matrix, self.wanted_matrix = (
+                sparse.csr_matrix(
+                    (load(f"{name}_data"), load(f"{name}_indices"), load(f"{name}_indptr")),
+                    shape=(n_rows, self.vector_dim), copy=False
+                )
+                for name in ('offered', 'wanted')
+            )
+            
+            self.index_path = os.path.join(snapshot_dir, 'index.faiss')
+            self.faiss_index = read_mapped_index(self.index_path)
+            apply_search_params(self.faiss_index, self.index_config)
+            
+            reciprocal_path = os.path.join(snapshot_dir, 'reciprocal.faiss')
+            if os.path.exists(reciprocal_path):
+                self.reciprocal_index_path = reciprocal_path
+                self.reciprocal_index = read_mapped_index(reciprocal_path)
+                apply_search_params(self.reciprocal_index, self.index_config)
+            else:
+                self.reciprocal_index_path = None
+                self.reciprocal_index = None
+            
+            # An explicitly configured ranker wins over the one in the snapshot
+            self.ranker = LinearRanker.load(self.ranker_path or os.path.join(snapshot_dir, 'ranker.npz'))
+            
+            # Profile and feature columns stay memory-mapped
+            self.profiles = UserProfileStore({name: load(name) for name in PROFILE_ARRAYS}, strings['profile_tables'])
+            self.user_features = {name: load(f"feature_{name}") for name in strings['feature_columns']}
+            
+            self.banned_user_ids = set(strings['banned_user_ids'])
+            self.excluded_pairs = {uid: set(ids) for uid, ids in strings['excluded_pairs'].items()}
+            self.search_selector = None
+            
+            self.index_to_user_id = strings['user_ids']
+            self.user_id_to_index = {uid: row for row, uid in enumerate(self.index_to_user_id) if uid is not None}
+            # Locations are parsed again when users are added; codes are
+            # interned in location-table order, so they match the stored ones
+            self.location_codes = {}
+            self.location_parts = []
+            self.location_coords = []
+            self.geo_buckets = None
+            
+            return True
+            
+        except Exception as e:
+            print(f"Snapshot load error: {e}", file=sys.stderr)
+            return False
+    
     def initialize(self):
         """Initialize the recommendation system"""
         print("🚀 Initializing recommendation system...", file=sys.stderr)
         
-        if not self.connect_db():
-            return False
+        if self.snapshot_path:
+            print(f"📦 Loading snapshot from {self.snapshot_path}...", file=sys.stderr)
+            with self.metrics.span('snapshot_load'):
+                if not self.load_snapshot(self.snapshot_path):
+                    return False
+            
+            if self.reciprocal and self.reciprocal_index is None:
+                print("🔁 Building reciprocal index...", file=sys.stderr)
+                self.build_reciprocal_index()
+            
+            print("✅ Recommendation system ready!", file=sys.stderr)
+            return True
+        
+        with self.metrics.span('db_connect'):
+            if not self.connect_db():
+                return False
         
         print("📊 Fetching user data...", file=sys.stderr)
-        if not self.fetch_data():
+        with self.metrics.span('db_fetch'):
+            if not self.fetch_data():
+                return False
+        
+        if not self.build():
             return False
         
+        print("✅ Recommendation system ready!", file=sys.stderr)
+        return True
+    
+    def build(self):
+        """Build encodings and index from the loaded users_data, and load the ranker"""
         print("🔧 Creating skill encodings...", file=sys.stderr)
-        if not self.create_skill_encodings():
-            return False
+        with self.metrics.span('skill_encodings'):
+            if not self.create_skill_encodings():
+                return False
         
         print("👤 Creating user profiles...", file=sys.stderr)
-        if not self.create_user_skill_vectors():
-            return False
+        with self.metrics.span('user_vectors'):
+            if not self.create_user_skill_vectors():
+                return False
+        # The loaded rows now live in the matrices, feature columns and profile store
+        self.users_data = []
         
         print("🔍 Building FAISS index...", file=sys.stderr)
-        if not self.build_faiss_index():
-            return False
+        with self.metrics.span('index_build'):
+            if not self.build_faiss_index():
+                return False
         
-        print("🌲 Training Random Forest model...", file=sys.stderr)
-        if not self.train_rf_model():
-            return False
+        print("🧮 Loading ranker...", file=sys.stderr)
+        with self.metrics.span('ranker_load'):
+            if not self.load_ranker():
+                return False
         
-        print("✅ Recommendation system ready!", file=sys.stderr)
+        # A new full load invalidates every cached result, unless it loaded the same data
+        self.data_version = self.content_version()
+        self.user_versions = {}
         return True
     
+    def content_version(self):
+        """
+        Digest of the built state results are computed from, so processes
+        building the same data on their own share cached results (the FAISS
+        index is left out: its layout may differ, not what it holds)
+        """
+        digest = hashlib.blake2b(digest_size=8)
+        
+        def add(name, array):
+            digest.update(name.encode('utf-8'))
+            digest.update(np.ascontiguousarray(array).tobytes())
+        
+        tables = self.profiles.save(add)
+        for name, column in self.user_features.items():
+            add(name, column)
+        for name, matrix in (('offered', self.offered_matrix), ('wanted', self.wanted_matrix)):
+            add(f"{name}_data", matrix.data)
+            add(f"{name}_indices", matrix.indices)
+            add(f"{name}_indptr", matrix.indptr)
+        if self.skill_vectors is not None:
+            add('skill_vectors', self.skill_vectors)
+        for name in ('weights', 'mean', 'scale'):
+            add(f"ranker_{name}", getattr(self.ranker, name))
+        digest.update(json.dumps([
+            tables, self.index_to_user_id, self.all_skills, self.encoder, self.effective_index_config(),
+            self.location_model, self.ranker.intercept, sorted(self.banned_user_ids),
+            {uid: sorted(ids) for uid, ids in self.excluded_pairs.items()},
+        ], sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+    
+    def retire(self):
+        """Release what this instance holds alone once it was swapped out (metrics and cache are shared)"""
+        self.source.close()
+    
+    def prepare_fork(self):
+        """Drop state that must not be shared with forked serving workers"""
+        # A connection must not cross fork(); workers reconnect on refresh
+        self.source.close()
+    
+    def prepare_worker(self):
+        """Per-process setup of a forked serving worker"""
+        import faiss
+        # The workers are the parallelism; FAISS threads would only oversubscribe the cores
+        faiss.omp_set_num_threads(1)
+    
     def close(self):
         """Clean up resources"""
-        if self.db_connection:
-            self.db_connection.close()
+        self.source.close()
+        self.cache.close()
+        self.metrics.close()
+
+USAGE = """Usage:
+    python recommendation_model.py <user_id> [--limit=10] [--mode=standard|reciprocal] [--near=KM] [--local]
+                                   [--paginate | --cursor=<next_cursor>] [--format=ndjson]
+    python recommendation_model.py --serve [--host=127.0.0.1] [--port=8765] [--workers=N]
+    python recommendation_model.py --all [--limit=10] [--mode=standard|reciprocal] [--near=KM]
+    python recommendation_model.py --users-file=<path> [--limit=10] [--mode=standard|reciprocal] [--near=KM]
+    python recommendation_model.py --index-recall [--index=ivf] [--nprobe=8]
+    python recommendation_model.py --snapshot=<dir>
+    python recommendation_model.py --train-ranker=<ranker.npz>
+    python recommendation_model.py --export=<users.npz>
+
+Add --from-snapshot=<dir> (or set RECOMMENDER_SNAPSHOT) to any serving mode
+to start from a snapshot written by --snapshot instead of the data source.
+
+Add --source=<spec> (or set RECOMMENDER_SOURCE) to any mode to read users
+from somewhere other than Postgres (DATABASE_URL): a postgresql:// URL, a
+.npz file written by --export, or synthetic:N generated users.
+
+Add --ranker=<ranker.npz> (or set RECOMMENDER_RANKER) to re-rank with a
+ranker written by --train-ranker instead of the default weights.
+
+Add --reciprocal (or set RECOMMENDER_RECIPROCAL=1) to build the reciprocal
+match index at startup instead of on the first mode=reciprocal request.
+
+--near=KM only recommends users within KM km ("near me"), located through
+the offline gazetteer (gazetteer.csv, or set RECOMMENDER_GAZETTEER).
+--paginate adds next_cursor to the output; --cursor=<next_cursor> prints the
+page after it (mode and --near come from the cursor). --format=ndjson
+prints one recommendation per line as it is formatted, then a line with the
+remaining response fields.
+
+Add --location-model=distance (or set RECOMMENDER_LOCATION_MODEL) to score
+location in Layer 2 by distance decay instead of same city/state.
+
+Add --trace=<path> (or set RECOMMENDER_TRACE) to any mode to write every
+timing span to a Chrome trace event file for offline profiling.
+
+Background rebuilds (--serve): --refresh-interval=SECONDS rebuilds on a
+schedule (POST /refresh {"rebuild": true} triggers one), swapping the new
+state in atomically; --refresh-max-memory=MB defers rebuilds whose peak
+memory would exceed the cap. With --workers=N the parent rebuilds once and
+re-forks the workers, and the cap covers the whole pool.
+
+Result cache options: --cache-size=N (0 disables) --cache-ttl=SECONDS
+                      --cache-path=<sqlite file shared by local workers>
+
+Index options (any mode): --index=flat|ivf|hnsw --nlist=N --nprobe=N
+                          --hnsw-m=N --ef-construction=N --ef-search=N
+                          --encoder=binary|embedding"""
+
+# Options that change what the model is built from or how it ranks; a running
+# server was built with its own, so the CLI answers locally when one is given
+BUILD_OPTIONS = (
+    'source', 'from-snapshot', 'ranker', 'encoder', 'location-model', 'index',
+    'nlist', 'nprobe', 'hnsw-m', 'ef-construction', 'ef-search',
+)
+
+def parse_options(args):
+    """Split CLI arguments into positional values and --key[=value] options"""
+    positional = []
+    options = {}
+    for arg in args:
+        if arg.startswith('--'):
+            key, has_value, value = arg[2:].partition('=')
+            options[key] = value if has_value else True
+        else:
+            positional.append(arg)
+    return positional, options
+
+def create_recommender(options, metrics=None, cache=None):
+    """Recommender configured from the CLI index, ranker, trace and cache options"""
+    overrides = {
+        key: options.get(key.replace('_', '-'))
+        for key in DEFAULT_INDEX_CONFIG
+        if key != 'type'
+    }
+    overrides['type'] = options.get('index')
+    return SkillRecommendationSystem(
+        index_config=overrides,
+        snapshot_path=options.get('from-snapshot'),
+        source=options.get('source'),
+        ranker_path=options.get('ranker'),
+        encoder=options.get('encoder'),
+        location_model=options.get('location-model'),
+        reciprocal=True if options.get('reciprocal') else None,
+        metrics=metrics or Metrics(trace_path=options.get('trace')),
+        cache=cache or RecommendationCache(
+            max_entries=options.get('cache-size'),
+            ttl_seconds=options.get('cache-ttl'),
+            shared_path=options.get('cache-path')
+        )
+    )
+
+def rebuild_recommender(options, current):
+    """
+    Fresh recommender built like the current one, sharing its metrics and
+    cache (the new data version invalidates cached results). Returns None
+    when serving from a snapshot root with no newer snapshot published.
+    """
+    if current.snapshot_path and snapshot_version(current.snapshot_path) == current.data_version:
+        return None
+    
+    recommender = create_recommender(options, metrics=current.metrics, cache=current.cache)
+    if not recommender.initialize():
+        recommender.retire()
+        raise RuntimeError("Failed to initialize recommendation system")
+    return recommender
+
+def run_server(options):
+    """Initialize once and keep serving recommendations from memory"""
+    recommender = create_recommender(options)
+    workers = int(options.get('workers') or os.getenv('RECOMMENDER_WORKERS', 1))
+    
+    def rebuild(current):
+        rebuilt = rebuild_recommender(options, current)
+        if rebuilt and workers > 1:
+            rebuilt.prepare_fork()  # Rebuilt in the pool parent, then forked into fresh workers
+        return rebuilt
+    
+    refresher = BackgroundRefresher(
+        build=rebuild,
+        interval=options.get('refresh-interval'),
+        max_memory_mb=options.get('refresh-max-memory'),
+        metrics=recommender.metrics
+    )
+    
+    try:
+        rss_before = current_rss()
+        if not recommender.initialize():
+            print(json.dumps({"error": "Failed to initialize recommendation system"}))
+            sys.exit(1)
+        if rss_before is not None:
+            refresher.state_bytes = current_rss() - rss_before
+        
+        host = options.get('host') or os.getenv('RECOMMENDER_HOST', DEFAULT_HOST)
+        port = int(options.get('port') or os.getenv('RECOMMENDER_PORT', DEFAULT_PORT))
+        if workers > 1:
+            recommender.prepare_fork()
+        recommender = serve(recommender, host, port, workers, recommender.prepare_worker, refresher)
+    
+    finally:
+        recommender.close()
+
+def read_user_ids(path):
+    """Read one user id per line, skipping blanks and # comments"""
+    with open(path) as f:
+        return [
+            line.strip() for line in f
+            if line.strip() and not line.startswith('#')
+        ]
+
+def run_batch(options, limit, mode, near_km=None):
+    """Stream recommendations for many users as JSONL"""
+    recommender = create_recommender(options)
+    
+    try:
+        if not recommender.initialize():
+            print(json.dumps({"error": "Failed to initialize recommendation system"}))
+            sys.exit(1)
+        
+        if options.get('all'):
+            user_ids = list(recommender.user_id_to_index)
+        else:
+            user_ids = read_user_ids(options['users-file'])
+        
+        for user_id, recommendations in recommender.get_recommendations_batch(user_ids, limit, mode=mode, near_km=near_km):
+            sys.stdout.write(json.dumps(build_response(user_id, recommendations, mode, near_km)) + '\n')
+        sys.stdout.flush()
+        
+    except Exception as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    
+    finally:
+        recommender.close()
+
+def run_snapshot(options):
+    """Build from the data source and write a versioned snapshot directory"""
+    recommender = create_recommender(options)
+    recommender.snapshot_path = None  # Always build fresh from the data source
+    
+    try:
+        if not recommender.initialize():
+            print(json.dumps({"error": "Failed to initialize recommendation system"}))
+            sys.exit(1)
+        
+        snapshot_dir = recommender.save_snapshot(options['snapshot'])
+        print(json.dumps({"snapshot": snapshot_dir, "users": len(recommender.user_id_to_index)}))
+    
+    finally:
+        recommender.close()
+
+def run_train_ranker(options):
+    """Train the Layer-2 ranker on swap outcomes and ratings, and export it"""
+    recommender = create_recommender(options)
+    recommender.snapshot_path = None  # Labels come from the data source
+    
+    try:
+        if not recommender.initialize():
+            print(json.dumps({"error": "Failed to initialize recommendation system"}))
+            sys.exit(1)
+        
+        print("🎯 Training ranker on swap outcomes and ratings...", file=sys.stderr)
+        ranker, metrics = recommender.train_ranker()
+        ranker.save(options['train-ranker'])
+        print(json.dumps(dict(metrics, ranker=options['train-ranker'], **ranker.describe()), indent=2))
+    
+    except ValueError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    
+    finally:
+        recommender.close()
+
+def run_export(options):
+    """Dump users, exclusions and training pairs to a columnar file for offline builds"""
+    recommender = create_recommender(options)
+    
+    try:
+        start = time.perf_counter()
+        if not (recommender.connect_db() and recommender.fetch_data()):
+            print(json.dumps({"error": "Failed to fetch users from the data source"}))
+            sys.exit(1)
+        
+        print("📤 Exporting users...", file=sys.stderr)
+        export_users(
+            options['export'], recommender.users_data, recommender.banned_user_ids,
+            recommender.excluded_pairs, recommender.last_sync_at, recommender.source.fetch_training_pairs()
+        )
+        print(json.dumps({
+            "export": options['export'],
+            "users": len(recommender.users_data),
+            "seconds": round(time.perf_counter() - start, 3),
+            "bytes": os.path.getsize(options['export']),
+        }))
+    
+    finally:
+        recommender.close()
+
+def run_index_recall(options):
+    """Report recall and latency of the configured index against exact search"""
+    recommender = create_recommender(options)
+    
+    try:
+        if not recommender.initialize():
+            print(json.dumps({"error": "Failed to initialize recommendation system"}))
+            sys.exit(1)
+        
+        report = recommender.evaluate_index_recall(
+            sample_size=int(options.get('sample', 500)),
+            k=int(options.get('k', 50))
+        )
+        print(json.dumps(report, indent=2))
+    
+    finally:
+        recommender.close()
+
+def load_environment():
+    """Read .env into the environment; done by the CLI, not on import"""
+    from dotenv import load_dotenv
+    load_dotenv()
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python recommendation_model.py <user_id> [--limit=10]")
+    load_environment()
+    positional, options = parse_options(sys.argv[1:])
+    
+    if options.get('serve'):
+        run_server(options)
+        return
+    
+    # Parse limit parameter (capped like the server caps it)
+    limit = parse_limit(options.get('limit'))
+    
+    mode = options.get('mode') or 'standard'
+    if mode not in MATCH_MODES:
+        print(json.dumps({"error": f"--mode must be one of: {', '.join(MATCH_MODES)}"}))
+        sys.exit(1)
+    
+    try:
+        near_km = parse_near_km(options.get('near'))
+    except ValueError:
+        print(json.dumps({"error": "--near must be a positive number of km"}))
         sys.exit(1)
     
-    user_id = sys.argv[1]
-    limit = 10
+    if options.get('all') or options.get('users-file'):
+        run_batch(options, limit, mode, near_km)
+        return
     
-    # Parse limit parameter
-    for arg in sys.argv[2:]:
-        if arg.startswith('--limit='):
-            try:
-                limit = int(arg.split('=')[1])
-            except ValueError:
-                pass
+    if options.get('snapshot'):
+        run_snapshot(options)
+        return
+    
+    if options.get('index-recall'):
+        run_index_recall(options)
+        return
+    
+    if options.get('train-ranker'):
+        run_train_ranker(options)
+        return
+    
+    if options.get('export'):
+        run_export(options)
+        return
+    
+    if not positional:
+        print(USAGE)
+        sys.exit(1)
+    
+    user_id = positional[0]
+    
+    # Pagination: the cursor of a previous page carries its mode and radius
+    cursor = options.get('cursor') if isinstance(options.get('cursor'), str) else None
+    page = None
+    if cursor:
+        try:
+            page = decode_cursor(cursor)
+        except ValueError:
+            print(json.dumps({"error": "--cursor is invalid"}))
+            sys.exit(1)
+        mode, near_km = page['mode'], page['near_km']
+    elif options.get('paginate'):
+        page = {'offset': 0, 'window': max(PAGE_WINDOW, limit)}
+    stream = options.get('format') == 'ndjson'
+    
+    # Prefer a running recommendation server (thin client mode), unless the
+    # model has to be built with options the server knows nothing about
+    build_options = [name for name in BUILD_OPTIONS if name in options]
+    if build_options and not options.get('local'):
+        print(f"🏗️ Building locally for --{', --'.join(build_options)}", file=sys.stderr)
+    if not options.get('local') and not build_options:
+        remote = {'mode': mode, 'near_km': near_km, 'cursor': cursor, 'paginate': page is not None}
+        if stream:
+            lines = stream_remote_recommendations(user_id, limit, **remote)
+            if lines is not None:
+                for line in lines:
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                return
+        else:
+            result = fetch_remote_recommendations(user_id, limit, **remote)
+            if result is not None:
+                print(json.dumps(result, indent=2))
+                if 'error' in result:
+                    sys.exit(1)
+                return
     
     # Initialize recommendation system
-    recommender = SkillRecommendationSystem()
+    recommender = create_recommender(options)
     
     try:
         if not recommender.initialize():
             print(json.dumps({"error": "Failed to initialize recommendation system"}))
             sys.exit(1)
         
+        if stream:
+            # Rank the page, then format and print one recommendation at a time
+            offset, window = (page['offset'], page['window']) if page else (0, None)
+            candidates, more = recommender.rank_page(user_id, offset, limit, mode, near_km, window)
+            fields = {'next_cursor': next_page_cursor(page, limit, mode, near_km, more)} if page else {}
+            recommendations = (recommender.format_recommendation(user_id, candidate) for candidate in candidates)
+            for line in ndjson_lines(user_id, recommendations, mode, near_km, **fields):
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            return
+        
         # Get recommendations
-        recommendations = recommender.get_recommendations(user_id, limit)
+        if page is not None:
+            recommendations, more = recommender.get_recommendation_page(
+                user_id, page['offset'], limit, mode, near_km, page['window']
+            )
+        else:
+            recommendations = recommender.get_recommendations(user_id, limit, mode, near_km)
         
         # Output results as JSON
-        result = {
-            "user_id": user_id,
-            "recommendations": recommendations,
-            "total_found": len(recommendations),
-            "algorithm": "FAISS + Random Forest"
-        }
+        result = build_response(user_id, recommendations, mode, near_km)
+        if page is not None:
+            result['next_cursor'] = next_page_cursor(page, limit, mode, near_km, more)
         
         print(json.dumps(result, indent=2))
         
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+CoLearn Recommendation Cache
+============================
+
+LRU/TTL cache of formatted recommendation lists, keyed by (user_id, limit,
+match mode, "near me" radius), and of the ranked candidate lists that
+paginated requests page through (get_ranked/put_ranked).
+
+Every entry remembers a validation stamp: the recommender's data version
+plus the per-user versions of the target and of every returned candidate.
+Reloads change the data version and incremental refreshes change the
+versions of the users they touch, so a lookup whose stamp no longer
+matches is dropped as stale. Both are digests of the data, so processes
+that loaded or applied the same changes stamp alike. Users that newly become good matches are
+only picked up once the TTL expires.
+
+An optional shared backend (a local SQLite file, RECOMMENDER_CACHE_PATH)
+lets several worker processes on one host reuse each other's results.
+
+Settings: RECOMMENDER_CACHE_SIZE (entries, 0 disables the cache),
+RECOMMENDER_CACHE_TTL (seconds), RECOMMENDER_CACHE_PATH.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 300
+
+# Shared entries are pruned (expired first, then oldest) every this many writes
+SHARED_PRUNE_INTERVAL = 1000
+
+
+class SharedCacheBackend:
+    """Cache entries in a SQLite file shared by the workers of one host"""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = None
+        self.pid = None
+        self.writes = 0
+
+    def connect(self):
+        # Connections must not cross fork(); reopen in every process
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS recommendations (
+                    key TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL,
+                    entry TEXT NOT NULL
+                )
+            """)
+            self.pid = os.getpid()
+        return self.connection
+
+    def get(self, key):
+        row = self.connect().execute(
+            'SELECT entry FROM recommendations WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, expires_at, entry):
+        connection = self.connect()
+        connection.execute(
+            'INSERT OR REPLACE INTO recommendations (key, expires_at, entry) VALUES (?, ?, ?)',
+            (key, expires_at, json.dumps(entry))
+        )
+        self.writes += 1
+        if self.writes % SHARED_PRUNE_INTERVAL == 0:
+            connection.execute('DELETE FROM recommendations WHERE expires_at <= ?', (time.time(),))
+            connection.execute("""
+                DELETE FROM recommendations WHERE key IN (
+                    SELECT key FROM recommendations ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def delete(self, key):
+        self.connect().execute('DELETE FROM recommendations WHERE key = ?', (key,))
+
+    def close(self):
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
+
+
+class RecommendationCache:
+    """In-process LRU with TTL and stamp validation, optionally backed by a shared file"""
+
+    def __init__(self, max_entries=None, ttl_seconds=None, shared_path=None, metrics=None):
+        self.max_entries = int(max_entries if max_entries is not None
+                               else os.getenv('RECOMMENDER_CACHE_SIZE', DEFAULT_CACHE_SIZE))
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None
+                                 else os.getenv('RECOMMENDER_CACHE_TTL', DEFAULT_CACHE_TTL))
+        shared_path = shared_path or os.getenv('RECOMMENDER_CACHE_PATH')
+        self.shared = SharedCacheBackend(shared_path, self.max_entries) if shared_path and self.enabled else None
+        self.metrics = metrics
+        self.entries = OrderedDict()  # key -> (expires_at, user_ids, stamp, value)
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def count(self, name):
+        if self.metrics:
+            self.metrics.increment(name)
+
+    def key(self, user_id, limit, mode, near_km=None):
+        key = f"{user_id}\x1f{limit}" if mode == 'standard' else f"{user_id}\x1f{limit}\x1f{mode}"
+        return key if near_km is None else f"{key}\x1fnear={near_km:g}"
+
+    def ranked_key(self, user_id, window, mode, near_km=None):
+        return f"{self.key(user_id, window, mode, near_km)}\x1franked"
+
+    def get(self, user_id, limit, stamp, mode='standard', near_km=None):
+        """
+        Cached recommendations for (user_id, limit, mode, near_km), or None.
+        stamp(user_ids) returns the current validation stamp of the given users.
+        """
+        if not self.enabled:
+            return None
+        return self.lookup(self.key(user_id, limit, mode, near_km), stamp)
+
+    def put(self, user_id, limit, recommendations, stamp, mode='standard', near_km=None):
+        """Cache recommendations, stamped with the target and returned candidates"""
+        if not self.enabled:
+            return
+        user_ids = [user_id] + [recommendation['user_id'] for recommendation in recommendations]
+        self.save(self.key(user_id, limit, mode, near_km), user_ids, stamp, recommendations)
+
+    def get_ranked(self, user_id, window, stamp, mode='standard', near_km=None):
+        """Cached ranked list ({'depth', 'exhausted', 'candidates'}) of a paginated request, or None"""
+        if not self.enabled:
+            return None
+        return self.lookup(self.ranked_key(user_id, window, mode, near_km), stamp)
+
+    def put_ranked(self, user_id, window, ranked, stamp, mode='standard', near_km=None):
+        """Cache a ranked list, stamped with the target and every candidate in it"""
+        if not self.enabled:
+            return
+        user_ids = [user_id] + [candidate['user_id'] for candidate in ranked['candidates']]
+        self.save(self.ranked_key(user_id, window, mode, near_km), user_ids, stamp, ranked)
+
+    def lookup(self, key, stamp):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+        source = 'local'
+        if entry is None and self.shared:
+            try:
+                shared_entry = self.shared.get(key)
+            except sqlite3.Error:
+                shared_entry = None
+            if shared_entry is not None:
+                entry = tuple(shared_entry)
+                source = 'shared'
+
+        if entry is None:
+            self.count('cache_misses')
+            return None
+
+        expires_at, user_ids, entry_stamp, value = entry
+        if expires_at <= time.time() or stamp(user_ids) != entry_stamp:
+            self.count('cache_invalidations')
+            self.count('cache_misses')
+            self.invalidate(key)
+            return None
+
+        if source == 'shared':
+            self.store(key, entry)
+            self.count('cache_shared_hits')
+        self.count('cache_hits')
+        return value
+
+    def save(self, key, user_ids, stamp, value):
+        entry = (time.time() + self.ttl_seconds, user_ids, stamp(user_ids), value)
+        self.store(key, entry)
+        if self.shared:
+            try:
+                self.shared.put(key, entry[0], entry)
+            except sqlite3.Error:
+                pass  # The shared cache is best effort
+
+    def store(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+        if self.shared:
+            try:
+                self.shared.delete(key)
+            except sqlite3.Error:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'shared': self.shared.path if self.shared else None,
+            }
+
+    def close(self):
+        if self.shared:
+            self.shared.close()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+CoLearn Recommendation Metrics
+==============================
+
+In-process timing spans, counters and gauges for the recommendation pipeline.
+Every span feeds a per-stage latency histogram; the server exposes them on
+GET /metrics as Prometheus text (default) or JSON (?format=json).
+
+Set RECOMMENDER_TRACE=<path> (or --trace=<path>) to also append every span
+to a trace file in the Chrome trace event format, which chrome://tracing
+and Perfetto open directly, for offline profiling.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond request
+# stages up to full database loads and index builds
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus style)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Span:
+    """Times one stage; use via Metrics.span()"""
+
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start, self.start)
+        return False
+
+
+class Metrics:
+    """Thread-safe stage histograms, counters and gauges, with an optional trace file"""
+
+    def __init__(self, trace_path=None):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}  # name -> callable returning the current value (or None)
+        self.started_at = time.time()
+        self.trace_file = None
+        # perf_counter() -> wall-clock microseconds for trace timestamps
+        self.clock_offset = time.time() - time.perf_counter()
+
+        trace_path = trace_path or os.getenv('RECOMMENDER_TRACE')
+        if trace_path:
+            new_file = not os.path.exists(trace_path) or os.path.getsize(trace_path) == 0
+            self.trace_file = open(trace_path, 'a', buffering=1)
+            if new_file:
+                # JSON array format; the closing bracket is optional
+                self.trace_file.write('[\n')
+
+    def span(self, stage):
+        return Span(self, stage)
+
+    def observe(self, stage, seconds, start=None):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+            if self.trace_file and start is not None:
+                self.trace_file.write(json.dumps({
+                    'name': stage,
+                    'ph': 'X',
+                    'ts': round((start + self.clock_offset) * 1e6),
+                    'dur': round(seconds * 1e6, 1),
+                    'pid': os.getpid(),
+                    'tid': threading.get_ident(),
+                }) + ',\n')
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name, read):
+        """Register a gauge whose value is read when metrics are exported"""
+        with self.lock:
+            self.gauges[name] = read
+
+    def gauge_values(self):
+        with self.lock:
+            gauges = sorted(self.gauges.items())
+        values = {}
+        for name, read in gauges:
+            value = read()
+            if value is not None:
+                values[name] = round(float(value), 3)
+        return values
+
+    def to_json(self):
+        """Per-stage count, total and latency percentiles (ms), plus counters and gauges"""
+        gauges = self.gauge_values()
+        with self.lock:
+            return {
+                'uptime_seconds': round(time.time() - self.started_at, 3),
+                'stages': {
+                    stage: {
+                        'count': histogram.count,
+                        'total_seconds': round(histogram.sum, 6),
+                        'mean_ms': round(histogram.sum * 1000 / histogram.count, 4),
+                        'p50_ms': round(histogram.quantile(0.5) * 1000, 4),
+                        'p95_ms': round(histogram.quantile(0.95) * 1000, 4),
+                        'p99_ms': round(histogram.quantile(0.99) * 1000, 4),
+                        'max_ms': round(histogram.max * 1000, 4),
+                    }
+                    for stage, histogram in sorted(self.stages.items())
+                },
+                'counters': dict(sorted(self.counters.items())),
+                'gauges': gauges,
+            }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        gauges = self.gauge_values()
+        with self.lock:
+            lines.append('# HELP recommender_stage_seconds Time spent in each recommendation pipeline stage')
+            lines.append('# TYPE recommender_stage_seconds histogram')
+            for stage, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'recommender_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'recommender_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                lines.append(f'recommender_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.9f}')
+                lines.append(f'recommender_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'# TYPE recommender_{name}_total counter')
+                lines.append(f'recommender_{name}_total {value}')
+
+            for name, value in gauges.items():
+                lines.append(f'# TYPE recommender_{name} gauge')
+                lines.append(f'recommender_{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self.trace_file:
+            self.trace_file.close()
+            self.trace_file = None
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+CoLearn User Profile Store
+==========================
+
+Display fields of the indexed users (name, location, skill lists) kept
+column-wise, one entry per matrix row / FAISS id, instead of one dict per
+user. Names are packed into a single UTF-8 byte array; locations and skill
+names are interned into string tables shared by all users, and rows hold
+int32 codes into them (skill lists as codes plus CSR-style offsets). The
+numeric fields live in the recommender's user_features columns.
+
+Everything is a NumPy array or a small table, so snapshots store the
+columns as .npy files and serving processes memory-map them. A row is
+materialized into a dict only for the recommendations actually returned.
+"""
+
+import numpy as np
+
+SKILL_COLUMNS = ('skills_offered', 'skills_wanted')
+
+# Arrays a store is saved as (see UserProfileStore.save)
+PROFILE_ARRAYS = ('name_data', 'name_offsets', 'location_codes') + tuple(
+    f"{column}_{part}" for column in SKILL_COLUMNS for part in ('codes', 'indptr')
+)
+
+
+class StringTable:
+    """Distinct strings stored once and referred to by dense integer codes"""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values):
+        """int32 codes of values (-1 for None), adding unseen strings to the table"""
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            if value is None:
+                codes[i] = -1
+                continue
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        return codes
+
+    def encode_lists(self, lists):
+        """Codes of many string lists plus CSR-style offsets into them (None = empty)"""
+        lengths = np.fromiter((len(values or ()) for values in lists), dtype=np.int64, count=len(lists))
+        indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        return self.encode([value for values in lists for value in values or ()]), indptr
+
+
+class UserProfileStore:
+    """Columnar names, locations and skill lists of the users, by matrix row"""
+
+    def __init__(self, arrays=None, tables=None):
+        """Empty, or from the arrays and string tables of a snapshot (see save)"""
+        arrays = arrays or {}
+        tables = tables or {}
+        self.name_data = arrays.get('name_data', np.empty(0, dtype=np.uint8))
+        self.name_offsets = arrays.get('name_offsets', np.zeros(1, dtype=np.int64))
+        self.locations = StringTable(tables.get('locations', ()))
+        self.location_codes = arrays.get('location_codes', np.empty(0, dtype=np.int32))
+        self.skills = StringTable(tables.get('skill_names', ()))
+        self.skill_codes = {}
+        self.skill_indptr = {}
+        for column in SKILL_COLUMNS:
+            self.skill_codes[column] = arrays.get(f"{column}_codes", np.empty(0, dtype=np.int32))
+            self.skill_indptr[column] = arrays.get(f"{column}_indptr", np.zeros(1, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.name_offsets) - 1
+
+    def append(self, users):
+        """Add one row per user, with users as the data sources return them"""
+        names = [(user['name'] or '').encode('utf-8') for user in users]
+        lengths = np.fromiter((len(name) for name in names), dtype=np.int64, count=len(names))
+        self.name_data = np.concatenate([self.name_data, np.frombuffer(b''.join(names), dtype=np.uint8)])
+        self.name_offsets = np.concatenate([self.name_offsets, self.name_offsets[-1] + np.cumsum(lengths)])
+        self.location_codes = np.concatenate([
+            self.location_codes, self.locations.encode([user['location'] for user in users])
+        ])
+        for column in SKILL_COLUMNS:
+            codes, indptr = self.skills.encode_lists([user[column] for user in users])
+            self.skill_codes[column] = np.concatenate([self.skill_codes[column], codes])
+            self.skill_indptr[column] = np.concatenate([
+                self.skill_indptr[column], self.skill_indptr[column][-1] + indptr[1:]
+            ])
+
+    def name(self, row):
+        return self.name_data[self.name_offsets[row]:self.name_offsets[row + 1]].tobytes().decode('utf-8')
+
+    def location(self, row):
+        code = self.location_codes[row]
+        return self.locations.values[code] if code >= 0 else None
+
+    def skill_list(self, column, row):
+        """Skill names of a row as loaded (original spelling and order), None when empty"""
+        indptr = self.skill_indptr[column]
+        codes = self.skill_codes[column][indptr[row]:indptr[row + 1]]
+        return [self.skills.values[code] for code in codes] or None
+
+    def save(self, save_array):
+        """Write the columns through save_array(name, array); returns the string tables"""
+        save_array('name_data', self.name_data)
+        save_array('name_offsets', self.name_offsets)
+        save_array('location_codes', self.location_codes)
+        for column in SKILL_COLUMNS:
+            save_array(f"{column}_codes", self.skill_codes[column])
+            save_array(f"{column}_indptr", self.skill_indptr[column])
+        return {'locations': self.locations.values, 'skill_names': self.skills.values}
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+CoLearn Layer-2 Ranker
+======================
+
+Compact linear ranker used to re-rank Layer-1 candidates. Serving is a single
+matrix-vector product over the 7 Layer-2 features; training happens offline
+from real swap outcomes and ratings (see --train-ranker) and is exported as
+a small .npz file.
+
+Scores are mapped onto the 1-5 range: 1 + 4 * sigmoid(w . standardized(x) + b)
+"""
+
+import numpy as np
+
+FEATURE_NAMES = [
+    'skill_match',
+    'location_similarity',
+    'experience_similarity',
+    'avg_rating',
+    'rating_count',
+    'session_count',
+    'bidirectional_bonus',
+]
+
+# Hand-set weights used until a ranker has been trained on real outcomes:
+# skill match first, then mutual learning, reputation and proximity
+DEFAULT_WEIGHTS = np.array([3.0, 1.0, 0.8, 1.2, 0.6, 0.6, 1.5])
+DEFAULT_INTERCEPT = -3.0
+
+
+class LinearRanker:
+    """Standardize features, then score with a logistic linear model"""
+
+    def __init__(self, weights=DEFAULT_WEIGHTS, intercept=DEFAULT_INTERCEPT, mean=None, scale=None, trained=False):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.mean = np.zeros(len(self.weights)) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale = np.ones(len(self.weights)) if scale is None else np.asarray(scale, dtype=np.float64)
+        self.trained = trained
+
+    def predict(self, features):
+        """Scores in [1, 5] for a (n_candidates, 7) feature matrix"""
+        z = ((features - self.mean) / self.scale) @ self.weights + self.intercept
+        return 1.0 + 4.0 / (1.0 + np.exp(-z))
+
+    def save(self, path):
+        np.savez(
+            path,
+            weights=self.weights,
+            intercept=np.array([self.intercept]),
+            mean=self.mean,
+            scale=self.scale,
+            trained=np.array([self.trained]),
+            feature_names=np.array(FEATURE_NAMES),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if list(data['feature_names']) != FEATURE_NAMES:
+                raise ValueError(f"Ranker {path} was trained on different features")
+            return cls(
+                weights=data['weights'],
+                intercept=data['intercept'][0],
+                mean=data['mean'],
+                scale=data['scale'],
+                trained=bool(data['trained'][0]),
+            )
+
+    def describe(self):
+        return {
+            'trained': self.trained,
+            'weights': dict(zip(FEATURE_NAMES, np.round(self.weights, 4).tolist())),
+            'intercept': round(self.intercept, 4),
+        }
+
+
+def roc_auc(labels, scores):
+    """Rank-based ROC AUC (ties count half)"""
+    labels = np.asarray(labels, dtype=bool)
+    n_pos = labels.sum()
+    n_neg = len(labels) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return None
+
+    order = np.argsort(scores, kind='mergesort')
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[order] = np.arange(1, len(scores) + 1)
+    # Average ranks over tied scores
+    sorted_scores = np.asarray(scores)[order]
+    _, starts, counts = np.unique(sorted_scores, return_index=True, return_counts=True)
+    for start, count in zip(starts, counts):
+        if count > 1:
+            ranks[order[start:start + count]] = start + (count + 1) / 2.0
+
+    return float((ranks[labels].sum() - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg))
+
+
+def train_ranker(features, labels, holdout=0.2, seed=42):
+    """
+    Fit a logistic regression on labeled (target, candidate) pairs and return
+    (LinearRanker, metrics). Only needed offline; sklearn is imported here.
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    features = np.asarray(features, dtype=np.float64)
+    labels = np.asarray(labels, dtype=np.int64)
+    if len(np.unique(labels)) < 2:
+        raise ValueError("Training needs both positive and negative pairs")
+
+    order = np.random.default_rng(seed).permutation(len(labels))
+    n_holdout = int(len(labels) * holdout)
+    test, train = order[:n_holdout], order[n_holdout:]
+
+    mean = features[train].mean(axis=0)
+    scale = features[train].std(axis=0)
+    scale[scale == 0] = 1.0
+
+    model = LogisticRegression(class_weight='balanced', max_iter=1000)
+    model.fit((features[train] - mean) / scale, labels[train])
+    ranker = LinearRanker(model.coef_[0], model.intercept_[0], mean, scale, trained=True)
+
+    metrics = {
+        'pairs': int(len(labels)),
+        'positives': int(labels.sum()),
+        'holdout_pairs': int(n_holdout),
+        'holdout_auc': roc_auc(labels[test], ranker.predict(features[test])) if n_holdout else None,
+        # The hand-set weights on the same pairs, as the baseline to beat
+        'default_holdout_auc': roc_auc(labels[test], LinearRanker().predict(features[test])) if n_holdout else None,
+    }
+    return ranker, metrics
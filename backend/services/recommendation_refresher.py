@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+CoLearn Background Refresher
+============================
+
+Rebuilds the recommender off the request path and swaps it in atomically.
+
+A rebuild creates a complete new SkillRecommendationSystem (database load or
+snapshot reload, encodings, index, ranker) in a background thread while the
+current one keeps serving. Publishing it is a single attribute assignment on
+the server, made between two requests under the server lock, so requests
+finish on the state they started with and none waits for the rebuild.
+
+Both states are alive during the swap. With a memory cap set, a rebuild
+that would push the process past the cap (current RSS plus the size of the
+last build) is deferred instead, and counted as refresh_deferred.
+
+A pre-fork pool does not run the thread: its parent calls refresh() itself,
+once for all workers, then forks fresh workers from the new state. The cap
+then applies to the whole pool, measured by pool_memory().
+
+Settings: RECOMMENDER_REFRESH_INTERVAL (seconds between scheduled rebuilds,
+unset or 0 for trigger only), RECOMMENDER_REFRESH_MAX_MEMORY (MB).
+
+Metrics: the refresh_rebuild stage histogram, refreshes / refresh_failures /
+refresh_deferred / refresh_skipped counters, and the data_staleness_seconds,
+refresh_last_success_age_seconds and rss_mb gauges.
+"""
+
+import sys
+import ctypes
+import gc
+import os
+import threading
+import time
+from datetime import timezone
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None where unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def pool_memory(pids):
+    """
+    Memory a group of processes takes in bytes, as the sum of their
+    proportional set sizes (pages shared copy-on-write are counted once
+    overall), or None where unavailable
+    """
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                total += next(int(line.split()[1]) * 1024 for line in f if line.startswith('Pss:'))
+        except FileNotFoundError:
+            continue  # Exited since the list was taken
+        except (OSError, ValueError, IndexError, StopIteration):
+            return None
+    return total
+
+
+def release_free_memory():
+    """Collect garbage and hand freed heap pages back to the OS (glibc only)"""
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class BackgroundRefresher:
+    """Scheduled or triggered rebuilds of a server's recommender, swapped in atomically"""
+
+    def __init__(self, build, interval=None, max_memory_mb=None, metrics=None):
+        """
+        build(current) returns a new, initialized recommender, or None when
+        there is nothing new to load
+        """
+        self.build = build
+        self.interval = float(interval if interval is not None
+                              else os.getenv('RECOMMENDER_REFRESH_INTERVAL', 0) or 0)
+        max_memory_mb = max_memory_mb if max_memory_mb is not None else os.getenv('RECOMMENDER_REFRESH_MAX_MEMORY')
+        self.max_memory = float(max_memory_mb) * 1024 * 1024 if max_memory_mb else None
+        self.metrics = metrics
+        self.memory = current_rss  # Bytes the cap applies to; a pre-fork pool measures all its processes
+        self.target = None  # Server whose .recommender gets swapped under its .lock
+        self.state_bytes = None  # Memory one recommender state takes, measured at build time
+        self.loaded_at = time.time()
+        self.last_success = time.time()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+        self.lock = threading.Lock()  # One rebuild at a time
+
+    def attach(self, target):
+        """Refresh target.recommender on refresh() calls, without a thread of its own"""
+        self.target = target
+        if self.metrics:
+            self.metrics.gauge('data_staleness_seconds', self.staleness)
+            self.metrics.gauge('refresh_last_success_age_seconds', lambda: time.time() - self.last_success)
+            self.metrics.gauge('rss_mb', lambda: (current_rss() or 0) / (1024 * 1024) or None)
+
+    def start(self, target):
+        """Start serving refreshes for target.recommender"""
+        self.attach(target)
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name='recommender-refresher', daemon=True)
+        self.thread.start()
+
+    def trigger(self):
+        """Ask for a rebuild as soon as possible"""
+        self.wakeup.set()
+
+    def stop(self):
+        self.stopping = True
+        self.wakeup.set()
+
+    def staleness(self):
+        """Seconds since the served data was read from its source"""
+        last_sync_at = getattr(self.target.recommender, 'last_sync_at', None) if self.target else None
+        if last_sync_at and last_sync_at.tzinfo is None:
+            # Sources report naive UTC timestamps, which timestamp() would take as local time
+            last_sync_at = last_sync_at.replace(tzinfo=timezone.utc)
+        synced = last_sync_at.timestamp() if last_sync_at else self.loaded_at
+        return time.time() - synced
+
+    def run(self):
+        while not self.stopping:
+            self.wakeup.wait(self.interval or None)
+            self.wakeup.clear()
+            if not self.stopping:
+                self.refresh()
+
+    def count(self, name):
+        if self.metrics:
+            self.metrics.increment(name)
+
+    def refresh(self):
+        """Rebuild and swap once; returns True when a new state was swapped in"""
+        with self.lock:
+            rss = self.memory()
+            if self.max_memory and rss is not None and self.state_bytes and rss + self.state_bytes > self.max_memory:
+                print(f"⏸️ Rebuild deferred: {(rss + self.state_bytes) / 2**20:.0f} MB peak would exceed the "
+                      f"{self.max_memory / 2**20:.0f} MB cap", file=sys.stderr)
+                self.count('refresh_deferred')
+                return False
+
+            print("🔄 Rebuilding recommender in the background...", file=sys.stderr)
+            started_at = time.time()
+            try:
+                if self.metrics:
+                    with self.metrics.span('refresh_rebuild'):
+                        recommender = self.build(self.target.recommender)
+                else:
+                    recommender = self.build(self.target.recommender)
+            except Exception as e:
+                print(f"Background rebuild error: {e}", file=sys.stderr)
+                self.count('refresh_failures')
+                return False
+
+            if recommender is None:
+                self.count('refresh_skipped')
+                self.last_success = time.time()
+                return False
+
+            built_rss = self.memory()
+            if rss is not None and built_rss is not None and built_rss > rss:
+                self.state_bytes = built_rss - rss
+
+            # Publish between two requests; the rebuild itself never held the lock
+            with self.target.lock:
+                old, self.target.recommender = self.target.recommender, recommender
+                old.retire()
+            self.loaded_at = started_at
+            self.last_success = time.time()
+            self.count('refreshes')
+            print(f"✅ Swapped in rebuilt recommender after {time.time() - started_at:.1f}s", file=sys.stderr)
+
+            del old
+            release_free_memory()
+            return True
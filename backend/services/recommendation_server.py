@@ -0,0 +1,612 @@
+#!/usr/bin/env python3
+"""
+CoLearn Recommendation Server
+=============================
+
+Keeps one initialized SkillRecommendationSystem in memory and answers
+recommendation requests over HTTP (JSON in, JSON out), so the database load,
+encodings, FAISS index and model are built once instead of per request.
+
+Endpoints:
+    GET  /health
+    GET  /metrics                             (Prometheus text, ?format=json for JSON)
+    GET  /recommendations?user_id=<id>&limit=10&mode=standard[&near_km=25][&paginate=1][&format=ndjson]
+    GET  /recommendations?user_id=<id>&limit=10&cursor=<next_cursor>
+    POST /recommendations   {"user_id": "<id>", "limit": 10, "mode": "standard", "near_km": 25}
+    POST /refresh           {"user_ids": ["<id>", ...]}  (optional body)
+
+POST /refresh applies incremental updates: without user_ids it picks up
+everything changed since the last load, otherwise only the given users.
+POST /refresh {"rebuild": true} instead schedules a full rebuild in the
+background, swapped in atomically once ready (see recommendation_refresher).
+
+With --workers=N (or RECOMMENDER_WORKERS) the parent builds the model once,
+opens the listening socket and forks N workers that accept on it, so
+requests spread over cores while the model state is shared copy-on-write.
+Start from an --from-snapshot to share the arrays and FAISS index through
+the page cache as well. /metrics reports the worker that answered, and
+POST /refresh makes every worker pick up changes since its last sync.
+Full rebuilds run once, in the parent: fresh workers are forked from the
+new state and the old ones finish their requests and exit, so the pool
+keeps sharing one copy and the memory cap covers the whole pool.
+
+mode=reciprocal ranks candidates by how well skills match in both
+directions (they teach what the user wants and want what the user teaches).
+near_km restricts candidates to users within that many km of the user
+("near me"), for users whose location the gazetteer knows.
+
+paginate=1 adds next_cursor to the response (null on the last page); pass it
+back as cursor (with the same user_id) for the next limit results. Pages
+walk one ranked list cached per user, mode and radius, retrieved deeper
+only as later pages are requested. The cursor carries the offset, mode and
+radius, so those parameters are not repeated.
+
+format=ndjson (or Accept: application/x-ndjson) streams one recommendation
+per line as it is formatted, then a last line with the response fields
+other than recommendations (total_found, next_cursor, ...).
+
+Usage:
+    python recommendation_model.py --serve [--host=127.0.0.1] [--port=8765] [--workers=N]
+"""
+
+import sys
+import base64
+import gc
+import json
+import math
+import os
+import signal
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+from recommendation_refresher import pool_memory
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+MATCH_MODES = ('standard', 'reciprocal')
+
+# Layer-1 candidates ranked for a first page (as for unpaginated requests)
+PAGE_WINDOW = 50
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Workers that die sooner than this after starting are restarted with a delay
+WORKER_RESTART_DELAY = 1.0
+# Seconds a worker replaced after a rebuild gets to finish its requests
+WORKER_DRAIN_TIMEOUT = 10.0
+
+# Signals the pool parent takes synchronously (blocked, then waited for)
+SUPERVISOR_SIGNALS = {signal.SIGCHLD, signal.SIGHUP, signal.SIGUSR1}
+
+
+def build_response(user_id, recommendations, mode='standard', near_km=None):
+    """Build the JSON payload shared by the CLI and the server"""
+    response = {
+        "user_id": user_id,
+        "mode": mode,
+        "recommendations": recommendations,
+        "total_found": len(recommendations),
+        "algorithm": "FAISS + Learned Ranker"
+    }
+    if near_km is not None:
+        response["near_km"] = near_km
+    return response
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    """Parse a limit parameter, falling back to the default on bad input"""
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def parse_near_km(value):
+    """Parse a "near me" radius in km: None when absent, ValueError unless a positive number"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError("near_km must be a number")
+    near_km = float(value)
+    if not math.isfinite(near_km) or near_km <= 0:
+        raise ValueError(f"near_km must be a positive number, got {value!r}")
+    return near_km
+
+
+def parse_flag(value):
+    """Truthy query/JSON flag: true, 1, yes"""
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def encode_cursor(offset, window, mode='standard', near_km=None):
+    """Opaque pagination cursor for the page starting at offset"""
+    state = {'offset': offset, 'window': window, 'mode': mode, 'near_km': near_km}
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def next_page_cursor(page, limit, mode='standard', near_km=None, more=False):
+    """Cursor of the page after page ({'offset', 'window'}), None after the last one"""
+    return encode_cursor(page['offset'] + limit, page['window'], mode, near_km) if more else None
+
+
+def decode_cursor(cursor):
+    """{'offset', 'window', 'mode', 'near_km'} of a cursor; ValueError if it is malformed"""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        offset, window, mode = int(state['offset']), int(state['window']), state['mode']
+        near_km = parse_near_km(state['near_km'])
+    except (TypeError, KeyError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if offset < 0 or window < 1 or mode not in MATCH_MODES:
+        raise ValueError("Invalid cursor")
+    return {'offset': offset, 'window': window, 'mode': mode, 'near_km': near_km}
+
+
+def ndjson_lines(user_id, recommendations, mode='standard', near_km=None, **fields):
+    """
+    Lines of a streamed response: one per recommendation as the iterable
+    produces it, then the response without the recommendations list
+    """
+    total_found = 0
+    for recommendation in recommendations:
+        total_found += 1
+        yield json.dumps(recommendation) + '\n'
+    summary = build_response(user_id, [], mode, near_km)
+    del summary['recommendations']
+    summary['total_found'] = total_found
+    summary.update(fields)
+    yield json.dumps(summary) + '\n'
+
+
+class RecommendationRequestHandler(BaseHTTPRequestHandler):
+    """JSON request handler backed by the server's recommender"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self.send_json(200, {"status": "ok"})
+        elif url.path == '/metrics':
+            metrics = self.server.recommender.metrics
+            if parse_qs(url.query).get('format', [''])[0] == 'json':
+                self.send_json(200, metrics.to_json())
+            else:
+                self.send_body(200, metrics.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+        elif url.path == '/recommendations':
+            params = parse_qs(url.query)
+            self.handle_recommendations({
+                'user_id': params.get('user_id', [None])[0],
+                'limit': params.get('limit', [None])[0],
+                'mode': params.get('mode', [None])[0],
+                'near_km': params.get('near_km', [None])[0],
+                'cursor': params.get('cursor', [None])[0],
+                'paginate': params.get('paginate', [None])[0],
+                'format': params.get('format', [None])[0]
+            })
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path not in ('/recommendations', '/refresh'):
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            self.send_json(400, {"error": "Request body must be valid JSON"})
+            return
+
+        if not isinstance(payload, dict):
+            self.send_json(400, {"error": "Request body must be a JSON object"})
+            return
+
+        if url.path == '/refresh':
+            self.handle_refresh(payload)
+        else:
+            self.handle_recommendations(payload)
+
+    def handle_recommendations(self, params):
+        user_id = params.get('user_id')
+        if not user_id:
+            self.send_json(400, {"error": "user_id is required"})
+            return
+
+        limit = parse_limit(params.get('limit'))
+        page = None  # Offset and first window of a paginated request
+        if params.get('cursor'):
+            try:
+                page = decode_cursor(params['cursor'])
+            except (TypeError, ValueError):
+                self.send_json(400, {"error": "cursor is invalid"})
+                return
+            mode, near_km = page['mode'], page['near_km']
+        else:
+            mode = params.get('mode') or 'standard'
+            if mode not in MATCH_MODES:
+                self.send_json(400, {"error": f"mode must be one of: {', '.join(MATCH_MODES)}"})
+                return
+
+            try:
+                near_km = parse_near_km(params.get('near_km'))
+            except (TypeError, ValueError):
+                self.send_json(400, {"error": "near_km must be a positive number"})
+                return
+
+            if parse_flag(params.get('paginate')):
+                page = {'offset': 0, 'window': max(PAGE_WINDOW, limit)}
+
+        if params.get('format') == 'ndjson' or NDJSON_CONTENT_TYPE in self.headers.get('Accept', ''):
+            self.stream_recommendations(user_id, limit, mode, near_km, page)
+            return
+
+        if page is not None:
+            try:
+                with self.server.lock:
+                    recommendations, more = self.server.recommender.get_recommendation_page(
+                        user_id, page['offset'], limit, mode, near_km, page['window']
+                    )
+            except Exception as e:
+                self.send_json(500, {"error": str(e)})
+                return
+
+            response = build_response(user_id, recommendations, mode, near_km)
+            response['next_cursor'] = next_page_cursor(page, limit, mode, near_km, more)
+            self.send_json(200, response)
+            return
+
+        try:
+            with self.server.lock:
+                recommendations = self.server.recommender.get_recommendations(user_id, limit, mode, near_km)
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+
+        self.send_json(200, build_response(user_id, recommendations, mode, near_km))
+
+    def stream_recommendations(self, user_id, limit, mode, near_km, page=None):
+        """
+        NDJSON response: the page is ranked first, then each recommendation
+        is formatted and written on its own, releasing the lock in between
+        so slow readers do not hold up other requests
+        """
+        recommender = self.server.recommender
+        offset, window = (page['offset'], page['window']) if page else (0, None)
+        try:
+            with self.server.lock:
+                candidates, more = recommender.rank_page(user_id, offset, limit, mode, near_km, window)
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+
+        sent = 0
+
+        def recommendations():
+            nonlocal sent
+            for candidate in candidates:
+                with self.server.lock:
+                    recommendation = recommender.format_recommendation(user_id, candidate)
+                yield recommendation
+                sent += 1  # Resumed only once its line was written
+
+        fields = {}
+        if page is not None:
+            fields['next_cursor'] = next_page_cursor(page, limit, mode, near_km, more)
+
+        self.send_response(200)
+        self.send_header('Content-Type', NDJSON_CONTENT_TYPE)
+        self.end_headers()  # No Content-Length: the body ends when the connection closes
+        try:
+            for line in ndjson_lines(user_id, recommendations(), mode, near_km, **fields):
+                self.wfile.write(line.encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return  # Client went away
+        except Exception as e:
+            self.wfile.write((json.dumps({"error": str(e)}) + '\n').encode('utf-8'))
+            return
+        recommender.metrics.increment('recommendations_returned', sent)
+
+    def handle_refresh(self, params):
+        user_ids = params.get('user_ids')
+        if user_ids is not None and not isinstance(user_ids, list):
+            self.send_json(400, {"error": "user_ids must be a list"})
+            return
+
+        if params.get('rebuild'):
+            if self.server.parent_pid:
+                os.kill(self.server.parent_pid, signal.SIGUSR1)
+            elif self.server.refresher:
+                self.server.refresher.trigger()
+            else:
+                self.send_json(409, {"error": "Background rebuilds are not enabled"})
+                return
+            self.send_json(202, {"status": "rebuild scheduled"})
+            return
+
+        if self.server.parent_pid:
+            # Each worker holds its own copy; the parent relays SIGHUP to all of them
+            os.kill(self.server.parent_pid, signal.SIGHUP)
+            self.send_json(202, {"status": "refresh scheduled on all workers"})
+            return
+
+        try:
+            with self.server.lock:
+                summary = self.server.recommender.refresh(user_ids)
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+            return
+
+        self.send_json(200, summary)
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class RecommendationServer(ThreadingHTTPServer):
+    """HTTP server holding a single, already initialized recommender"""
+
+    daemon_threads = True
+
+    def __init__(self, recommender, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        super().__init__((host, port), RecommendationRequestHandler)
+        self.recommender = recommender
+        # Serializes access to the recommender's in-memory state
+        self.lock = threading.RLock()
+        self.parent_pid = None  # Set in pre-fork workers
+        self.refresher = None  # BackgroundRefresher swapping self.recommender, if any
+
+    def refresh_in_background(self):
+        """Apply changes since the last sync without blocking the accept loop"""
+        def run():
+            try:
+                with self.lock:
+                    summary = self.recommender.refresh()
+                print(f"🔁 Worker {os.getpid()} refreshed: {json.dumps(summary)}", file=sys.stderr)
+            except Exception as e:
+                print(f"Worker {os.getpid()} refresh error: {e}", file=sys.stderr)
+
+        threading.Thread(target=run, daemon=True).start()
+
+
+def serve(recommender, host=DEFAULT_HOST, port=DEFAULT_PORT, workers=1, on_worker_start=None, refresher=None):
+    """Serve recommendations until interrupted; returns the recommender serving last"""
+    server = RecommendationServer(recommender, host, port)
+    server.refresher = refresher
+    print(f"📡 Serving recommendations on http://{host}:{port}", file=sys.stderr)
+    try:
+        if workers > 1:
+            run_workers(server, workers, on_worker_start)
+        else:
+            if refresher:
+                refresher.start(server)
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if refresher:
+            refresher.stop()
+        server.server_close()
+    return server.recommender
+
+
+def stop_serving(signum, frame):
+    raise KeyboardInterrupt
+
+
+def retire_worker(server):
+    """Stop accepting (from a signal handler); serve_forever() then returns"""
+    threading.Thread(target=server.shutdown, daemon=True).start()
+
+
+def drain_requests(timeout=WORKER_DRAIN_TIMEOUT):
+    """Wait up to timeout seconds for request threads still running"""
+    deadline = time.monotonic() + timeout
+    while threading.active_count() > 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def run_worker(server, on_worker_start):
+    """Body of a forked worker; never returns"""
+    status = 0
+    try:
+        signal.signal(signal.SIGTERM, stop_serving)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the parent, which stops the workers
+        signal.signal(signal.SIGHUP, lambda signum, frame: server.refresh_in_background())
+        signal.signal(signal.SIGUSR1, signal.SIG_IGN)  # Rebuilds run in the parent
+        signal.signal(signal.SIGUSR2, lambda signum, frame: retire_worker(server))
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, SUPERVISOR_SIGNALS)  # Inherited from the parent
+        server.parent_pid = os.getppid()
+        if on_worker_start:
+            on_worker_start()
+        server.serve_forever()
+        drain_requests()
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"Worker {os.getpid()} error: {e}", file=sys.stderr)
+        status = 1
+    finally:
+        sys.stderr.flush()
+        os._exit(status)
+
+
+def run_workers(server, workers, on_worker_start=None):
+    """
+    Fork workers that share the listening socket and the already built
+    recommender, restart any that exit, and stop them all on SIGTERM/SIGINT.
+    SIGHUP to the parent is relayed to every worker as a refresh. Full
+    rebuilds (SIGUSR1 or the refresher's interval) run here, once for the
+    pool: workers forked from the new state replace the old ones, which
+    stop accepting and exit once their requests are answered (SIGUSR2).
+    """
+    children = {}
+    retiring = set()  # Replaced workers still finishing their requests
+    refresher = server.refresher
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            run_worker(server, on_worker_start)
+        children[pid] = time.monotonic()
+
+    def fork_workers():
+        # Move everything built so far out of the collector's reach, so GC
+        # passes in the workers do not write to (and un-share) those pages
+        gc.collect()
+        gc.freeze()
+        for _ in range(workers):
+            spawn()
+
+    def relay(signum, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def rebuild():
+        gc.unfreeze()  # The old state is only freed in full if the collector reaches it
+        if not refresher.refresh():
+            gc.freeze()
+            return
+        replaced = list(children)
+        fork_workers()
+        for pid in replaced:
+            del children[pid]
+            retiring.add(pid)
+        relay(signal.SIGUSR2, replaced)
+        print(f"♻️ Replaced {len(replaced)} workers with ones forked from the rebuilt state", file=sys.stderr)
+
+    def reap():
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if pid in retiring:
+                retiring.discard(pid)
+                continue
+            started_at = children.pop(pid, None)
+            if started_at is None:
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, restarting", file=sys.stderr)
+            if time.monotonic() - started_at < WORKER_RESTART_DELAY:
+                time.sleep(WORKER_RESTART_DELAY)
+            spawn()
+
+    signal.signal(signal.SIGTERM, stop_serving)
+    mask = signal.pthread_sigmask(signal.SIG_BLOCK, SUPERVISOR_SIGNALS)
+    if refresher:
+        refresher.attach(server)
+        # Parent and workers share the state, so the cap is on all of them together
+        refresher.memory = lambda: pool_memory([os.getpid(), *children, *retiring])
+    interval = refresher.interval if refresher else 0
+    fork_workers()
+    print(f"👷 Started {workers} workers", file=sys.stderr)
+
+    try:
+        next_rebuild_at = time.monotonic() + interval
+        while True:
+            if interval:
+                info = signal.sigtimedwait(SUPERVISOR_SIGNALS, max(next_rebuild_at - time.monotonic(), 0))
+            else:
+                info = signal.sigwaitinfo(SUPERVISOR_SIGNALS)
+            if info is None or info.si_signo == signal.SIGUSR1:
+                if refresher:
+                    rebuild()
+                next_rebuild_at = time.monotonic() + interval
+            elif info.si_signo == signal.SIGHUP:
+                relay(signal.SIGHUP, list(children))
+            else:
+                reap()
+    finally:
+        pids = [*children, *retiring]
+        relay(signal.SIGTERM, pids)
+        for pid in pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+
+
+def server_url():
+    """Base URL of the recommendation server used by the thin CLI client"""
+    return os.getenv('RECOMMENDER_URL', f"http://{DEFAULT_HOST}:{DEFAULT_PORT}")
+
+
+def remote_recommendations_url(user_id, limit, url=None, mode='standard', near_km=None, cursor=None, **params):
+    params = dict(params, user_id=user_id, limit=limit)
+    if cursor:
+        params['cursor'] = cursor  # Carries mode and near_km
+    else:
+        params['mode'] = mode
+        if near_km is not None:
+            params['near_km'] = near_km
+    return f"{(url or server_url()).rstrip('/')}/recommendations?{urlencode(params)}"
+
+
+def fetch_remote_recommendations(user_id, limit=DEFAULT_LIMIT, url=None, timeout=5.0, mode='standard', near_km=None,
+                                 cursor=None, paginate=False):
+    """
+    Ask a running recommendation server for recommendations.
+    Returns the decoded response, or None when no server is reachable.
+    """
+    extra = {'paginate': 1} if paginate and not cursor else {}
+    request_url = remote_recommendations_url(user_id, limit, url, mode, near_km, cursor, **extra)
+
+    try:
+        with urllib.request.urlopen(request_url, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            return json.loads(e.read())
+        except (ValueError, json.JSONDecodeError):
+            return {"error": f"Recommendation server returned HTTP {e.code}"}
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+
+def stream_remote_recommendations(user_id, limit=DEFAULT_LIMIT, url=None, timeout=5.0, mode='standard', near_km=None,
+                                  cursor=None, paginate=False):
+    """
+    Ask a running recommendation server for an NDJSON stream. Returns an
+    iterator over its lines as they arrive, or None when no server is
+    reachable.
+    """
+    extra = {'paginate': 1} if paginate and not cursor else {}
+    request_url = remote_recommendations_url(user_id, limit, url, mode, near_km, cursor, format='ndjson', **extra)
+
+    try:
+        response = urllib.request.urlopen(request_url, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        return iter([e.read().decode('utf-8').rstrip('\n') + '\n'])
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+    def lines():
+        with response:
+            for line in response:
+                yield line.decode('utf-8')
+
+    return lines()
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+"""
+CoLearn Recommendation Data Sources
+===================================
+
+Where the recommender reads users, exclusions and training labels from:
+
+    postgres (default)   the CoLearn Postgres schema, DATABASE_URL
+    postgresql://...     the same with an explicit connection URL
+    <path>.npz           a columnar file written by --export, for offline
+                         builds, tests and benchmarks without Postgres
+    synthetic:N[:seed]   N generated users (see synthetic_data.py)
+
+Pick one with --source=<spec> or RECOMMENDER_SOURCE. Only Postgres can
+report what changed since the last load; the other sources are reloaded
+in full on refresh.
+
+Every source returns users as the rows USERS_QUERY produces, so the
+pipeline does not care where they came from.
+"""
+
+import json
+import os
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+# Users with their skills, ratings, and other data. Every relation is
+# aggregated on its own and then joined 1:1 onto the user, so the
+# intermediate result never grows as offered x wanted x ratings x swaps.
+USERS_QUERY = """
+WITH target AS (
+    SELECT u.id, u.name, u.location, u.experience_years, u."createdAt" as created_at
+    FROM "CoLearn".users u
+    WHERE u."isActive" = true AND u."isPublic" = true {user_filter}
+),
+
+-- Skills offered (what they can teach)
+offered AS (
+    SELECT uso."B" as user_id,
+           array_agg(DISTINCT s.name) as skills_offered,
+           array_agg(DISTINCT s.description) FILTER (WHERE s.description IS NOT NULL) as skills_offered_desc
+    FROM target t
+    JOIN "CoLearn"."_SkillsOffered" uso ON uso."B" = t.id
+    JOIN "CoLearn".skills s ON s.id = uso."A"
+    GROUP BY uso."B"
+),
+
+-- Skills wanted (what they want to learn)
+wanted AS (
+    SELECT usw."B" as user_id,
+           array_agg(DISTINCT s.name) as skills_wanted,
+           array_agg(DISTINCT s.description) FILTER (WHERE s.description IS NOT NULL) as skills_wanted_desc
+    FROM target t
+    JOIN "CoLearn"."_SkillsWanted" usw ON usw."B" = t.id
+    JOIN "CoLearn".skills s ON s.id = usw."A"
+    GROUP BY usw."B"
+),
+
+-- Average rating received
+received AS (
+    SELECT r."receiverId" as user_id, AVG(r.rating) as avg_rating, COUNT(*) as total_ratings
+    FROM target t
+    JOIN "CoLearn".ratings r ON r."receiverId" = t.id
+    GROUP BY r."receiverId"
+),
+
+-- Number of completed sessions, one indexable join per side of the swap
+-- instead of a single join on requester OR receiver
+sessions AS (
+    SELECT user_id, COUNT(DISTINCT swap_id) as completed_sessions
+    FROM (
+        SELECT sr."requesterId" as user_id, sr.id as swap_id
+        FROM target t
+        JOIN "CoLearn".swap_requests sr ON sr."requesterId" = t.id
+        WHERE sr.status = 'COMPLETED'
+        UNION ALL
+        SELECT sr."receiverId" as user_id, sr.id as swap_id
+        FROM target t
+        JOIN "CoLearn".swap_requests sr ON sr."receiverId" = t.id
+        WHERE sr.status = 'COMPLETED'
+    ) completed
+    GROUP BY user_id
+)
+
+SELECT 
+    t.id,
+    t.name,
+    t.location,
+    t.experience_years,
+    t.created_at,
+    o.skills_offered,
+    o.skills_offered_desc,
+    w.skills_wanted,
+    w.skills_wanted_desc,
+    COALESCE(r.avg_rating, 0) as avg_rating,
+    COALESCE(r.total_ratings, 0) as total_ratings,
+    COALESCE(s.completed_sessions, 0) as completed_sessions
+FROM target t
+LEFT JOIN offered o ON o.user_id = t.id
+LEFT JOIN wanted w ON w.user_id = t.id
+LEFT JOIN received r ON r.user_id = t.id
+LEFT JOIN sessions s ON s.user_id = t.id
+ORDER BY t.name
+"""
+
+# Rows pulled per round trip from the server-side cursor
+FETCH_BATCH_SIZE = 5000
+
+# Users touched since a point in time: profile/skill edits, new ratings
+# received, and swap request changes on either side. The Prisma columns are
+# UTC timestamps without time zone, so `since` must be one as well (see
+# SYNC_TIME_QUERY); a timestamptz would be converted in the session TimeZone
+CHANGED_USERS_QUERY = """
+SELECT id FROM "CoLearn".users WHERE "updatedAt" > %(since)s
+UNION
+SELECT "receiverId" FROM "CoLearn".ratings WHERE "createdAt" > %(since)s
+UNION
+SELECT "requesterId" FROM "CoLearn".swap_requests WHERE "updatedAt" > %(since)s
+UNION
+SELECT "receiverId" FROM "CoLearn".swap_requests WHERE "updatedAt" > %(since)s
+"""
+
+# The current time as a UTC timestamp without time zone, like the columns
+# CHANGED_USERS_QUERY compares it with
+SYNC_TIME_QUERY = "SELECT now() AT TIME ZONE 'UTC'"
+
+ACTIVE_USER_IDS_QUERY = """
+SELECT id FROM "CoLearn".users WHERE "isActive" = true AND "isPublic" = true
+"""
+
+# Users nobody should be recommended
+BANNED_USERS_QUERY = """
+SELECT "userId" FROM "CoLearn".banned_users WHERE "isActive" = true
+"""
+
+# (user, candidate) pairs never recommended to that user: the other side of
+# a pending swap request, and users the target has already rated
+EXCLUDED_PAIRS_QUERY = """
+SELECT "requesterId", "receiverId" FROM "CoLearn".swap_requests WHERE status = 'PENDING'
+UNION
+SELECT "receiverId", "requesterId" FROM "CoLearn".swap_requests WHERE status = 'PENDING'
+UNION
+SELECT "giverId", "receiverId" FROM "CoLearn".ratings
+"""
+
+# The excluded pairs with either side among some users, for incremental
+# refreshes: a pending swap changing touches both sides, a new rating at
+# least its receiver
+USER_EXCLUDED_PAIRS_QUERY = """
+SELECT "requesterId", "receiverId" FROM "CoLearn".swap_requests
+WHERE status = 'PENDING' AND ("requesterId" = ANY(%(user_ids)s) OR "receiverId" = ANY(%(user_ids)s))
+UNION
+SELECT "receiverId", "requesterId" FROM "CoLearn".swap_requests
+WHERE status = 'PENDING' AND ("requesterId" = ANY(%(user_ids)s) OR "receiverId" = ANY(%(user_ids)s))
+UNION
+SELECT "giverId", "receiverId" FROM "CoLearn".ratings
+WHERE "giverId" = ANY(%(user_ids)s) OR "receiverId" = ANY(%(user_ids)s)
+"""
+
+# Labeled (target, candidate) pairs for training the Layer-2 ranker from real
+# outcomes: swap requests the receiver accepted or rejected, and ratings the
+# giver left after learning from the receiver (neutral 3-star ratings skipped).
+# Each pair also says what its outcome added to the candidate's totals in
+# USERS_QUERY (the rating given, 0 for swaps; 1 for a completed swap), so
+# training can leave it out of the candidate's reputation features.
+TRAINING_PAIRS_QUERY = """
+SELECT "requesterId", "receiverId",
+       CASE WHEN status IN ('ACCEPTED', 'COMPLETED') THEN 1 ELSE 0 END as label,
+       0 as rating,
+       CASE WHEN status = 'COMPLETED' THEN 1 ELSE 0 END as completed
+FROM "CoLearn".swap_requests
+WHERE status IN ('ACCEPTED', 'COMPLETED', 'REJECTED')
+UNION ALL
+SELECT "giverId", "receiverId", CASE WHEN rating >= 4 THEN 1 ELSE 0 END as label,
+       rating, 0 as completed
+FROM "CoLearn".ratings
+WHERE rating <> 3
+"""
+
+# Columnar user file layout version, bumped on incompatible changes
+USER_FILE_FORMAT_VERSION = 2
+
+# Skill list columns of a user row and the vocabulary each is encoded against
+SKILL_LIST_COLUMNS = (
+    ('skills_offered', 'skill_names'),
+    ('skills_wanted', 'skill_names'),
+    ('skills_offered_desc', 'skill_descriptions'),
+    ('skills_wanted_desc', 'skill_descriptions'),
+)
+
+
+class PostgresSource:
+    """The CoLearn Postgres schema"""
+
+    incremental = True
+
+    def __init__(self, url=None, connection=None):
+        self.url = url
+        self.connection = connection
+
+    def connect(self):
+        if self.connection is None:
+            url = self.url or os.getenv('DATABASE_URL')
+            if not url:
+                raise ValueError("DATABASE_URL not found in environment variables")
+            import psycopg2
+            self.connection = psycopg2.connect(url)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def load(self):
+        """
+        Everything a full build needs, read in one transaction:
+        (users, banned_user_ids, excluded_pairs, sync_at)
+        """
+        cursor = self.connection.cursor()
+        try:
+            # Remember when this load started so incremental refreshes
+            # can pick up everything that changes from here on
+            cursor.execute(SYNC_TIME_QUERY)
+            sync_at = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+        users = list(self.iter_users())
+        # Ends the read transaction, so later now() calls move forward
+        banned_user_ids, excluded_pairs = self.fetch_exclusions()
+        return users, banned_user_ids, excluded_pairs, sync_at
+
+    def iter_users(self, user_filter='', params=None):
+        """
+        Stream user rows through a server-side (named) cursor, FETCH_BATCH_SIZE
+        rows per round trip, instead of materializing the whole result at once
+        """
+        cursor = self.connection.cursor(name='recommendation_users')
+        cursor.itersize = FETCH_BATCH_SIZE
+        try:
+            cursor.execute(USERS_QUERY.format(user_filter=user_filter), params)
+            columns = None
+            while True:
+                rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+                if not rows:
+                    break
+                if columns is None:
+                    columns = [column[0] for column in cursor.description]
+                for row in rows:
+                    yield dict(zip(columns, row))
+        finally:
+            cursor.close()
+
+    def fetch_users(self, user_ids):
+        """Rows of specific users (only those still active and public)"""
+        try:
+            return list(self.iter_users('AND u.id = ANY(%(user_ids)s)', {'user_ids': list(user_ids)}))
+        finally:
+            self.connection.commit()
+
+    def fetch_changes(self, since):
+        """(sync_at, ids of users changed since `since`, ids of all active users)"""
+        if since is not None and since.tzinfo is not None:
+            since = utc_timestamp(since)  # Recorded by an older version
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(SYNC_TIME_QUERY)
+            sync_at = cursor.fetchone()[0]
+
+            cursor.execute(CHANGED_USERS_QUERY, {'since': since})
+            changed_ids = {row[0] for row in cursor.fetchall()}
+
+            # Deleted, deactivated or hidden users never show up as changed
+            # rows, so callers diff the active id set against what they hold
+            cursor.execute(ACTIVE_USER_IDS_QUERY)
+            active_ids = {row[0] for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            self.connection.commit()
+        return sync_at, changed_ids, active_ids
+
+    def fetch_exclusions(self, user_ids=None):
+        """
+        Banned user ids and the per-user excluded candidates (pending swaps,
+        already rated); with user_ids, only the pairs either side of which
+        is one of those users
+        """
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(BANNED_USERS_QUERY)
+            banned_user_ids = {row[0] for row in cursor.fetchall()}
+
+            if user_ids is None:
+                cursor.execute(EXCLUDED_PAIRS_QUERY)
+            else:
+                cursor.execute(USER_EXCLUDED_PAIRS_QUERY, {'user_ids': list(user_ids)})
+            excluded_pairs = {}
+            for user_id, excluded_id in cursor:
+                excluded_pairs.setdefault(user_id, set()).add(excluded_id)
+        finally:
+            cursor.close()
+            self.connection.commit()
+        return banned_user_ids, excluded_pairs
+
+    def fetch_training_pairs(self):
+        """Labeled (target_id, candidate_id, label, rating, completed) pairs from swap outcomes and ratings"""
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(TRAINING_PAIRS_QUERY)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            self.connection.commit()
+
+
+class FileSource:
+    """Users, exclusions and training pairs exported to a columnar .npz file"""
+
+    incremental = False
+
+    def __init__(self, path):
+        self.path = path
+
+    def connect(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"User file {self.path} does not exist")
+
+    def close(self):
+        pass
+
+    def load(self):
+        with np.load(self.path) as data:
+            meta = json.loads(bytes(data['meta']).decode('utf-8'))
+            if meta['format_version'] != USER_FILE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported user file format {meta['format_version']}")
+            users = decode_users(data, meta['users'])
+            banned_user_ids = set(unpack_strings(data['banned_user_ids'], meta['banned']))
+            excluded_pairs = {}
+            for user_id, excluded_id in zip(unpack_strings(data['excluded_users'], meta['excluded_pairs']),
+                                            unpack_strings(data['excluded_ids'], meta['excluded_pairs'])):
+                excluded_pairs.setdefault(user_id, set()).add(excluded_id)
+
+        sync_at = datetime.fromisoformat(meta['sync_at']) if meta['sync_at'] else None
+        return users, banned_user_ids, excluded_pairs, sync_at
+
+    def fetch_training_pairs(self):
+        with np.load(self.path) as data:
+            count = len(data['training_labels'])
+            return list(zip(
+                unpack_strings(data['training_targets'], count),
+                unpack_strings(data['training_candidates'], count),
+                data['training_labels'].tolist(),
+                data['training_ratings'].tolist(),
+                data['training_completed'].tolist()
+            ))
+
+
+class SyntheticSource:
+    """Generated users shaped like real CoLearn data, for tests and benchmarks"""
+
+    incremental = False
+
+    def __init__(self, n_users, seed=42):
+        self.n_users = n_users
+        self.seed = seed
+        self.dataset = None
+
+    def connect(self):
+        if self.dataset is None:
+            from synthetic_data import generate_dataset
+            self.dataset = generate_dataset(self.n_users, seed=self.seed)
+
+    def close(self):
+        self.dataset = None
+
+    def load(self):
+        from synthetic_data import exclusions, users_rows
+        banned_user_ids, excluded_pairs = exclusions(self.dataset)
+        return users_rows(self.dataset), banned_user_ids, excluded_pairs, utc_timestamp(datetime.now(timezone.utc))
+
+    def fetch_training_pairs(self):
+        from synthetic_data import training_pairs
+        return training_pairs(self.dataset)
+
+
+def utc_timestamp(moment):
+    """An aware datetime as the naive UTC timestamp every source reports sync times in"""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def open_source(spec=None):
+    """Data source for a --source / RECOMMENDER_SOURCE spec (Postgres by default)"""
+    spec = spec or os.getenv('RECOMMENDER_SOURCE') or 'postgres'
+    if spec == 'postgres':
+        return PostgresSource()
+    if spec.startswith(('postgres://', 'postgresql://')):
+        return PostgresSource(url=spec)
+    if spec.startswith('synthetic'):
+        _, _, params = spec.partition(':')
+        n_users, _, seed = params.partition(':')
+        return SyntheticSource(int(n_users or 10000), int(seed or 42))
+    if spec.endswith('.npz'):
+        return FileSource(spec)
+    raise ValueError(f"Unknown data source '{spec}', expected postgres, a postgresql:// URL, a .npz file or synthetic:N")
+
+
+def pack_strings(values):
+    """Strings -> one NUL-separated UTF-8 byte array (Postgres text never contains NUL)"""
+    return np.frombuffer('\x00'.join(values).encode('utf-8'), dtype=np.uint8)
+
+
+def unpack_strings(data, count):
+    return data.tobytes().decode('utf-8').split('\x00') if count else []
+
+
+def optional_strings(values):
+    """Packed strings plus a missing mask for a column that may hold None"""
+    return pack_strings([value or '' for value in values]), np.array([value is None for value in values], dtype=bool)
+
+
+def encode_lists(rows, column, vocabulary):
+    """A skill list column as codes into a shared vocabulary plus CSR-style offsets (None = empty)"""
+    codes = []
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    for i, row in enumerate(rows):
+        for value in row[column] or ():
+            codes.append(vocabulary.setdefault(value, len(vocabulary)))
+        indptr[i + 1] = len(codes)
+    return np.array(codes, dtype=np.int32), indptr
+
+
+def export_users(path, users, banned_user_ids, excluded_pairs, sync_at, training_pairs=()):
+    """
+    Write users (rows as USERS_QUERY returns them), exclusions and training
+    pairs to a columnar .npz file that FileSource loads. Returns the path.
+    """
+    arrays = {}
+    vocabularies = {'skill_names': {}, 'skill_descriptions': {}}
+
+    arrays['ids'] = pack_strings([user['id'] for user in users])
+    arrays['names'] = pack_strings([user['name'] or '' for user in users])
+    arrays['locations'], arrays['location_missing'] = optional_strings([user['location'] for user in users])
+    arrays['created_at'], arrays['created_at_missing'] = optional_strings([
+        user['created_at'].isoformat() if user['created_at'] else None for user in users
+    ])
+    arrays['experience_years'] = np.array([user['experience_years'] or 0 for user in users], dtype=np.int32)
+    arrays['avg_rating'] = np.array([float(user['avg_rating']) for user in users], dtype=np.float64)
+    arrays['total_ratings'] = np.array([int(user['total_ratings']) for user in users], dtype=np.int64)
+    arrays['completed_sessions'] = np.array([int(user['completed_sessions']) for user in users], dtype=np.int64)
+    for column, vocabulary in SKILL_LIST_COLUMNS:
+        arrays[f"{column}_codes"], arrays[f"{column}_indptr"] = encode_lists(users, column, vocabularies[vocabulary])
+    for vocabulary, values in vocabularies.items():
+        arrays[vocabulary] = pack_strings(list(values))
+
+    arrays['banned_user_ids'] = pack_strings(sorted(banned_user_ids))
+    pairs = [(user_id, excluded_id) for user_id, ids in excluded_pairs.items() for excluded_id in ids]
+    arrays['excluded_users'] = pack_strings([user_id for user_id, _ in pairs])
+    arrays['excluded_ids'] = pack_strings([excluded_id for _, excluded_id in pairs])
+
+    training_pairs = list(training_pairs)
+    arrays['training_targets'] = pack_strings([pair[0] for pair in training_pairs])
+    arrays['training_candidates'] = pack_strings([pair[1] for pair in training_pairs])
+    arrays['training_labels'] = np.array([pair[2] for pair in training_pairs], dtype=np.int8)
+    arrays['training_ratings'] = np.array([pair[3] for pair in training_pairs], dtype=np.int8)
+    arrays['training_completed'] = np.array([pair[4] for pair in training_pairs], dtype=np.int8)
+
+    arrays['meta'] = np.frombuffer(json.dumps({
+        'format_version': USER_FILE_FORMAT_VERSION,
+        'users': len(users),
+        'skill_names': len(vocabularies['skill_names']),
+        'skill_descriptions': len(vocabularies['skill_descriptions']),
+        'banned': len(banned_user_ids),
+        'excluded_pairs': len(pairs),
+        'sync_at': sync_at.isoformat() if sync_at else None,
+        'exported_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }).encode('utf-8'), dtype=np.uint8)
+
+    # Write next to the target and rename, so readers never see a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+    return path
+
+
+def decode_users(data, count):
+    """Rebuild USERS_QUERY-shaped rows from the columns of a user file"""
+    meta = json.loads(bytes(data['meta']).decode('utf-8'))
+    vocabularies = {
+        name: unpack_strings(data[name], meta[name])
+        for name in ('skill_names', 'skill_descriptions')
+    }
+    ids = unpack_strings(data['ids'], count)
+    names = unpack_strings(data['names'], count)
+    locations = unpack_strings(data['locations'], count)
+    location_missing = data['location_missing'].tolist()
+    created_at = unpack_strings(data['created_at'], count)
+    created_at_missing = data['created_at_missing'].tolist()
+    experience_years = data['experience_years'].tolist()
+    avg_rating = data['avg_rating'].tolist()
+    total_ratings = data['total_ratings'].tolist()
+    completed_sessions = data['completed_sessions'].tolist()
+
+    lists = {}
+    for column, vocabulary in SKILL_LIST_COLUMNS:
+        values = vocabularies[vocabulary]
+        codes = data[f"{column}_codes"].tolist()
+        indptr = data[f"{column}_indptr"].tolist()
+        lists[column] = [
+            [values[code] for code in codes[indptr[i]:indptr[i + 1]]] or None
+            for i in range(count)
+        ]
+
+    return [
+        {
+            'id': ids[i],
+            'name': names[i],
+            'location': None if location_missing[i] else locations[i],
+            'experience_years': experience_years[i],
+            'created_at': None if created_at_missing[i] else datetime.fromisoformat(created_at[i]),
+            'skills_offered': lists['skills_offered'][i],
+            'skills_offered_desc': lists['skills_offered_desc'][i],
+            'skills_wanted': lists['skills_wanted'][i],
+            'skills_wanted_desc': lists['skills_wanted_desc'][i],
+            'avg_rating': avg_rating[i],
+            'total_ratings': total_ratings[i],
+            'completed_sessions': completed_sessions[i],
+        }
+        for i in range(count)
+    ]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+CoLearn Skill Normalization and Embeddings
+==========================================
+
+canonical_skill() folds spelling variants of a skill name ("React.js",
+"ReactJS", "react") into one canonical key, so they share a vector column.
+
+SkillEmbedder maps a skill name to a dense vector by hashing its character
+n-grams and words into a fixed number of dimensions. It needs no training
+data or model download, and the vector of a name never depends on the rest
+of the vocabulary, so new skills are embedded on their own and appended to
+the skill -> vector table. Related names ("Python Basics", "Python
+(Advanced)", "Pyhton") end up close to each other.
+"""
+
+import re
+import unicodedata
+import zlib
+import numpy as np
+
+DEFAULT_EMBEDDING_DIM = 256
+
+# Common abbreviations and alternative spellings -> canonical key
+SKILL_ALIASES = {
+    'js': 'javascript',
+    'ecmascript': 'javascript',
+    'ts': 'typescript',
+    'reactjs': 'react',
+    'react native js': 'react native',
+    'nodejs': 'node',
+    'vuejs': 'vue',
+    'nextjs': 'next',
+    'golang': 'go',
+    'postgres': 'postgresql',
+    'k8s': 'kubernetes',
+    'ml': 'machine learning',
+    'ai': 'artificial intelligence',
+    'ms excel': 'excel',
+    'microsoft excel': 'excel',
+    'adobe photoshop': 'photoshop',
+}
+
+# Framework suffixes dropped from multi-word names ("React.js" -> "react")
+TRAILING_SUFFIXES = ('js',)
+
+# Level and filler words: kept in the key, but they only add a light
+# whole-word feature so "X (Advanced)" does not match "Y (Advanced)"
+QUALIFIER_WORDS = {
+    'a', 'advanced', 'and', 'basic', 'basics', 'beginner', 'beginners', 'course', 'for',
+    'fundamentals', 'intermediate', 'intro', 'introduction', 'masterclass', 'of', 'the', 'to',
+}
+
+_SEPARATORS = re.compile(r"[^a-z0-9+#]+")
+
+
+def canonical_skill(name):
+    """Canonical key of a skill name: case, accents, punctuation and aliases folded"""
+    text = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii').lower()
+    text = text.replace('&', ' and ')
+    words = _SEPARATORS.sub(' ', text).split()
+    if len(words) > 1 and words[-1] in TRAILING_SUFFIXES:
+        words = words[:-1]
+    key = ' '.join(words)
+    return SKILL_ALIASES.get(key, key) or name.strip().lower()
+
+
+class SkillEmbedder:
+    """Hashed character n-gram embeddings of skill names"""
+
+    def __init__(self, dim=DEFAULT_EMBEDDING_DIM, ngram_sizes=(2, 3)):
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+
+    def features(self, key):
+        """Weighted hashing features of a canonical skill key"""
+        features = []
+        for word in key.split():
+            if word in QUALIFIER_WORDS:
+                features.append((f"w:{word}", 0.5))
+                continue
+            features.append((f"w:{word}", 2.0))  # Whole words weigh more than fragments
+            padded = f"<{word}>"
+            for n in self.ngram_sizes:
+                for start in range(max(len(padded) - n + 1, 1)):
+                    features.append((padded[start:start + n], 1.0))
+        return features
+
+    def embed(self, name):
+        """L2-normalized float32 vector of one skill name"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self.features(canonical_skill(name)):
+            digest = zlib.crc32(feature.encode('utf-8'))
+            # Signed hashing keeps collisions from adding up systematically
+            vector[digest % self.dim] += weight if digest & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_many(self, names):
+        """(len(names), dim) table of skill vectors"""
+        table = np.zeros((len(names), self.dim), dtype=np.float32)
+        for row, name in enumerate(names):
+            table[row] = self.embed(name)
+        return table
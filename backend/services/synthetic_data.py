@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Synthetic CoLearn Data
+======================
+
+Generates users, skills, skill links, ratings and swap requests shaped like
+real CoLearn data (Zipf-like skill popularity, clustered locations, a long
+tail of ratings and sessions) for benchmarks. Nothing here touches a
+database; see bench_fetch_data.py for seeding Postgres with it,
+users_rows() and exclusions() for feeding a recommender directly and
+training_pairs() for ranker training labels.
+"""
+
+import numpy as np
+
+BASE_SKILLS = [
+    ('JavaScript', 'TECHNOLOGY'), ('Python', 'TECHNOLOGY'), ('React', 'TECHNOLOGY'),
+    ('Node.js', 'TECHNOLOGY'), ('TypeScript', 'TECHNOLOGY'), ('Java', 'TECHNOLOGY'),
+    ('SQL', 'TECHNOLOGY'), ('Docker', 'TECHNOLOGY'), ('Kubernetes', 'TECHNOLOGY'),
+    ('Machine Learning', 'TECHNOLOGY'), ('Data Analysis', 'TECHNOLOGY'), ('Go', 'TECHNOLOGY'),
+    ('Rust', 'TECHNOLOGY'), ('C++', 'TECHNOLOGY'), ('Android Development', 'TECHNOLOGY'),
+    ('iOS Development', 'TECHNOLOGY'), ('Excel', 'BUSINESS'), ('Public Speaking', 'BUSINESS'),
+    ('Digital Marketing', 'BUSINESS'), ('Accounting', 'BUSINESS'), ('Product Management', 'BUSINESS'),
+    ('UI Design', 'DESIGN'), ('Figma', 'DESIGN'), ('Photoshop', 'DESIGN'),
+    ('Illustration', 'DESIGN'), ('Video Editing', 'DESIGN'), ('English', 'LANGUAGE'),
+    ('Spanish', 'LANGUAGE'), ('French', 'LANGUAGE'), ('German', 'LANGUAGE'),
+    ('Japanese', 'LANGUAGE'), ('Hindi', 'LANGUAGE'), ('Guitar', 'MUSIC'),
+    ('Piano', 'MUSIC'), ('Singing', 'MUSIC'), ('Tabla', 'MUSIC'),
+    ('Music Production', 'MUSIC'), ('Indian Cooking', 'COOKING'), ('Baking', 'COOKING'),
+    ('Yoga', 'FITNESS'), ('Running', 'FITNESS'), ('Strength Training', 'FITNESS'),
+    ('Knitting', 'CRAFTS'), ('Pottery', 'CRAFTS'), ('Photography', 'PHOTOGRAPHY'),
+    ('Creative Writing', 'WRITING'), ('Copywriting', 'WRITING'), ('Mathematics', 'TUTORING'),
+    ('Physics', 'TUTORING'), ('Chess', 'LIFESTYLE'), ('Meditation', 'LIFESTYLE'),
+    ('Car Maintenance', 'AUTOMOTIVE'), ('Carpentry', 'HOME_IMPROVEMENT'), ('Gardening', 'GARDENING'),
+]
+
+SKILL_VARIANTS = ['', ' Basics', ' (Advanced)', ' for Beginners', ' Fundamentals', ' Masterclass']
+
+# (city, state, relative population weight)
+LOCATIONS = [
+    ('Mumbai', 'Maharashtra', 20), ('Pune', 'Maharashtra', 10), ('Nagpur', 'Maharashtra', 3),
+    ('Delhi', 'Delhi', 18), ('Bangalore', 'Karnataka', 16), ('Mysore', 'Karnataka', 2),
+    ('Hyderabad', 'Telangana', 12), ('Chennai', 'Tamil Nadu', 11), ('Coimbatore', 'Tamil Nadu', 3),
+    ('Kolkata', 'West Bengal', 10), ('Ahmedabad', 'Gujarat', 9), ('Surat', 'Gujarat', 5),
+    ('Vadodara', 'Gujarat', 3), ('Gandhinagar', 'Gujarat', 2), ('Jaipur', 'Rajasthan', 5),
+    ('Lucknow', 'Uttar Pradesh', 5), ('Kochi', 'Kerala', 3), ('Chandigarh', 'Punjab', 2),
+    ('Bhopal', 'Madhya Pradesh', 2), ('Indore', 'Madhya Pradesh', 3),
+]
+
+SWAP_STATUSES = ['PENDING', 'ACCEPTED', 'REJECTED', 'CANCELLED', 'COMPLETED']
+SWAP_STATUS_WEIGHTS = [0.2, 0.15, 0.15, 0.1, 0.4]
+
+
+def vocabulary_size(n_users):
+    """The skill vocabulary keeps growing (slowly) with the user base"""
+    return min(len(BASE_SKILLS) * len(SKILL_VARIANTS), 40 + n_users // 200)
+
+
+def generate_skills(n_skills):
+    """Skill rows as (id, name, description, category)"""
+    skills = []
+    for i in range(n_skills):
+        base_name, category = BASE_SKILLS[i % len(BASE_SKILLS)]
+        name = base_name + SKILL_VARIANTS[(i // len(BASE_SKILLS)) % len(SKILL_VARIANTS)]
+        skills.append((f"skill-{i:05d}", name, f"Learn or teach {name}", category))
+    return skills
+
+
+def zipf_weights(n, exponent=1.1):
+    """Popularity weights: a few skills are very common, most are rare"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def sample_links(rng, user_ids, skill_ids, weights, max_per_user):
+    """(skill_id, user_id) pairs with 0..max_per_user distinct skills per user"""
+    links = []
+    counts = rng.integers(0, max_per_user + 1, size=len(user_ids))
+    for user_id, count in zip(user_ids, counts):
+        if count:
+            for col in rng.choice(len(skill_ids), size=count, replace=False, p=weights):
+                links.append((skill_ids[col], user_id))
+    return links
+
+
+def generate_dataset(n_users, seed=42, inactive_fraction=0.05):
+    """
+    Generate a relational CoLearn dataset. Returns a dict of row lists:
+    users, skills, offered, wanted, ratings and swaps.
+    """
+    rng = np.random.default_rng(seed)
+
+    user_ids = [f"user-{i:07d}" for i in range(n_users)]
+    location_weights = np.array([weight for _, _, weight in LOCATIONS], dtype=np.float64)
+    location_choice = rng.choice(len(LOCATIONS), size=n_users, p=location_weights / location_weights.sum())
+    no_location = rng.random(n_users) < 0.1
+    experience = np.minimum(rng.geometric(0.2, size=n_users) - 1, 40)
+    active = rng.random(n_users) >= inactive_fraction
+
+    users = []
+    for i, user_id in enumerate(user_ids):
+        city, state, _ = LOCATIONS[location_choice[i]]
+        users.append({
+            'id': user_id,
+            'name': f"User {i:07d}",
+            'email': f"user{i}@example.com",
+            'location': None if no_location[i] else f"{city}, {state}",
+            'experience_years': int(experience[i]),
+            'isActive': bool(active[i]),
+            'isPublic': True,
+        })
+
+    skills = generate_skills(vocabulary_size(n_users))
+    skill_ids = [skill[0] for skill in skills]
+    weights = zipf_weights(len(skill_ids))
+    offered = sample_links(rng, user_ids, skill_ids, weights, max_per_user=5)
+    wanted = sample_links(rng, user_ids, skill_ids, weights[::-1].copy(), max_per_user=4)
+
+    # Ratings: a long tail of receivers, one rating per (giver, receiver)
+    rating_pairs = set()
+    n_ratings = n_users * 2
+    givers = rng.integers(0, n_users, size=n_ratings)
+    receivers = np.minimum(rng.zipf(1.5, size=n_ratings) - 1, n_users - 1)
+    receivers = rng.permutation(n_users)[receivers]
+    scores = rng.choice([1, 2, 3, 4, 5], size=n_ratings, p=[0.05, 0.05, 0.15, 0.35, 0.4])
+    ratings = []
+    for giver, receiver, score in zip(givers, receivers, scores):
+        if giver != receiver and (giver, receiver) not in rating_pairs:
+            rating_pairs.add((giver, receiver))
+            ratings.append((f"rating-{len(ratings):08d}", int(score), user_ids[giver], user_ids[receiver]))
+
+    # Swap requests between random pairs of users
+    n_swaps = n_users * 3
+    requesters = rng.integers(0, n_users, size=n_swaps)
+    swap_receivers = rng.integers(0, n_users, size=n_swaps)
+    statuses = rng.choice(len(SWAP_STATUSES), size=n_swaps, p=SWAP_STATUS_WEIGHTS)
+    swaps = [
+        (f"swap-{i:08d}", user_ids[requester], user_ids[receiver], SWAP_STATUSES[status])
+        for i, (requester, receiver, status) in enumerate(zip(requesters, swap_receivers, statuses))
+        if requester != receiver
+    ]
+
+    return {
+        'users': users,
+        'skills': skills,
+        'offered': offered,
+        'wanted': wanted,
+        'ratings': ratings,
+        'swaps': swaps,
+    }
+
+
+def training_pairs(dataset):
+    """
+    Labeled (target_id, candidate_id, label, rating, completed) pairs from
+    swap outcomes and ratings, as TRAINING_PAIRS_QUERY returns them
+    """
+    pairs = [
+        (requester, receiver, int(status in ('ACCEPTED', 'COMPLETED')), 0, int(status == 'COMPLETED'))
+        for _, requester, receiver, status in dataset['swaps']
+        if status in ('ACCEPTED', 'COMPLETED', 'REJECTED')
+    ]
+    pairs.extend(
+        (giver, receiver, int(score >= 4), int(score), 0)
+        for _, score, giver, receiver in dataset['ratings']
+        if score != 3
+    )
+    return pairs
+
+
+def exclusions(dataset):
+    """
+    (banned_user_ids, excluded_pairs) as BANNED_USERS_QUERY and
+    EXCLUDED_PAIRS_QUERY return them; synthetic data bans nobody
+    """
+    excluded_pairs = {}
+    for _, requester, receiver, status in dataset['swaps']:
+        if status == 'PENDING':
+            excluded_pairs.setdefault(requester, set()).add(receiver)
+            excluded_pairs.setdefault(receiver, set()).add(requester)
+    for _, _, giver, receiver in dataset['ratings']:
+        excluded_pairs.setdefault(giver, set()).add(receiver)
+    return set(), excluded_pairs
+
+
+def users_rows(dataset):
+    """
+    Aggregate a dataset into the per-user rows fetch_data() returns, for
+    building a recommender without a database
+    """
+    skills = {skill_id: (name, description) for skill_id, name, description, _ in dataset['skills']}
+
+    def skills_by_user(links):
+        grouped = {}
+        for skill_id, user_id in links:
+            grouped.setdefault(user_id, []).append(skills[skill_id])
+        return grouped
+
+    offered = skills_by_user(dataset['offered'])
+    wanted = skills_by_user(dataset['wanted'])
+
+    rating_sums = {}
+    rating_counts = {}
+    for _, score, _, receiver in dataset['ratings']:
+        rating_sums[receiver] = rating_sums.get(receiver, 0) + score
+        rating_counts[receiver] = rating_counts.get(receiver, 0) + 1
+
+    completed = {}
+    for _, requester, receiver, status in dataset['swaps']:
+        if status == 'COMPLETED':
+            completed[requester] = completed.get(requester, 0) + 1
+            completed[receiver] = completed.get(receiver, 0) + 1
+
+    rows = []
+    for user in dataset['users']:
+        if not (user['isActive'] and user['isPublic']):
+            continue
+        user_id = user['id']
+        user_offered = offered.get(user_id, [])
+        user_wanted = wanted.get(user_id, [])
+        count = rating_counts.get(user_id, 0)
+        rows.append({
+            'id': user_id,
+            'name': user['name'],
+            'location': user['location'],
+            'experience_years': user['experience_years'],
+            'created_at': None,
+            'skills_offered': sorted({name for name, _ in user_offered}) or None,
+            'skills_offered_desc': sorted({description for _, description in user_offered}) or None,
+            'skills_wanted': sorted({name for name, _ in user_wanted}) or None,
+            'skills_wanted_desc': sorted({description for _, description in user_wanted}) or None,
+            'avg_rating': rating_sums[user_id] / count if count else 0.0,
+            'total_ratings': count,
+            'completed_sessions': completed.get(user_id, 0),
+        })
+
+    rows.sort(key=lambda row: row['name'])
+    return rows
@@ -0,0 +1,69 @@
+"""
+Snapshot loads must leave the FAISS index and the feature columns in the
+mapped files, so that serving processes share them through the page cache.
+"""
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from recommedation_model import SkillRecommendationSystem, resolve_snapshot_dir
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Loads the snapshot, then reads its index again the same way and answers
+# a few queries so the index pages are touched; prints whether the loaded
+# index is a mapping of the file and how much private (anonymous) memory
+# the second read took
+MEASURE_SCRIPT = """
+import sys
+from recommedation_model import SkillRecommendationSystem, read_mapped_index
+
+def rss_anon():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) * 1024 for line in f if line.startswith('RssAnon:'))
+
+recommender = SkillRecommendationSystem(snapshot_path=sys.argv[1])
+assert recommender.load_snapshot(sys.argv[1])
+with open('/proc/self/maps') as f:
+    print(int(recommender.index_path in f.read()))
+
+recommender.faiss_index = None
+before = rss_anon()
+recommender.faiss_index = read_mapped_index(recommender.index_path)
+for user_id in recommender.index_to_user_id[:20]:
+    recommender.layer1_skill_matching(user_id, k=50)
+print(rss_anon() - before)
+"""
+
+
+@pytest.fixture(scope='module', params=['flat', 'hnsw'])
+def snapshot(request, tmp_path_factory):
+    recommender = SkillRecommendationSystem(source='synthetic:20000', index_config={'type': request.param})
+    assert recommender.initialize()
+    try:
+        return recommender.save_snapshot(str(tmp_path_factory.mktemp(f"snapshot-{request.param}")))
+    finally:
+        recommender.close()
+
+
+def test_index_is_not_copied_into_private_memory(snapshot):
+    result = subprocess.run(
+        [sys.executable, '-c', MEASURE_SCRIPT, snapshot],
+        cwd=SERVICES_DIR, capture_output=True, text=True, check=True
+    )
+    mapped, private_bytes = (int(value) for value in result.stdout.split()[-2:])
+    index_bytes = os.path.getsize(os.path.join(resolve_snapshot_dir(snapshot), 'index.faiss'))
+    assert mapped
+    # Only the id map may be private; the vectors and graph must not be
+    assert private_bytes < index_bytes / 10, (private_bytes, index_bytes)
+
+
+def test_feature_columns_stay_mapped(snapshot):
+    recommender = SkillRecommendationSystem(snapshot_path=snapshot)
+    assert recommender.load_snapshot(snapshot)
+    for name, column in recommender.user_features.items():
+        assert isinstance(column, np.memmap), name